@@ -0,0 +1,295 @@
+"""
+Build the email templates in app/templates/email for sending.
+
+    python -m app.build_templates [--source DIR] [--output DIR] [--report-only]
+
+For each template the build:
+- inlines the CSS rules of its <style> blocks into style attributes (mail
+  clients drop or ignore <style>; @media queries and selectors that cannot
+  be inlined are kept in a minified <style> block),
+- minifies the HTML (comments and insignificant whitespace),
+- generates the text part from the HTML when there is no .txt file,
+- and precompiles everything into Jinja modules that EmailService loads
+  instead of parsing and compiling the sources at startup.
+
+The built sources go to OUTPUT/email and the compiled modules to
+OUTPUT/compiled. A report of source and rendered sizes and of load and
+render times, before and after, is printed for every template.
+"""
+import argparse
+import html
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, ModuleLoader
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+BUILD_DIR = TEMPLATES_DIR / "build"
+
+# Rendered for the size and timing report
+SAMPLE_DATA = {
+    "email": "ada@example.com",
+    "name": "Ada",
+    "company": "Example Inc",
+    "app_name": "Lynk AI",
+    "contact_email": "noreply@example.com",
+    "company_name": "JediTeck",
+    "support_email": "support@jediteck.com",
+    "website_url": "https://jediteck.com",
+    "current_year": "2025",
+    "subject": "Your report is ready",
+    "recipient_name": "Ada",
+    "message": "The weekly report you asked for has been generated.",
+    "action_url": "https://example.com/reports/1",
+    "action_text": "View report",
+}
+
+JINJA_TOKEN = re.compile(r"({{.*?}}|{%.*?%}|{#.*?#})", re.S)
+STYLE_BLOCK = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+START_TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>")
+ATTRIBUTE = re.compile(r"""([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*("[^"]*"|'[^']*')""")
+SIMPLE_SELECTOR = re.compile(r"^([a-zA-Z][a-zA-Z0-9]*)?((?:[.#][-_a-zA-Z0-9]+)*)$")
+BLOCK_TAGS = (
+    "html|head|body|title|meta|link|style|div|p|h[1-6]|ul|ol|li|table|thead|tbody|tr|td|th|br|hr|center|"
+    "section|header|footer"
+)
+AROUND_BLOCK_TAG = re.compile(rf"\s*(</?(?:{BLOCK_TAGS})\b[^>]*>)\s*", re.I)
+
+# CSS
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+def parse_declarations(text: str) -> List[Tuple[str, str]]:
+    declarations = []
+    for declaration in text.split(";"):
+        if ":" in declaration:
+            prop, value = declaration.split(":", 1)
+            if prop.strip() and value.strip():
+                declarations.append((prop.strip().lower(), value.strip()))
+    return declarations
+
+def split_rules(css: str) -> Tuple[List[Tuple[str, str]], str]:
+    """
+    Split a stylesheet into top-level (selectors, declarations) rules and
+    the at-rules (@media, @font-face, ...) that have to stay in <style>.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    rules, kept, i = [], [], 0
+    while i < len(css):
+        brace = css.find("{", i)
+        if brace == -1:
+            break
+        prelude = css[i:brace].strip()
+        # Find the matching close brace (at-rules nest)
+        depth, j = 1, brace + 1
+        while j < len(css) and depth:
+            depth += {"{": 1, "}": -1}.get(css[j], 0)
+            j += 1
+        body = css[brace + 1:j - 1]
+        if prelude.startswith("@"):
+            kept.append(f"{prelude}{{{body}}}")
+        else:
+            rules.append((prelude, body))
+        i = j
+    return rules, "".join(kept)
+
+def specificity(selector: str) -> Tuple[int, int, int]:
+    match = SIMPLE_SELECTOR.match(selector)
+    tag, qualifiers = match.group(1), match.group(2)
+    return (qualifiers.count("#"), qualifiers.count("."), 1 if tag else 0)
+
+def selector_matches(selector: str, tag: str, classes: List[str], element_id: Optional[str]) -> bool:
+    match = SIMPLE_SELECTOR.match(selector)
+    if match.group(1) and match.group(1).lower() != tag:
+        return False
+    for qualifier in re.findall(r"[.#][-_a-zA-Z0-9]+", match.group(2)):
+        if qualifier[0] == "." and qualifier[1:] not in classes:
+            return False
+        if qualifier[0] == "#" and qualifier[1:] != element_id:
+            return False
+    return True
+
+def inline_css(source: str) -> str:
+    """
+    Move simple-selector rules (``tag``, ``.class``, ``#id`` and combinations)
+    from <style> blocks into style attributes. Rules are applied by
+    specificity and then source order; existing style attributes win.
+    """
+    inlinable: List[Tuple[Tuple[int, int, int], int, str, List[Tuple[str, str]]]] = []
+    kept_css: List[str] = []
+
+    def take_rules(match):
+        rules, at_rules = split_rules(match.group(1))
+        kept = []
+        for selectors, body in rules:
+            for selector in filter(None, (s.strip() for s in selectors.split(","))):
+                if SIMPLE_SELECTOR.match(selector):
+                    inlinable.append((specificity(selector), len(inlinable), selector, parse_declarations(body)))
+                else:
+                    kept.append(f"{selector}{{{body}}}")
+        kept_css.append("".join(kept) + at_rules)
+        return "\0STYLE\0"
+
+    source = STYLE_BLOCK.sub(take_rules, source)
+    inlinable.sort(key=lambda rule: (rule[0], rule[1]))
+
+    def apply(match):
+        tag, attributes, self_closing = match.group(1).lower(), match.group(2) or "", match.group(3)
+        if not inlinable or tag in ("html", "head", "meta", "title", "style", "link"):
+            return match.group(0)
+        values = {name.lower(): value[1:-1] for name, value in ATTRIBUTE.findall(attributes)}
+        classes = values.get("class", "").split()
+        declarations: Dict[str, str] = {}
+        for _, _, selector, rule in inlinable:
+            if selector_matches(selector, tag, classes, values.get("id")):
+                declarations.update(rule)
+        if not declarations:
+            return match.group(0)
+        declarations.update(parse_declarations(values.get("style", "")))
+        style = ";".join(f"{prop}:{value}" for prop, value in declarations.items())
+        attributes = re.sub(r"""\sstyle\s*=\s*("[^"]*"|'[^']*')""", "", attributes)
+        return f'<{match.group(1)}{attributes} style="{style}"{self_closing}>'
+
+    source = START_TAG.sub(apply, source)
+    for css in kept_css:
+        css = minify_css(css)
+        source = source.replace("\0STYLE\0", f"<style>{css}</style>" if css else "", 1)
+    return source
+
+# HTML
+
+STYLE_ATTRIBUTE = re.compile(r"""(\sstyle\s*=\s*)("[^"]*"|'[^']*')""", re.I)
+
+def minify_style_attribute(match) -> str:
+    value = match.group(2)[1:-1]
+    if "{" in value:
+        # Leave attributes with Jinja expressions alone
+        return match.group(0)
+    return ' style="{}"'.format(";".join(f"{prop}:{value}" for prop, value in parse_declarations(value)))
+
+def minify_html(source: str) -> str:
+    """
+    Drop comments (except conditional comments) and whitespace that does not
+    render: runs of whitespace become one space, and whitespace next to
+    block-level tags is removed.
+    """
+    source = re.sub(r"<!--(?!\[if).*?-->", "", source, flags=re.S)
+    source = STYLE_BLOCK.sub(lambda m: f"<style>{minify_css(m.group(1))}</style>", source)
+    source = re.sub(r"\s+", " ", source)
+    source = AROUND_BLOCK_TAG.sub(r"\1", source)
+    source = STYLE_ATTRIBUTE.sub(minify_style_attribute, source)
+    return source.strip()
+
+def html_to_text(source: str) -> str:
+    """
+    Derive a plain text template from an HTML template. Jinja expressions and
+    statements are kept as they are.
+    """
+    text = re.sub(r"<!--.*?-->", "", source, flags=re.S)
+    text = re.sub(r"<(head|style|script)\b.*?</\1>", "", text, flags=re.S | re.I)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(
+        r"""<a\b[^>]*?href\s*=\s*["']([^"']*)["'][^>]*>(.*?)</a>""",
+        lambda m: m.group(2) if m.group(1).startswith("mailto:") else f"{m.group(2)}: {m.group(1)}",
+        text, flags=re.S | re.I
+    )
+    text = re.sub(r"<li\b[^>]*>\s*", "\n- ", text, flags=re.I)
+    text = re.sub(r"<br\s*/?>\s*", "\n", text, flags=re.I)
+    text = re.sub(r"\s*</?(p|div|h[1-6]|ul|ol|table|tr)\b[^>]*>\s*", "\n\n", text, flags=re.I)
+    text = re.sub(r"<[^>]+>", "", text)
+    # Unescape text only; entities are not Jinja syntax
+    text = "".join(part if JINJA_TOKEN.fullmatch(part) else html.unescape(part) for part in JINJA_TOKEN.split(text))
+    lines = [line.strip() for line in text.split("\n")]
+    text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+    return text.strip() + "\n"
+
+# Build
+
+def build_sources(source_dir: Path, output_dir: Path) -> List[str]:
+    """
+    Write the inlined and minified HTML, and the text parts, to
+    ``output_dir``. Returns the template names (without extension).
+    """
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+    names = []
+    for html_path in sorted(source_dir.glob("*.html")):
+        name = html_path.stem
+        source = html_path.read_text(encoding="utf-8")
+        (output_dir / f"{name}.html").write_text(minify_html(inline_css(source)), encoding="utf-8")
+        text_path = source_dir / f"{name}.txt"
+        text = text_path.read_text(encoding="utf-8") if text_path.exists() else html_to_text(source)
+        (output_dir / f"{name}.txt").write_text(text, encoding="utf-8")
+        names.append(name)
+    return names
+
+def compile_templates(build_dir: Path) -> Path:
+    compiled_dir = build_dir / "compiled"
+    if compiled_dir.exists():
+        shutil.rmtree(compiled_dir)
+    env = Environment(loader=FileSystemLoader(build_dir), autoescape=False)
+    env.compile_templates(
+        compiled_dir, zip=None, filter_func=lambda name: name.startswith("email/"), ignore_errors=False
+    )
+    return compiled_dir
+
+def measure(env: Environment, template_name: str, repeat: int = 200) -> Tuple[int, float, float]:
+    """
+    Returns:
+        (rendered bytes, load ms, render µs)
+    """
+    started = time.perf_counter()
+    template = env.get_template(template_name)
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rendered = template.render(**SAMPLE_DATA)
+    render_us = (time.perf_counter() - started) / repeat * 1e6
+    return len(rendered.encode("utf-8")), load_ms, render_us
+
+def report(source_dir: Path, build_dir: Path, names: List[str]):
+    columns = ("template", "source B", "built B", "sent B", "built", "load ms", "built", "render µs", "built")
+    print(f"{columns[0]:<34}" + "".join(f"{column:>11}" for column in columns[1:]))
+    for extension in ("html", "txt"):
+        for name in names:
+            template_name = f"email/{name}.{extension}"
+            source_path = source_dir / f"{name}.{extension}"
+            built_path = build_dir / "email" / f"{name}.{extension}"
+            # Fresh environments so the load time includes parsing or importing
+            built = measure(Environment(loader=ModuleLoader(build_dir / "compiled")), template_name)
+            if source_path.exists():
+                raw = measure(Environment(loader=FileSystemLoader(source_dir.parent)), template_name)
+                row = [source_path.stat().st_size, built_path.stat().st_size, raw[0], built[0],
+                       f"{raw[1]:.2f}", f"{built[1]:.2f}", f"{raw[2]:.1f}", f"{built[2]:.1f}"]
+            else:
+                # Generated text part: nothing to compare against
+                row = ["-", built_path.stat().st_size, "-", built[0], "-", f"{built[1]:.2f}", "-", f"{built[2]:.1f}"]
+            print(f"{template_name:<34}" + "".join(f"{value:>11}" for value in row))
+
+def main():
+    parser = argparse.ArgumentParser(description="Inline, minify and precompile the email templates")
+    parser.add_argument("--source", default=str(TEMPLATES_DIR / "email"), help="Directory of the template sources")
+    parser.add_argument("--output", default=str(BUILD_DIR), help="Build directory (email/ and compiled/)")
+    parser.add_argument("--report-only", action="store_true", help="Report on an existing build")
+    args = parser.parse_args()
+
+    source_dir, build_dir = Path(args.source), Path(args.output)
+    if args.report_only:
+        names = sorted(path.stem for path in (build_dir / "email").glob("*.html"))
+    else:
+        names = build_sources(source_dir, build_dir / "email")
+        compiled_dir = compile_templates(build_dir)
+        print(f"Built {len(names)} templates into {build_dir / 'email'}, compiled into {compiled_dir}")
+    report(source_dir, build_dir, names)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,57 @@
-import uvicorn
+"""
+Production entry point (used by the Dockerfile).
+
+    python -m app.cloud_run
+
+Runs WORKERS (WEB_CONCURRENCY) uvicorn worker processes, one per available CPU
+by default. Each worker imports the app and builds its own Mongo and SMTP pools
+in the lifespan. uvloop and httptools are used when installed.
+
+On SIGTERM each worker stops accepting connections and lets in-flight
+requests and their background tasks (such as queued emails) finish. Then it
+runs the lifespan shutdown, which pauses campaigns and closes the SMTP pool
+before the Mongo client. Both phases share SHUTDOWN_TIMEOUT_SECONDS: the
+lifespan shutdown gets the last SHUTDOWN_CLEANUP_SECONDS and the drain the rest.
+"""
+import importlib.util
+import logging
 import os
-from app.main import app
+
+import uvicorn
+
+from app.config import settings
+
+logger = logging.getLogger("cloud_run")
+
+def default_workers() -> int:
+    # CPUs this container may actually use, not the host's
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     # Cloud Run sets PORT environment variable
     port = int(os.environ.get("PORT", 8001))
+    workers = settings.WORKERS or default_workers()
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    logger.info(f"Starting {workers} worker(s) on port {port} (loop={loop}, http={http})")
+
     # Use 0.0.0.0 to listen on all interfaces
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=port,
-        workers=1,
+        workers=workers,
+        loop=loop,
+        http=http,
+        # Cloud Run terminates TLS; trust its X-Forwarded-* headers
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        timeout_graceful_shutdown=settings.shutdown_drain_seconds,
         log_level="info"
     )
@@ -1,22 +1,162 @@
-import os
-from pydantic import BaseSettings
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import Any, Dict, List, Optional
+from pydantic import BaseSettings, Field
 
 class Settings(BaseSettings):
+    # Values come from the environment or the .env file; Field(env=...) maps
+    # settings whose environment variable has a different name.
     APP_NAME: str = "Lynk AI"
-    MONGO_URI: str = os.getenv("MONGODB_URI")
-    
+    MONGO_URI: Optional[str] = Field(None, env="MONGODB_URI")
+    # Wire compression offered to MongoDB, in order of preference. Compressors
+    # whose Python module is not installed (zstandard, python-snappy) are
+    # skipped; an empty value turns compression off.
+    MONGO_COMPRESSORS: str = "zstd,snappy,zlib"
+    MONGO_ZLIB_LEVEL: int = 6
+    INTERNAL_API_KEY: Optional[str] = None
+    # Per-profile changes to the operation profiles in
+    # app/services/mongo_profiles.py, as JSON
+    MONGO_PROFILE_OVERRIDES: Dict[str, Dict[str, Any]] = {}
+
+    # Production server (app/cloud_run.py). WORKERS defaults to the CPU count;
+    # Cloud Run sends SIGKILL 10 seconds after SIGTERM. SHUTDOWN_TIMEOUT_SECONDS
+    # is the whole shutdown budget: the last SHUTDOWN_CLEANUP_SECONDS of it are
+    # kept for the lifespan shutdown, the rest drains in-flight requests.
+    WORKERS: Optional[int] = Field(None, env="WEB_CONCURRENCY")
+    SHUTDOWN_TIMEOUT_SECONDS: float = 8
+    SHUTDOWN_CLEANUP_SECONDS: float = 3
+
+    # Admission control (app/middleware/admission.py). Critical paths are
+    # never shed; bulk and default requests beyond their concurrency limit, or
+    # while the event loop lags, get a 503 with Retry-After. Paths are comma
+    # separated prefixes.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CRITICAL_PATHS: str = "/health,/hubspot/webhook"
+    ADMISSION_BULK_PATHS: str = "/hubspot/sync-contacts,/workflow/bulk,/events/archive/run,/analytics/refresh"
+    ADMISSION_BULK_MAX_CONCURRENCY: int = 2
+    ADMISSION_DEFAULT_MAX_CONCURRENCY: int = 200
+    ADMISSION_MAX_LAG_MS: float = 250
+    ADMISSION_RETRY_AFTER_SECONDS: int = 2
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.1
+
+    # HTTP response compression (brotli when installed, else gzip) for
+    # compressible bodies of at least COMPRESSION_MIN_BYTES
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Routers to register, comma separated
+    ENABLED_ROUTERS: str = "events,cron,email,hubspot,metrics,campaigns,workflow,analytics"
+
+    # Single-document read cache (CACHE_MAX_ENTRIES=0 disables it). Each
+    # worker process has its own cache and only invalidates its own entries,
+    # so the TTL is how long other workers may serve a changed document.
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TTL_SECONDS: float = 5
+
+    # Communications history entries per bucket document
+    COMMUNICATIONS_BUCKET_SIZE: int = 50
+
+    # Event retention: processed events older than RETENTION_DAYS are archived
+    # to ARCHIVE_DIR and deleted. EVENTS_PAYLOAD_TTL_DAYS > 0 removes the raw
+    # data payload of older processed events, even if archival is not enabled.
+    RETENTION_ENABLED: bool = False
+    RETENTION_DAYS: float = 30
+    RETENTION_INTERVAL_SECONDS: float = 3600
+    RETENTION_BATCH_SIZE: int = 1000
+    ARCHIVE_DIR: str = "archive"
+    EVENTS_PAYLOAD_TTL_DAYS: float = 0
+
     # Email settings
-    SMTP_SERVER: str = os.getenv("SMTP_HOST")
-    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_CC: str = os.getenv("SMTP_CC")
-    SMTP_USERNAME: str = os.getenv("SMTP_USER", "")
-    SMTP_PASSWORD: str = os.getenv("SMTP_PASS")
-    SMTP_FROM: str = os.getenv("SMTP_FROM")
-    
+    SMTP_SERVER: Optional[str] = Field(None, env="SMTP_HOST")
+    SMTP_PORT: int = 587
+    SMTP_CC: Optional[str] = None
+    SMTP_USERNAME: str = Field("", env="SMTP_USER")
+    SMTP_PASSWORD: Optional[str] = Field(None, env="SMTP_PASS")
+    SMTP_FROM: Optional[str] = None
+    SMTP_START_TLS: bool = True
+    SMTP_POOL_SIZE: int = 10
+    SMTP_TIMEOUT: float = 30
+    # Use the templates built by `python -m app.build_templates` when present
+    EMAIL_PRECOMPILED_TEMPLATES: bool = True
+
+    # Campaign settings
+    CAMPAIGN_BATCH_SIZE: int = 500
+    CAMPAIGN_CONCURRENCY: int = 50
+    CAMPAIGN_DOMAIN_CONCURRENCY: int = 5
+    CAMPAIGN_DOMAIN_RATE: float = 10.0
+    CAMPAIGN_MAX_RETRIES: int = 3
+    CAMPAIGN_LEASE_SECONDS: int = 120
+    CAMPAIGN_AUTO_RESUME: bool = True
+    # How often each worker looks for campaigns whose lease has lapsed
+    CAMPAIGN_RESUME_INTERVAL_SECONDS: float = 60
+
+    # Rollups refreshed in the background (one worker at a time)
+    ANALYTICS_ENABLED: bool = True
+    ANALYTICS_INTERVAL_SECONDS: float = 60
+
+    # Send ledger: bloom filter sizing, and how long a claimed but unconfirmed
+    # send blocks a retry
+    SEND_LEDGER_BLOOM_CAPACITY: int = 1000000
+    SEND_LEDGER_BLOOM_ERROR_RATE: float = 0.01
+    SEND_LEDGER_PENDING_SECONDS: float = 600
+
+    # Workflow instances: worker coroutines per process, claim lease and retries
+    WORKFLOW_WORKERS: int = 20
+    WORKFLOW_POLL_SECONDS: float = 1.0
+    WORKFLOW_LEASE_SECONDS: int = 60
+    WORKFLOW_MAX_ATTEMPTS: int = 3
+    WORKFLOW_BULK_BATCH_SIZE: int = 1000
+    WORKFLOW_BULK_MAX: int = 100000
+
+    # Upstream APIs (overridable so benchmarks can point at local stand-ins)
+    HUBSPOT_TOKEN: Optional[str] = None
+    HUBSPOT_API_BASE: Optional[str] = None
+    # HubSpot webhook verification. Requests must carry a valid v3 signature
+    # signed with HUBSPOT_CLIENT_SECRET; without a secret every webhook is
+    # rejected unless HUBSPOT_WEBHOOK_ALLOW_UNSIGNED is set (local development
+    # only). HUBSPOT_WEBHOOK_URL is the public URL HubSpot signs, for when the
+    # app sits behind a proxy that rewrites it.
+    HUBSPOT_CLIENT_SECRET: Optional[str] = None
+    HUBSPOT_WEBHOOK_ALLOW_UNSIGNED: bool = False
+    HUBSPOT_WEBHOOK_URL: Optional[str] = None
+    HUBSPOT_WEBHOOK_MAX_AGE_SECONDS: float = 300
+    WEBHOOK_MAX_BODY_BYTES: int = 1024 * 1024
+    ABSTRACT_API_KEY: Optional[str] = None
+    ABSTRACT_API_URL: str = "https://emailvalidation.abstractapi.com/v1/"
+
+    # Upstream protection (app/services/resilience.py): per-call deadlines,
+    # concurrent calls per dependency, and circuit breakers that open after
+    # BREAKER_FAILURE_THRESHOLD consecutive failures for BREAKER_RESET_SECONDS
+    UPSTREAM_CONNECT_TIMEOUT: float = 3
+    HUBSPOT_TIMEOUT: float = 10
+    HUBSPOT_MAX_CONCURRENCY: int = 20
+    ABSTRACT_API_TIMEOUT: float = 5
+    ABSTRACT_API_MAX_CONCURRENCY: int = 20
+    BULKHEAD_MAX_WAIT_SECONDS: float = 1
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30
+
+    # Work deferred while a dependency is unavailable
+    RETRY_INTERVAL_SECONDS: float = 5
+    RETRY_LEASE_SECONDS: int = 120
+    RETRY_MAX_ATTEMPTS: int = 10
+
+    # Profiling settings
+    PROFILE_DIR: str = "profiles"
+    PROFILE_INTERVAL: float = 0.001
+    PROFILE_CONTINUOUS: bool = False
+    PROFILE_SAMPLE_INTERVAL: float = 0.05
+    PROFILE_FLUSH_INTERVAL: float = 300
+
     class Config:
         env_file = ".env"
 
+    @property
+    def enabled_routers(self) -> List[str]:
+        return [name.strip() for name in self.ENABLED_ROUTERS.split(",") if name.strip()]
+
+    @property
+    def shutdown_drain_seconds(self) -> float:
+        return max(0.0, self.SHUTDOWN_TIMEOUT_SECONDS - self.SHUTDOWN_CLEANUP_SECONDS)
+
 settings = Settings()
@@ -0,0 +1,101 @@
+import hmac
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import Depends, HTTPException, Query, Request
+from fastapi.security.api_key import APIKeyHeader
+from starlette.status import HTTP_403_FORBIDDEN
+
+from .config import settings
+from .services.analytics_service import AnalyticsService
+from .services.campaign_service import CampaignService
+from .services.email_service import EmailService
+from .services.mongo_service import MongoService, build_projection
+from .services.retention_service import RetentionService
+from .services.retry_queue import RetryQueue
+from .services.send_ledger import SendLedger
+from .services.workflow_service import WorkflowService
+
+# Set up API key authentication
+API_KEY_NAME = "X-API-Key"
+api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
+
+def is_valid_api_key(api_key: Optional[str]) -> bool:
+    """
+    Check an API key against INTERNAL_API_KEY. An unset INTERNAL_API_KEY never matches.
+    """
+    if not settings.INTERNAL_API_KEY or not api_key:
+        return False
+    return hmac.compare_digest(api_key, settings.INTERNAL_API_KEY)
+
+async def get_api_key(api_key_header: str = Depends(api_key_header)):
+    if is_valid_api_key(api_key_header):
+        return api_key_header
+    raise HTTPException(
+        status_code=HTTP_403_FORBIDDEN, detail="Could not validate API key"
+    )
+
+async def get_mongo_service(request: Request) -> MongoService:
+    """
+    The MongoService (and its connection pool) built in the app lifespan.
+    """
+    return request.app.state.mongo_service
+
+async def get_email_service(request: Request) -> EmailService:
+    """
+    The EmailService built in the app lifespan.
+    """
+    return request.app.state.email_service
+
+async def get_campaign_service(request: Request) -> CampaignService:
+    """
+    The CampaignService built in the app lifespan.
+    """
+    return request.app.state.campaign_service
+
+async def get_retention_service(request: Request) -> RetentionService:
+    """
+    The RetentionService built in the app lifespan.
+    """
+    return request.app.state.retention_service
+
+async def get_analytics_service(request: Request) -> AnalyticsService:
+    """
+    The AnalyticsService built in the app lifespan.
+    """
+    return request.app.state.analytics_service
+
+async def get_send_ledger(request: Request) -> SendLedger:
+    """
+    The SendLedger built in the app lifespan.
+    """
+    return request.app.state.send_ledger
+
+async def get_retry_queue(request: Request) -> RetryQueue:
+    """
+    The RetryQueue built in the app lifespan.
+    """
+    return request.app.state.retry_queue
+
+async def get_workflow_service(request: Request) -> WorkflowService:
+    """
+    The WorkflowService built in the app lifespan.
+    """
+    return request.app.state.workflow_service
+
+def field_projection(allowed: Optional[Set[str]] = None, default_exclude: Iterable[str] = ()):
+    """
+    Dependency factory for a ``fields`` query parameter, resolved to a Mongo
+    projection (see build_projection). Unknown fields are rejected with a 400.
+    """
+    default_exclude = tuple(default_exclude)
+    description = "Comma separated fields to return, or * for full documents"
+    if default_exclude:
+        description += f" (default: all but {', '.join(default_exclude)})"
+
+    async def dependency(fields: Optional[str] = Query(None, description=description)) -> Optional[Dict[str, int]]:
+        try:
+            return build_projection(fields, allowed, default_exclude)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return dependency
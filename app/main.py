@@ -1,15 +1,100 @@
+import asyncio
+from contextlib import asynccontextmanager
+from importlib import import_module
+import logging
+import time
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import events, cron, email, hubspot, metrics
+from .middleware.admission import AdmissionControlMiddleware, loop_lag_monitor
+from .middleware.compression import CompressionMiddleware
+from .middleware.profiling import ProfilingMiddleware, ContinuousSampler
+from .services.analytics_service import AnalyticsService
+from .services.campaign_service import CampaignService
+from .services.email_service import EmailService
+from .services.mongo_service import MongoService
+from .services.retention_service import RetentionService
+from .services.retry_queue import RetryQueue
+from .services import hubspot_webhooks  # noqa: F401 (registers the retry handlers)
+from .services.send_ledger import SendLedger
+from .services.workflow_service import WorkflowService
 from .config import settings
-import uvicorn
-import os
+
+logger = logging.getLogger("app")
+
+async def _finish_by(deadline: float, awaitable, what: str):
+    """
+    Await a shutdown step, giving up when the shutdown deadline passes.
+    """
+    try:
+        await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        logger.warning(f"Shutdown deadline reached while {what}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the per-process clients on startup and release them on shutdown.
+    """
+    if not settings.HUBSPOT_CLIENT_SECRET:
+        if settings.HUBSPOT_WEBHOOK_ALLOW_UNSIGNED:
+            logger.warning("HUBSPOT_WEBHOOK_ALLOW_UNSIGNED is set: HubSpot webhooks are processed without signature checks")
+        else:
+            logger.warning("HUBSPOT_CLIENT_SECRET is not set: all HubSpot webhooks will be rejected")
+    app.state.mongo_service = MongoService()
+    app.state.send_ledger = SendLedger(app.state.mongo_service)
+    app.state.workflow_service = WorkflowService(app.state.mongo_service, app.state)
+    app.state.analytics_service = AnalyticsService(app.state.mongo_service)
+    app.state.retry_queue = RetryQueue(app.state.mongo_service, app.state)
+    try:
+        await app.state.mongo_service.ensure_indexes()
+        await app.state.send_ledger.ensure_indexes()
+        await app.state.workflow_service.ensure_indexes()
+        await app.state.analytics_service.ensure_indexes()
+        await app.state.retry_queue.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not ensure MongoDB indexes: {str(e)}")
+    app.state.email_service = EmailService()
+    app.state.campaign_service = CampaignService(app.state.mongo_service, app.state.email_service, app.state.send_ledger)
+    campaign_resume_task = asyncio.create_task(app.state.campaign_service.run_forever()) if settings.CAMPAIGN_AUTO_RESUME else None
+    # The ledger is correct without the bloom filter; warming only saves lookups
+    ledger_warmup = asyncio.create_task(app.state.send_ledger.warm())
+    app.state.retention_service = RetentionService(app.state.mongo_service)
+    retention_task = asyncio.create_task(app.state.retention_service.run_forever()) if settings.RETENTION_ENABLED or settings.EVENTS_PAYLOAD_TTL_DAYS else None
+    analytics_task = asyncio.create_task(app.state.analytics_service.run_forever()) if settings.ANALYTICS_ENABLED else None
+    retry_task = asyncio.create_task(app.state.retry_queue.run_forever())
+    app.state.workflow_service.start()
+    loop_lag_monitor.start()
+    continuous_sampler = ContinuousSampler() if settings.PROFILE_CONTINUOUS else None
+    if continuous_sampler:
+        continuous_sampler.start()
+
+    yield
+
+    # One deadline for every step below, so the drain that uvicorn already did
+    # plus this stays within SHUTDOWN_TIMEOUT_SECONDS
+    deadline = time.monotonic() + settings.SHUTDOWN_CLEANUP_SECONDS
+    ledger_warmup.cancel()
+    await asyncio.gather(ledger_warmup, return_exceptions=True)
+    for task in (retention_task, analytics_task, retry_task, campaign_resume_task):
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if continuous_sampler:
+        continuous_sampler.stop()
+    await loop_lag_monitor.stop()
+    await _finish_by(deadline, app.state.campaign_service.stop(), "stopping campaigns")
+    await _finish_by(deadline, app.state.workflow_service.stop(), "stopping workflow workers")
+    # Let in-flight sends finish before the pools go away, in whatever time is left
+    await app.state.email_service.close(timeout=max(0.0, deadline - time.monotonic()))
+    app.state.mongo_service.close()
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     description="A simple FastAPI backend application that handles MongoDB CRUD operations and email functionality",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -21,12 +106,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include routers
-app.include_router(events.router)
-app.include_router(cron.router)
-app.include_router(email.router)
-app.include_router(hubspot.router)
-app.include_router(metrics.router)
+# On-demand profiling of single requests (X-Profile + X-API-Key headers)
+app.add_middleware(ProfilingMiddleware)
+
+# gzip/brotli response bodies, as the client's Accept-Encoding allows
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Added last so it runs first: shed load before any other work is done
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+
+# Include routers enabled in settings; disabled ones are never imported
+for router_name in settings.enabled_routers:
+    try:
+        module = import_module(f".routers.{router_name}", __package__)
+    except ModuleNotFoundError:
+        logger.error(f"Unknown router '{router_name}' in ENABLED_ROUTERS")
+        raise
+    app.include_router(module.router)
 
 @app.get("/")
 async def root():
@@ -37,7 +135,10 @@ async def root():
             "events": "/events",
             "cron": "/cron",
             "email": "/email",
-            "hubspot": "/hubspot"
+            "hubspot": "/hubspot",
+            "campaigns": "/campaigns",
+            "workflow": "/workflow",
+            "analytics": "/analytics"
         }
     }
 
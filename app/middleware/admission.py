@@ -0,0 +1,160 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import orjson
+
+from ..config import settings
+
+CRITICAL = "critical"
+BULK = "bulk"
+DEFAULT = "default"
+
+
+def _paths(value: str) -> List[str]:
+    return [path.strip().rstrip("/") for path in value.split(",") if path.strip()]
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than requested a short sleep
+    wakes up. A loop busy with blocking work or too many ready callbacks
+    wakes late, so the lag rises before requests start timing out.
+
+    ``lag`` is a decaying peak: each sample replaces it only if it is higher
+    than half the previous value, so one long stall keeps it raised for a few
+    intervals instead of being forgotten at the next tick.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.LOOP_LAG_INTERVAL_SECONDS
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.lag = max(lag, self.lag / 2)
+            self.max_lag = max(self.max_lag, lag)
+            self.samples += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "lag_ms": round(self.lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "samples": self.samples
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+# Per process, shared with the metrics endpoint
+route_stats = {
+    name: {"in_flight": 0, "admitted": 0, "shed_concurrency": 0, "shed_lag": 0}
+    for name in (CRITICAL, BULK, DEFAULT)
+}
+
+
+class AdmissionControlMiddleware:
+    """
+    Admit or shed each HTTP request by route class before it reaches the app.
+
+    - critical (ADMISSION_CRITICAL_PATHS: health checks, HubSpot webhooks) is
+      always admitted.
+    - bulk (ADMISSION_BULK_PATHS: syncs, bulk starts, manual refreshes) is
+      limited to ADMISSION_BULK_MAX_CONCURRENCY requests at a time and shed
+      once the loop lag passes half of ADMISSION_MAX_LAG_MS.
+    - default (everything else) is limited to ADMISSION_DEFAULT_MAX_CONCURRENCY
+      and shed once the loop lag passes ADMISSION_MAX_LAG_MS.
+
+    Shed requests get an immediate 503 with Retry-After instead of queueing
+    behind the work that is already slowing the loop down.
+    """
+
+    def __init__(self, app, monitor: LoopLagMonitor = None):
+        self.app = app
+        self.monitor = monitor or loop_lag_monitor
+        self.critical_paths = _paths(settings.ADMISSION_CRITICAL_PATHS)
+        self.bulk_paths = _paths(settings.ADMISSION_BULK_PATHS)
+        self.limits = {
+            BULK: settings.ADMISSION_BULK_MAX_CONCURRENCY,
+            DEFAULT: settings.ADMISSION_DEFAULT_MAX_CONCURRENCY,
+        }
+        max_lag = settings.ADMISSION_MAX_LAG_MS / 1000
+        self.max_lag = {BULK: max_lag / 2, DEFAULT: max_lag}
+        self.stats = route_stats
+        self.retry_after = str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode()
+
+    def route_class(self, path: str) -> str:
+        for route_class, prefixes in ((CRITICAL, self.critical_paths), (BULK, self.bulk_paths)):
+            for prefix in prefixes:
+                if path == prefix or path.startswith(prefix + "/"):
+                    return route_class
+        return DEFAULT
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.route_class(scope["path"].rstrip("/") or "/")
+        stats = self.stats[route_class]
+        if route_class != CRITICAL:
+            if self.monitor.lag > self.max_lag[route_class]:
+                stats["shed_lag"] += 1
+                await self._shed(send, "Server is overloaded")
+                return
+            if stats["in_flight"] >= self.limits[route_class]:
+                stats["shed_concurrency"] += 1
+                await self._shed(send, "Too many concurrent requests")
+                return
+
+        stats["admitted"] += 1
+        stats["in_flight"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stats["in_flight"] -= 1
+
+    async def _shed(self, send, detail: str):
+        body = orjson.dumps({"detail": f"{detail}; retry later"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def admission_stats() -> Dict[str, object]:
+    """
+    Loop lag and per route class admission counts for this process.
+    """
+    limits = {
+        BULK: settings.ADMISSION_BULK_MAX_CONCURRENCY,
+        DEFAULT: settings.ADMISSION_DEFAULT_MAX_CONCURRENCY,
+    }
+    return {
+        "loop": loop_lag_monitor.get_stats(),
+        "route_classes": {
+            name: {**stats, "limit": limits.get(name)} for name, stats in route_stats.items()
+        }
+    }
@@ -0,0 +1,196 @@
+import zlib
+from typing import List, Optional, Tuple
+
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (b"text/", b"application/json", b"application/javascript", b"application/xml", b"image/svg+xml")
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """
+    Encodings from an Accept-Encoding header with a non-zero q-value.
+    """
+    encodings = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.append(name.strip().lower())
+    return encodings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    accepted = accepted_encodings(header)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class StreamCompressor:
+    """
+    Incremental gzip or brotli encoder. Every ``compress`` call flushes, so a
+    streamed response reaches the client chunk by chunk instead of only when
+    the encoder's window fills up.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._zlib = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with brotli (when installed) or gzip, as the
+    client's Accept-Encoding allows.
+
+    Only compressible content types of at least COMPRESSION_MIN_BYTES are
+    encoded. Streamed responses are buffered until they reach the threshold:
+    short streams go out unchanged with a Content-Length, and longer ones are
+    compressed chunk by chunk as they are produced, without collecting the
+    whole body. Strong ETags become weak on compressed responses, since the
+    bytes differ from the identity encoding.
+    """
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = choose_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self.minimum_size, encoding, send).run(self.app, scope, receive)
+
+
+class _CompressedResponse:
+    def __init__(self, minimum_size: int, encoding: str, send):
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[dict] = None
+        self.buffer = bytearray()
+        self.compressor: Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    async def run(self, app, scope, receive):
+        await app(scope, receive, self.handle)
+
+    async def handle(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            self.start = message
+            if not self._compressible(message.get("headers", [])):
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is not None:
+            chunk = self.compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += self.compressor.finish()
+            if chunk or not more_body:
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        self.buffer += body
+        if len(self.buffer) < self.minimum_size:
+            if more_body:
+                return
+            # The whole body is below the threshold: send it as it is
+            await self._send_start(self._headers(), len(self.buffer))
+            await self.send({"type": "http.response.body", "body": bytes(self.buffer)})
+            return
+
+        self.compressor = StreamCompressor(self.encoding)
+        data = self.compressor.compress(bytes(self.buffer))
+        self.buffer.clear()
+        if not more_body:
+            data += self.compressor.finish()
+            await self._send_start(self._headers(compressed=True), len(data))
+        else:
+            await self._send_start(self._headers(compressed=True), None)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _compressible(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if self.start["status"] in (204, 304) or self.start["status"] < 200:
+            return False
+        content_type = b""
+        for name, value in headers:
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+            if name == b"content-length" and value.isdigit() and int(value) < self.minimum_size:
+                return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _headers(self, compressed: bool = False) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = None
+        for name, value in self.start.get("headers", []):
+            lower = name.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"vary":
+                vary = value
+                continue
+            if compressed and lower == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            headers.append((name, value))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary += b", Accept-Encoding"
+        headers.append((b"vary", vary))
+        if compressed:
+            headers.append((b"content-encoding", self.encoding.encode()))
+        return headers
+
+    async def _send_start(self, headers: List[Tuple[bytes, bytes]], content_length: Optional[int]):
+        if content_length is not None:
+            headers = headers + [(b"content-length", str(content_length).encode())]
+        await self.send({**self.start, "headers": headers})
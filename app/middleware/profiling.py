@@ -0,0 +1,213 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from ..config import settings
+from ..dependencies import is_valid_api_key
+
+logger = logging.getLogger("profiling")
+
+API_KEY_HEADER = b"x-api-key"
+PROFILE_HEADER = b"x-profile"
+INLINE_FORMATS = {"speedscope", "html"}
+
+
+class ProfilingMiddleware:
+    """
+    Run a single request under pyinstrument when it carries an ``X-Profile``
+    header together with a valid ``X-API-Key``.
+
+    ``X-Profile: speedscope`` or ``X-Profile: html`` replaces the response body
+    with the rendered profile (the original status is kept in the
+    ``X-Profiled-Status`` header). ``X-Profile: store`` returns the normal
+    response and writes a speedscope file to ``PROFILE_DIR``; its name is
+    returned in the ``X-Profile-File`` header.
+    """
+
+    def __init__(self, app, interval: float = None, output_dir: str = None):
+        self.app = app
+        self.interval = interval or settings.PROFILE_INTERVAL
+        self.output_dir = Path(output_dir or settings.PROFILE_DIR)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        mode = headers.get(PROFILE_HEADER, b"").decode("latin-1").strip().lower()
+        if not mode:
+            await self.app(scope, receive, send)
+            return
+        api_key = headers.get(API_KEY_HEADER, b"").decode("latin-1")
+        if not is_valid_api_key(api_key):
+            # Silently ignore the profiling request so the header cannot be
+            # used to probe for the API key.
+            await self.app(scope, receive, send)
+            return
+        if mode not in INLINE_FORMATS and mode != "store":
+            await self._send_plain(send, 400, b"X-Profile must be one of: speedscope, html, store")
+            return
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            await self._send_plain(send, 501, b"pyinstrument is not installed")
+            return
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        if mode == "store":
+            await self._profile_and_store(profiler, scope, receive, send)
+        else:
+            await self._profile_inline(profiler, mode, scope, receive, send)
+
+    async def _profile_inline(self, profiler, mode, scope, receive, send):
+        status = {"code": 500}
+
+        async def capture(message):
+            # Swallow the real response; only its status is reported back
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profiler.stop()
+
+        if mode == "html":
+            body = profiler.output_html().encode("utf-8")
+            content_type = b"text/html; charset=utf-8"
+        else:
+            body = self._render_speedscope(profiler)
+            content_type = b"application/json"
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status["code"]).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _profile_and_store(self, profiler, scope, receive, send):
+        filename = self._profile_filename(scope)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-file", filename.encode())
+                ]
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            profiler.stop()
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            (self.output_dir / filename).write_bytes(self._render_speedscope(profiler))
+            logger.info(f"Stored request profile {self.output_dir / filename}")
+
+    @staticmethod
+    def _render_speedscope(profiler) -> bytes:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        return profiler.output(renderer=SpeedscopeRenderer()).encode("utf-8")
+
+    @staticmethod
+    def _profile_filename(scope) -> str:
+        path = scope.get("path", "/").strip("/").replace("/", "_") or "root"
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{scope.get('method', 'GET')}-{path}.speedscope.json"
+
+    @staticmethod
+    async def _send_plain(send, status_code: int, body: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class ContinuousSampler:
+    """
+    Low-rate, always-on stack sampler.
+
+    A daemon thread snapshots the stacks of all other threads every
+    ``interval`` seconds and aggregates them in memory. Every
+    ``flush_interval`` seconds the counts are written to ``output_dir`` in the
+    collapsed ("folded") stack format understood by flamegraph.pl and
+    speedscope, one file per process and flush window.
+    """
+
+    def __init__(self, output_dir: str = None, interval: float = None, flush_interval: float = None):
+        self.output_dir = Path(output_dir or settings.PROFILE_DIR)
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        self.flush_interval = flush_interval or settings.PROFILE_FLUSH_INTERVAL
+        self.samples = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="continuous-sampler", daemon=True)
+        self._thread.start()
+        logger.info(f"Continuous sampling every {self.interval}s into {self.output_dir}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop.wait(self.interval):
+            self.sample(own_id)
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def sample(self, skip_thread_id: int = None):
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip_thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stacks.append(";".join(reversed(stack)))
+        with self._lock:
+            self.samples.update(stacks)
+
+    def flush(self):
+        with self._lock:
+            samples, self.samples = self.samples, Counter()
+        if not samples:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"continuous-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Wrote {sum(samples.values())} samples to {path}")
@@ -0,0 +1,132 @@
+"""
+Move embedded ``communications`` arrays from marketing contacts into the
+bucketed communications collection.
+
+    python -m app.migrations.communications_buckets [--batch-size 500] [--dry-run]
+
+Contacts are processed in _id order, one batch at a time. Buckets are
+inserted with a deterministic (migrated_from, seq) key and never replaced,
+so re-running after an interruption neither duplicates entries nor drops
+ones that add_communication appended to a migrated bucket meanwhile. Each
+migrated contact loses its communications array and gets a
+lastCommunication summary, unless it already has a newer one.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+
+from ..config import settings
+from ..services.mongo_service import MongoService, communication_summary
+
+logger = logging.getLogger("migrations.communications_buckets")
+
+def normalize_entry(entry: Dict[str, Any], fallback: datetime) -> Dict[str, Any]:
+    """
+    Older entries store sentAt as an ISO string; buckets need datetimes for range queries.
+    """
+    entry = dict(entry)
+    sent_at = entry.get("sentAt")
+    if isinstance(sent_at, str):
+        try:
+            sent_at = datetime.fromisoformat(sent_at)
+        except ValueError:
+            sent_at = None
+    entry["sentAt"] = sent_at if isinstance(sent_at, datetime) else fallback
+    return entry
+
+def build_buckets(contact: Dict[str, Any]) -> List[Dict[str, Any]]:
+    fallback = contact.get("createdAt") if isinstance(contact.get("createdAt"), datetime) else contact["_id"].generation_time.replace(tzinfo=None)
+    entries = sorted(
+        (normalize_entry(entry, fallback) for entry in contact.get("communications") or []),
+        key=lambda e: e["sentAt"]
+    )
+    size = settings.COMMUNICATIONS_BUCKET_SIZE
+    buckets = []
+    for seq, start in enumerate(range(0, len(entries), size)):
+        chunk = entries[start:start + size]
+        buckets.append({
+            "contact_email": contact["email"],
+            "migrated_from": contact["_id"],
+            "seq": seq,
+            "entries": chunk,
+            "count": len(chunk),
+            "first_at": chunk[0]["sentAt"],
+            "last_at": chunk[-1]["sentAt"]
+        })
+    return buckets
+
+async def migrate(batch_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    mongo_service = MongoService()
+    if not dry_run:
+        await mongo_service.ensure_indexes()
+        # Keeps the per-bucket upserts from scanning the collection
+        await mongo_service.communications_collection.create_index(
+            [("migrated_from", 1), ("seq", 1)],
+            unique=True,
+            partialFilterExpression={"migrated_from": {"$exists": True}}
+        )
+    totals = {"contacts": 0, "entries": 0, "buckets": 0}
+    query = {"communications": {"$exists": True}, "email": {"$exists": True}}
+    last_id = None
+
+    try:
+        while True:
+            batch_query = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+            contacts = await mongo_service.marketing_collection.find(
+                batch_query, projection={"email": 1, "communications": 1, "createdAt": 1}
+            ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not contacts:
+                break
+            last_id = contacts[-1]["_id"]
+
+            bucket_writes, contact_writes = [], []
+            for contact in contacts:
+                buckets = build_buckets(contact)
+                if buckets:
+                    latest = buckets[-1]["entries"][-1]
+                    # Only if the live path has not recorded something newer meanwhile
+                    contact_writes.append(UpdateOne(
+                        {
+                            "_id": contact["_id"],
+                            "$or": [
+                                {"lastCommunication": None},
+                                {"lastCommunication.sentAt": {"$lt": latest["sentAt"]}}
+                            ]
+                        },
+                        {"$set": {"lastCommunication": communication_summary(latest)}}
+                    ))
+                contact_writes.append(UpdateOne({"_id": contact["_id"]}, {"$unset": {"communications": ""}}))
+                for bucket in buckets:
+                    key = {"migrated_from": bucket.pop("migrated_from"), "seq": bucket.pop("seq")}
+                    bucket_writes.append(UpdateOne(key, {"$setOnInsert": bucket}, upsert=True))
+                totals["entries"] += sum(bucket["count"] for bucket in buckets)
+                totals["buckets"] += len(buckets)
+            totals["contacts"] += len(contacts)
+
+            if not dry_run:
+                # Buckets first: a crash in between leaves the arrays in place to retry
+                if bucket_writes:
+                    await mongo_service.communications_collection.bulk_write(bucket_writes, ordered=False)
+                await mongo_service.marketing_collection.bulk_write(contact_writes, ordered=False)
+            logger.info(f"Migrated {totals['contacts']} contacts, {totals['entries']} communications so far")
+    finally:
+        mongo_service.close()
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    totals = asyncio.run(migrate(batch_size=args.batch_size, dry_run=args.dry_run))
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {totals['contacts']} contacts: "
+          f"{totals['entries']} communications in {totals['buckets']} buckets")
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,26 @@ class EventModel(BaseModel):
             datetime: lambda dt: dt.isoformat()
         }
 
+class EventSummaryModel(BaseModel):
+    """
+    Events as returned by listings and sparse (``fields=``) reads: every field
+    is optional so projected documents validate.
+    """
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    name: Optional[str] = None
+    description: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    processed: Optional[bool] = None
+    data: Optional[Dict[str, Any]] = None
+
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {
+            ObjectId: str,
+            datetime: lambda dt: dt.isoformat()
+        }
+
 class EmailRequest(BaseModel):
     recipient: str
     subject: str
@@ -56,3 +76,46 @@ class CronJobModel(BaseModel):
             ObjectId: str,
             datetime: lambda dt: dt.isoformat()
         }
+
+class CronJobSummaryModel(BaseModel):
+    """
+    Cron jobs as returned by listings and sparse (``fields=``) reads: every
+    field is optional so projected documents validate.
+    """
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    name: Optional[str] = None
+    description: Optional[str] = None
+    schedule: Optional[str] = None
+    last_run: Optional[datetime] = None
+    next_run: Optional[datetime] = None
+    active: Optional[bool] = None
+
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {
+            ObjectId: str,
+            datetime: lambda dt: dt.isoformat()
+        }
+
+class DomainLimit(BaseModel):
+    concurrency: int = Field(gt=0)
+    rate: float = Field(gt=0, description="Messages per second")
+
+class CampaignRequest(BaseModel):
+    name: str
+    subject: str
+    template_name: str
+    template_data: Dict[str, Any] = {}
+    segment: Dict[str, Any] = Field(default_factory=dict, description="Mongo filter over the marketing collection")
+    domain_limits: Dict[str, DomainLimit] = Field(default_factory=dict, description="Per recipient domain overrides, e.g. gmail.com")
+
+class WorkflowStartRequest(BaseModel):
+    workflow: str = Field("email_logic.bpmn", description="BPMN file in app/workflows")
+    data: Dict[str, Any] = {}
+
+class BulkWorkflowRequest(BaseModel):
+    workflow: str = Field("email_logic.bpmn", description="BPMN file in app/workflows")
+    query: Dict[str, Any] = Field(default_factory=dict, description="Mongo filter over the marketing collection")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Extra fields for each instance's customer, e.g. premium")
+    limit: Optional[int] = Field(None, ge=1, description="At most this many instances (capped by WORKFLOW_BULK_MAX)")
@@ -0,0 +1,81 @@
+from decimal import Decimal
+from typing import Any, AsyncIterator, Mapping, Optional
+
+import orjson
+from bson import Decimal128, ObjectId, json_util
+from fastapi.responses import Response, StreamingResponse
+
+# Flush streamed JSON arrays to the client in chunks of roughly this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def orjson_default(obj: Any) -> Any:
+    """
+    Encode the BSON types orjson does not know natively. datetime is handled by
+    orjson itself and matches the isoformat() used by the models' json_encoders.
+
+    ObjectId and Decimal128 become strings. Other BSON values (Binary,
+    Timestamp, Regex, Code, MinKey/MaxKey, ...) use their relaxed Extended
+    JSON form, so a stored document never fails to encode halfway through a
+    streamed response.
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return json_util.default(obj, json_util.RELAXED_JSON_OPTIONS)
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=orjson_default)
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson, without FastAPI's jsonable_encoder pass.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an If-None-Match header (weak comparison, as RFC 7232 requires for GET).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def cached_document_response(entry, if_none_match: Optional[str]) -> Response:
+    """
+    Serve a cached document: 304 when the client's copy is current, otherwise
+    the pre-encoded JSON body. Both carry the ETag.
+    """
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+async def stream_json_array(documents: AsyncIterator[Mapping[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Encode raw documents from a Mongo cursor as one JSON array, without
+    building models or holding the whole page in memory.
+    """
+    buffer = bytearray(b"[")
+    first = True
+    async for document in documents:
+        if not first:
+            buffer += b","
+        buffer += dumps(document)
+        first = False
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
+
+def stream_documents(documents: AsyncIterator[Mapping[str, Any]]) -> StreamingResponse:
+    return StreamingResponse(stream_json_array(documents), media_type="application/json")
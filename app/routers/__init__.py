@@ -1,5 +1,2 @@
-from .events import router as events_router
-from .cron import router as cron_router
-from .email import router as email_router
-from .hubspot import router as hubspot_router
-from .metrics import router as metrics_router
+# Routers are imported by app.main on demand, driven by settings.ENABLED_ROUTERS,
+# so importing this package stays cheap.
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, Query
+from ..services.analytics_service import AnalyticsService
+from ..dependencies import get_api_key, get_analytics_service
+from ..responses import FastJSONResponse
+from typing import Dict, Any, Optional
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"],
+    dependencies=[Depends(get_api_key)],
+    responses={
+        404: {"description": "Not found"},
+        403: {"description": "Invalid API key"}
+    }
+)
+
+@router.get("/contacts-by-source", response_model=Dict[str, Any])
+async def get_contacts_by_source(
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """
+    Marketing contacts per source, as of the last rollup refresh.
+    """
+    return FastJSONResponse({
+        "sources": await analytics_service.contacts_by_source(),
+        "as_of": await analytics_service.freshness()
+    })
+
+@router.get("/contacts-by-source/daily", response_model=Dict[str, Any])
+async def get_contacts_by_source_daily(
+    days: int = Query(30, ge=1, le=366),
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """
+    New marketing contacts per source and day (by createdAt).
+    """
+    return FastJSONResponse({"days": await analytics_service.contacts_by_source_daily(days)})
+
+@router.get("/welcome-emails/daily", response_model=Dict[str, Any])
+async def get_welcome_emails_daily(
+    days: int = Query(30, ge=1, le=366),
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """
+    Welcome emails sent per day, from the send ledger.
+    """
+    return FastJSONResponse({"days": await analytics_service.welcome_emails_daily(days)})
+
+@router.get("/events/hourly", response_model=Dict[str, Any])
+async def get_events_hourly(
+    hours: int = Query(24, ge=1, le=24 * 31),
+    name: Optional[str] = None,
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """
+    Events per hour and event name (e.g. hubspot_webhook).
+    """
+    return FastJSONResponse({"hours": await analytics_service.events_hourly(hours, name=name)})
+
+@router.post("/refresh", response_model=Dict[str, Any])
+async def refresh_rollups(
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """
+    Refresh every rollup now instead of waiting for the background schedule.
+    """
+    return FastJSONResponse({"refreshed": await analytics_service.refresh()})
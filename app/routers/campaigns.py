@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Depends
+from jinja2 import TemplateNotFound
+from ..models.models import CampaignRequest
+from ..services.campaign_service import CampaignRunningElsewhere, CampaignService
+from ..dependencies import get_api_key, get_campaign_service
+from ..responses import FastJSONResponse
+from typing import Dict, Any
+from bson import ObjectId
+
+router = APIRouter(
+    prefix="/campaigns",
+    tags=["campaigns"],
+    dependencies=[Depends(get_api_key)],
+    responses={
+        404: {"description": "Not found"},
+        403: {"description": "Invalid API key"}
+    }
+)
+
+@router.post("/", response_model=Dict[str, Any])
+async def create_campaign(
+    campaign: CampaignRequest,
+    campaign_service: CampaignService = Depends(get_campaign_service)
+):
+    """
+    Create a campaign and start sending it in the background.
+
+    The segment is a Mongo filter over the marketing collection. Progress,
+    throughput and per-domain stats are available from GET /campaigns/{id}.
+    """
+    try:
+        created = await campaign_service.create_campaign(campaign)
+    except TemplateNotFound as e:
+        raise HTTPException(status_code=400, detail=f"Template not found: {e.name}")
+    campaign_id = str(created["_id"])
+    campaign_service.start(campaign_id)
+    return {"message": f"Campaign '{campaign.name}' started", "campaign_id": campaign_id}
+
+@router.get("/{campaign_id}")
+async def get_campaign(
+    campaign_id: str,
+    campaign_service: CampaignService = Depends(get_campaign_service)
+):
+    """
+    Get a campaign's status, checkpoint and delivery stats.
+    """
+    if not ObjectId.is_valid(campaign_id):
+        raise HTTPException(status_code=400, detail="Invalid campaign ID format")
+
+    campaign = await campaign_service.get_campaign(campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return FastJSONResponse(campaign)
+
+@router.post("/{campaign_id}/pause", response_model=Dict[str, str])
+async def pause_campaign(
+    campaign_id: str,
+    campaign_service: CampaignService = Depends(get_campaign_service)
+):
+    """
+    Pause a campaign after the batch in flight.
+    """
+    if not ObjectId.is_valid(campaign_id):
+        raise HTTPException(status_code=400, detail="Invalid campaign ID format")
+
+    if not await campaign_service.pause(campaign_id):
+        raise HTTPException(status_code=404, detail="No pending or running campaign with this ID")
+    return {"message": "Campaign paused"}
+
+@router.post("/{campaign_id}/resume", response_model=Dict[str, str])
+async def resume_campaign(
+    campaign_id: str,
+    campaign_service: CampaignService = Depends(get_campaign_service)
+):
+    """
+    Resume a paused or interrupted campaign from its last checkpoint in this
+    worker. Answers 409 if another worker is still running it.
+    """
+    if not ObjectId.is_valid(campaign_id):
+        raise HTTPException(status_code=400, detail="Invalid campaign ID format")
+
+    try:
+        resumed = await campaign_service.resume(campaign_id)
+    except CampaignRunningElsewhere as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not resumed:
+        raise HTTPException(status_code=404, detail="No paused or running campaign with this ID")
+    return {"message": "Campaign resumed"}
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends
-from ..models.models import CronJobModel
-from ..services.mongo_service import MongoService
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from ..models.models import CronJobModel, CronJobSummaryModel
+from ..services.mongo_service import MongoService, CRON_JOB_FIELDS
+from ..dependencies import get_mongo_service, field_projection
+from ..responses import stream_documents, cached_document_response
+from typing import List, Dict, Any, Optional
 from bson import ObjectId
 from datetime import datetime
 
@@ -11,32 +13,49 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-async def get_mongo_service():
-    return MongoService()
-
-@router.get("/", response_model=List[CronJobModel])
+@router.get("/", response_model=List[CronJobSummaryModel], response_model_exclude_unset=True)
 async def get_cron_jobs(
     skip: int = 0, 
     limit: int = 100,
+    raw: bool = Query(False, description="Stream stored documents as-is, encoded with orjson and without model validation"),
+    projection: Optional[Dict[str, int]] = Depends(field_projection(CRON_JOB_FIELDS)),
     mongo_service: MongoService = Depends(get_mongo_service)
 ):
     """
     Get all cron jobs with pagination.
+
+    With ``raw=true`` the documents are streamed exactly as stored, skipping
+    model construction and response validation. This is much cheaper for large
+    pages, but fields missing from a document are omitted instead of filled
+    with model defaults.
     """
-    return await mongo_service.get_all_cron_jobs(limit=limit, skip=skip)
+    if raw:
+        return stream_documents(mongo_service.stream_cron_jobs(limit=limit, skip=skip, projection=projection))
+    return await mongo_service.get_all_cron_jobs(limit=limit, skip=skip, projection=projection)
 
-@router.get("/{job_id}", response_model=CronJobModel)
+@router.get("/{job_id}", response_model=CronJobSummaryModel, response_model_exclude_unset=True)
 async def get_cron_job(
     job_id: str,
+    if_none_match: Optional[str] = Header(None),
+    projection: Optional[Dict[str, int]] = Depends(field_projection(CRON_JOB_FIELDS)),
     mongo_service: MongoService = Depends(get_mongo_service)
 ):
     """
     Get a specific cron job by ID.
+
+    Full-document reads are served from the read-through cache and carry an
+    ETag; a matching If-None-Match gets a 304 without touching the database.
     """
     if not ObjectId.is_valid(job_id):
         raise HTTPException(status_code=400, detail="Invalid job ID format")
-        
-    job = await mongo_service.get_cron_job(job_id)
+
+    if projection is None:
+        entry = await mongo_service.get_cron_job_entry(job_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Cron job not found")
+        return cached_document_response(entry, if_none_match)
+
+    job = await mongo_service.get_cron_job(job_id, projection=projection)
     if not job:
         raise HTTPException(status_code=404, detail="Cron job not found")
     return job
@@ -1,36 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Header
+from fastapi import APIRouter, Depends, BackgroundTasks
 from ..models.models import EmailRequest
 from ..services.email_service import EmailService
 from ..services.mongo_service import MongoService
+from ..dependencies import get_api_key, get_email_service, get_mongo_service
 from typing import Dict, Any
 
-import os
-from fastapi.security.api_key import APIKeyHeader
-from starlette.status import HTTP_403_FORBIDDEN
-
 
 router = APIRouter(
     prefix="/email",
     tags=["email"],
     responses={404: {"description": "Not found"}}
 )
-# Configure OpenAI with API key from environment
-
-# Set up API key authentication
-API_KEY = os.getenv("INTERNAL_API_KEY")
-API_KEY_NAME = "X-API-Key"
-api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
-
-async def get_api_key(api_key_header: str = Depends(api_key_header)):
-    if api_key_header == API_KEY:
-        return api_key_header
-    raise HTTPException(
-        status_code=HTTP_403_FORBIDDEN, detail="Could not validate API key"
-    )
-
-async def get_email_service():
-    return EmailService()
-
 @router.post("/send", response_model=Dict[str, str])
 async def send_email(
     email_request: EmailRequest,
@@ -57,17 +37,13 @@ async def send_email(
 @router.post("/marketing_email", response_model=Dict[str, str])
 async def generate_marketing_email(
     user_context: Dict[str, Any],
+    mongo_service: MongoService = Depends(get_mongo_service),
     api_key: str = Depends(get_api_key)
 ):
 
-    mongo_service = MongoService()
-    system_metrics_doc = await mongo_service.db.system_metrics.find_one()
-    #print(f"System metrics: {system_metrics_doc}")
-
-    if system_metrics_doc and "marketing_email_gen_prompt" in system_metrics_doc:
-        marketing_email_gen_prompt = system_metrics_doc["marketing_email_gen_prompt"]
-    else:
-        return {"message": "No marketing email gen prompt found"}   
+    marketing_email_gen_prompt = await mongo_service.get_config_value("marketing_email_gen_prompt")
+    if not marketing_email_gen_prompt:
+        return {"message": "No marketing email gen prompt found"}
 
     marketing_collection = mongo_service.db.marketing
     docs = []
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from ..models.models import EventModel
-from ..services.mongo_service import MongoService
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from ..models.models import EventModel, EventSummaryModel
+from ..services.mongo_service import MongoService, EVENT_FIELDS, EVENT_LIST_EXCLUDE
+from ..services.retention_service import RetentionService, ArchiveReader
+from ..dependencies import get_api_key, get_mongo_service, get_retention_service, field_projection
+from ..responses import stream_documents, cached_document_response, FastJSONResponse
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+from itertools import islice
 from bson import ObjectId
+import asyncio
 
 router = APIRouter(
     prefix="/events",
@@ -10,32 +16,76 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-async def get_mongo_service():
-    return MongoService()
-
-@router.get("/", response_model=List[EventModel])
+@router.get("/", response_model=List[EventSummaryModel], response_model_exclude_unset=True)
 async def get_events(
     skip: int = 0, 
     limit: int = 100,
+    raw: bool = Query(False, description="Stream stored documents as-is, encoded with orjson and without model validation"),
+    projection: Optional[Dict[str, int]] = Depends(field_projection(EVENT_FIELDS, EVENT_LIST_EXCLUDE)),
     mongo_service: MongoService = Depends(get_mongo_service)
 ):
     """
     Get all events with pagination.
+
+    With ``raw=true`` the documents are streamed exactly as stored, skipping
+    model construction and response validation. This is much cheaper for large
+    pages, but fields missing from a document are omitted instead of filled
+    with model defaults.
+    """
+    if raw:
+        return stream_documents(mongo_service.stream_events(limit=limit, skip=skip, projection=projection))
+    return await mongo_service.get_all_events(limit=limit, skip=skip, projection=projection)
+
+@router.post("/archive/run", dependencies=[Depends(get_api_key)])
+async def run_archive(
+    older_than_days: Optional[float] = Query(None, ge=0, description="Defaults to RETENTION_DAYS"),
+    retention_service: RetentionService = Depends(get_retention_service)
+):
+    """
+    Archive and delete processed events older than ``older_than_days`` now.
+    """
+    return await retention_service.archive_events(older_than_days=older_than_days)
+
+@router.get("/archive", dependencies=[Depends(get_api_key)])
+async def query_archive(
+    start: datetime,
+    end: datetime,
+    name: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    retention_service: RetentionService = Depends(get_retention_service)
+):
     """
-    return await mongo_service.get_all_events(limit=limit, skip=skip)
+    Get archived events with a timestamp between ``start`` and ``end``.
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    reader = ArchiveReader(retention_service.store)
+    events = await asyncio.to_thread(lambda: list(islice(reader.query(start, end, name), limit)))
+    return FastJSONResponse(events)
 
-@router.get("/{event_id}", response_model=EventModel)
+@router.get("/{event_id}", response_model=EventSummaryModel, response_model_exclude_unset=True)
 async def get_event(
     event_id: str,
+    if_none_match: Optional[str] = Header(None),
+    projection: Optional[Dict[str, int]] = Depends(field_projection(EVENT_FIELDS)),
     mongo_service: MongoService = Depends(get_mongo_service)
 ):
     """
     Get a specific event by ID.
+
+    Full-document reads are served from the read-through cache and carry an
+    ETag; a matching If-None-Match gets a 304 without touching the database.
     """
     if not ObjectId.is_valid(event_id):
         raise HTTPException(status_code=400, detail="Invalid event ID format")
-        
-    event = await mongo_service.get_event(event_id)
+
+    if projection is None:
+        entry = await mongo_service.get_event_entry(event_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Event not found")
+        return cached_document_response(entry, if_none_match)
+
+    event = await mongo_service.get_event(event_id, projection=projection)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     return event
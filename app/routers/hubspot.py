@@ -1,137 +1,63 @@
 from fastapi import APIRouter, HTTPException, Request, Depends, Header
 from typing import Dict, Any, Optional
-from ..services.mongo_service import MongoService
-from ..models.models import EventModel
+from ..services.mongo_service import MongoService, MARKETING_LIST_EXCLUDE
+from ..services.email_service import EmailService
+from ..services.send_ledger import SendLedger
+from ..services.hubspot_client import get_contacts_api
+from ..services.hubspot_webhooks import (
+    DEFERRABLE_ERRORS, process_contact_creation, upstream_timeout
+)
+from ..services.resilience import get_dependency
+from ..services.retry_queue import RetryQueue
+from ..services.webhook_auth import verify_hubspot_signature
+from ..dependencies import get_api_key, get_mongo_service, get_email_service, get_send_ledger, get_retry_queue, field_projection
+from ..responses import FastJSONResponse
 from datetime import datetime
-import json
 import logging
-from hubspot import HubSpot
-from hubspot.crm.contacts import ApiException
-import os
-from ..services.email_service import EmailService
+import orjson
 from ..config import settings
-from fastapi.security.api_key import APIKeyHeader
-from starlette.status import HTTP_403_FORBIDDEN
-import requests
-
-access_token = os.getenv("HUBSPOT_TOKEN")
-client = HubSpot(access_token=access_token)
-email_service = EmailService()
-
-# Set up API key authentication
-API_KEY = os.getenv("INTERNAL_API_KEY")
-API_KEY_NAME = "X-API-Key"
-api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
-
-async def get_api_key(api_key_header: str = Depends(api_key_header)):
-    if api_key_header == API_KEY:
-        return api_key_header
-    raise HTTPException(
-        status_code=HTTP_403_FORBIDDEN, detail="Could not validate API key"
-    )
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("hubspot_webhook")
 
-async def send_welcome_email(email, first_name=None, company_name=None, mongo_service=None):
-    """
-    Send a welcome email to a new contact.
-    """
-    try:
-        # Prepare template data with more parameters
-        print(f"Sending welcome email to {email} with first_name: {first_name}, company_name: {company_name}")
-        
-        current_time = datetime.now()
-        template_data = {
-                "email": email,
-                "name": (first_name or "").capitalize(),  # Default to "there" if first_name is None
-                "company": company_name or "",  # Empty string if company_name is None
-                "app_name": settings.APP_NAME,
-                "contact_email": settings.SMTP_FROM,
-                "company_name": "JediTeck",
-                "support_email": "support@jediteck.com",
-                "website_url": "https://jediteck.com",
-                "current_year": "2025"
-            }
-        # check if the email already exists in marketing collection
-        if mongo_service:
-            existing_contact = await mongo_service.marketing_collection.find_one({"email": email})
-            if existing_contact and existing_contact.get("source") == "newsletter":
-                logger.info(f"Contact {email} already exists in marketing collection as a newsletter signup")
-                template_name="welcome_email_newsletter"
-            else:   
-                if first_name:
-                    template_name="welcome_email"
-                else:
-                    template_name="welcome_email_noname"
-        else:
-            # Default template if mongo_service is not available
-            template_name = "welcome_email" if first_name else "welcome_email_noname"
-
-        print(f"Using template: {template_name}")
-        # Send welcome email using template
-        success = await email_service.send_email(
-            recipient=email,
-            cc=settings.SMTP_CC,
-            subject=f"Welcome to {settings.APP_NAME}",
-            template_name=template_name,
-            template_data=template_data
-        )
-        
-        if success:
-            logger.info(f"Welcome email sent to {email}")
-            return {
-                "success": True, 
-                "subject": f"Welcome to {settings.APP_NAME}", 
-                "message": f"Welcome email sent to {email}", 
-                "sentAt": current_time.isoformat(), 
-                "messageType": "welcome", 
-                "status": "sent", 
-                "sentSuccessfully": True,
-                "template_name": template_name
-            }
-        else:
-            logger.error(f"Failed to send welcome email to {email}")
-            return {"success": False, "message": "Failed to send welcome email"}
-    except Exception as e:
-        logger.error(f"Error sending welcome email to {email}: {str(e)}")
-        return {"success": False, "message": f"Error sending welcome email: {str(e)}"}
-
-def get_contact_details(object_id):
-    """
-    Retrieve contact details from HubSpot using the contact ID.
-    
-    Args:
-        object_id: The HubSpot contact ID
-        
-    Returns:
-        Contact properties dictionary or None if an error occurs
-    """
-    try:
-        response = client.crm.contacts.basic_api.get_by_id(
-            contact_id=object_id,
-            properties=["email", "firstname", "lastname", "company"]
-        )
-        return response.properties
-    except ApiException as e:
-        logger.error(f"Error fetching contact {object_id}: {e}")
-        return None
-
 router = APIRouter(
     prefix="/hubspot",
     tags=["hubspot"],
     responses={404: {"description": "Not found"}}
 )
 
-async def get_mongo_service():
-    return MongoService()
+async def read_webhook_body(request: Request) -> bytes:
+    """
+    Read the raw request body once, rejecting it as soon as it exceeds
+    WEBHOOK_MAX_BODY_BYTES.
+    """
+    too_large = HTTPException(status_code=413, detail="Webhook payload too large")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.WEBHOOK_MAX_BODY_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.WEBHOOK_MAX_BODY_BYTES:
+            raise too_large
+    return bytes(body)
+
+def webhook_uri(request: Request) -> str:
+    if settings.HUBSPOT_WEBHOOK_URL:
+        query = request.url.query
+        return settings.HUBSPOT_WEBHOOK_URL + (f"?{query}" if query else "")
+    return str(request.url)
 
 @router.post("/webhook", response_model=Dict[str, str])
 async def hubspot_webhook(
     request: Request,
     mongo_service: MongoService = Depends(get_mongo_service),
-    x_hubspot_signature: Optional[str] = Header(None)
+    email_service: EmailService = Depends(get_email_service),
+    send_ledger: SendLedger = Depends(get_send_ledger),
+    retry_queue: RetryQueue = Depends(get_retry_queue),
+    x_hubspot_signature_v3: Optional[str] = Header(None),
+    x_hubspot_request_timestamp: Optional[str] = Header(None)
 ):
     """
     Webhook endpoint for HubSpot events.
@@ -139,109 +65,62 @@ async def hubspot_webhook(
     This endpoint receives webhook notifications from HubSpot when events occur
     in your HubSpot account. The events are stored in the database for processing.
     
-    In a production environment, you should validate the x-hubspot-signature header
-    to ensure the request is coming from HubSpot.
+    The body is read once and the v3 signature is checked over the raw bytes.
+    Forged, stale, unsigned or oversized requests are rejected before any
+    database or HubSpot call. Without HUBSPOT_CLIENT_SECRET every request is
+    rejected, unless HUBSPOT_WEBHOOK_ALLOW_UNSIGNED is set.
+
+    If HubSpot or AbstractAPI is unavailable (circuit open, bulkhead full or
+    timed out), the event is queued for retry and acknowledged as deferred.
     """
+    body = await read_webhook_body(request)
+    if not settings.HUBSPOT_CLIENT_SECRET:
+        if not settings.HUBSPOT_WEBHOOK_ALLOW_UNSIGNED:
+            logger.warning("Rejected HubSpot webhook: HUBSPOT_CLIENT_SECRET is not set")
+            raise HTTPException(status_code=401, detail="Webhook signature cannot be verified")
+    elif not verify_hubspot_signature(
+        settings.HUBSPOT_CLIENT_SECRET,
+        request.method,
+        webhook_uri(request),
+        body,
+        x_hubspot_signature_v3,
+        x_hubspot_request_timestamp,
+        settings.HUBSPOT_WEBHOOK_MAX_AGE_SECONDS
+    ):
+        logger.warning("Rejected HubSpot webhook with an invalid signature")
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
     try:
-        # Get the raw payload
-        payload = await request.json()
-        logger.info(f"Received HubSpot webhook: {json.dumps(payload, indent=2)}")
+        # Log the bytes as received; the parsed payload is reused below
+        logger.info(f"Received HubSpot webhook: {body.decode('utf-8', 'replace')}")
         
         # Handle case where HubSpot sends an array with a single object
         if isinstance(payload, list) and len(payload) > 0:
             payload = payload[0]  # Extract the first item from the array
-        
-        # TODO: In production, validate the HubSpot signature
-        # if x_hubspot_signature:
-        #     # Implement signature validation logic here
-        #     pass
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=400, detail="Invalid webhook payload")
         
         # Process contact creation events
         if payload.get("subscriptionType") == "contact.creation" and payload.get("objectId"):
-            # Get contact details from HubSpot
-            contact_id = payload.get("objectId")
-            contact_details = get_contact_details(contact_id)
-            
-            if contact_details and "email" in contact_details:
-                # Store contact in marketing_contacts collection
-                # Maintain the existing document structure
-                contact_data = {
-                    "email": contact_details.get("email", ""),
-                    "name": f"{contact_details.get('firstname', '')} {contact_details.get('lastname', '')}".strip(),
-                    "company": contact_details.get("company", ""),
-                    "source": payload.get("changeSource", ""),
-                    "createdAt": datetime.now(),
-                    "timestamp": datetime.now().isoformat(),
-                    "hubspot_id": contact_id,
-                    "hubspot_data": payload
+            try:
+                await process_contact_creation(payload, mongo_service, email_service, send_ledger, retry_queue)
+            except DEFERRABLE_ERRORS as e:
+                reason = str(e) or type(e).__name__
+                await retry_queue.enqueue("hubspot_webhook", payload, reason=reason)
+                return {
+                    "status": "deferred",
+                    "message": f"Webhook received; processing deferred ({reason})",
                 }
-                email = contact_details["email"]
-
-                abstract_api_key = os.getenv("ABSTRACT_API_KEY")
-                response = requests.get(f"https://emailvalidation.abstractapi.com/v1/?api_key={abstract_api_key}&email={email}")
-                print(response.status_code)
-                print(response.content)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("is_valid_format") and data.get("deliverability") == "DELIVERABLE":
-                         # Store in marketing contacts collection
-                        await mongo_service.create_or_update_marketing_contact(
-                            email=contact_details["email"],
-                            contact_data=contact_data
-                        )
-                        
-                        logger.info(f"Stored contact {contact_id} in marketing_contacts collection")
-                                                
-                        # Create an event for each webhook notification
-                        event = EventModel(
-                            name="hubspot_webhook",
-                            description="HubSpot webhook notification",
-                            data=payload,
-                            processed=False,
-                            timestamp=datetime.now()
-                        )
-                        
-                        # Store the event in MongoDB
-                        stored_event = await mongo_service.create_event(event)
-                        
-                        # Send welcome email
-                        success = await send_welcome_email(
-                            email=contact_details["email"], 
-                            first_name=contact_details.get("firstname"), 
-                            company_name=contact_details.get("company"),
-                            mongo_service=mongo_service
-                        )
-                        # {"success": True , "subject": f"Welcome to {settings.APP_NAME}", "message": f"Welcome email sent to {contact_details['email']}", "sentAt": current_time.isoformat(), "messageType": "welcome", "status": "sent", "sentSuccessfully": True}
-                    
-                        if "communications" not in contact_data:
-                            contact_data["communications"] = []
-                        if success["success"]:
-                            # Add the welcome email to communications
-                            contact_data["communications"].append({
-                                "type": "email",
-                                "subject": success["subject"],
-                                "content": success["message"],
-                                "sentAt": success["sentAt"],
-                                "messageType": "welcome",
-                                "status": "sent",
-                                "sentSuccessfully": True
-                            })
-
-                            # Update the timestamp
-                            contact_data["lastCommunication"] = success["sentAt"]
-
-                            await mongo_service.create_or_update_marketing_contact(
-                                email=contact_details["email"],
-                                contact_data=contact_data
-                            )
-                    else:
-                        print("Email is invalid")
-                else:
-                    print("Error checking email")
         return {
             "status": "success",
             "message": "Webhook received and processed",
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing HubSpot webhook: {str(e)}")
         raise HTTPException(
@@ -251,31 +130,28 @@ async def hubspot_webhook(
 
 @router.get("/contacts", response_model=Dict[str, Any])
 async def get_hubspot_contacts(
+    skip: int = 0,
+    limit: int = 1000,
+    projection: Optional[Dict[str, int]] = Depends(field_projection(default_exclude=MARKETING_LIST_EXCLUDE)),
     mongo_service: MongoService = Depends(get_mongo_service),
     api_key: str = Depends(get_api_key)
 ):
     """
-    Get all contacts from the marketing collection.
+    Get contacts from the marketing collection.
     
+    The heavy hubspot_data payload and communications history are left out
+    unless requested with ``fields`` (e.g. ``fields=email,name`` or ``fields=*``).
     This endpoint is protected with API key authentication.
     """
     try:
-        # Initialize marketing collection if not already done
-        if not hasattr(mongo_service, 'marketing_collection'):
-            mongo_service.marketing_collection = mongo_service.db.marketing
-            
-        # Find all contacts in the marketing collection
-        contacts = await mongo_service.marketing_collection.find().to_list(1000)
+        contacts = await mongo_service.get_marketing_contacts(limit=limit, skip=skip, projection=projection)
         
-        # Convert ObjectId to string for JSON serialization
-        for contact in contacts:
-            contact["_id"] = str(contact["_id"])
-        
-        return {
+        # Encoded with orjson (ObjectId as str) instead of jsonable_encoder
+        return FastJSONResponse({
             "status": "success",
             "count": len(contacts),
             "contacts": contacts
-        }
+        })
     except Exception as e:
         logger.error(f"Error fetching contacts: {str(e)}")
         raise HTTPException(
@@ -283,6 +159,27 @@ async def get_hubspot_contacts(
             detail=f"Error fetching contacts: {str(e)}"
         )
 
+@router.get("/contacts/{email}/communications", response_model=Dict[str, Any])
+async def get_contact_communications(
+    email: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    mongo_service: MongoService = Depends(get_mongo_service),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Get the communications sent to a contact, newest first.
+
+    This endpoint is protected with API key authentication.
+    """
+    communications = await mongo_service.get_communications(email, since=since, until=until, limit=limit)
+    return FastJSONResponse({
+        "status": "success",
+        "count": len(communications),
+        "communications": communications
+    })
+
 @router.post("/sync-contacts", response_model=Dict[str, Any])
 async def sync_hubspot_contacts(
     mongo_service: MongoService = Depends(get_mongo_service),
@@ -320,11 +217,14 @@ async def sync_hubspot_contacts(
         has_more = True
         
         while has_more and (limit is None or total_contacts < limit):
-            # Fetch contacts from HubSpot
-            contacts_page = client.crm.contacts.basic_api.get_page(
-                limit=100,  # HubSpot API page size
-                after=after,
-                properties=["email", "firstname", "lastname", "company", "createdate"]
+            # Fetch contacts from HubSpot (in a thread, under the hubspot breaker)
+            contacts_page = await get_dependency("hubspot").call_sync(
+                lambda: get_contacts_api().get_page(
+                    limit=100,  # HubSpot API page size
+                    after=after,
+                    properties=["email", "firstname", "lastname", "company", "createdate"],
+                    _request_timeout=upstream_timeout(settings.HUBSPOT_TIMEOUT)
+                )
             )
             
             # Process each contact
@@ -364,8 +264,7 @@ async def sync_hubspot_contacts(
                     "hubspot_data": {
                         "id": contact.id,
                         "properties": properties
-                    },
-                    "communications": []  # Initialize empty communications array
+                    }
                 }
                 
                 # Insert new contact directly (not update)
@@ -397,6 +296,9 @@ async def sync_hubspot_contacts(
             "message": f"Successfully synchronized {synced_contacts} contacts from HubSpot ({already_exists} already existed)"
         }
         
+    except DEFERRABLE_ERRORS as e:
+        logger.warning(f"HubSpot unavailable during contact synchronization: {str(e)}")
+        raise HTTPException(status_code=503, detail="HubSpot is unavailable; try again later")
     except Exception as e:
         logger.error(f"Error synchronizing HubSpot contacts: {str(e)}")
         raise HTTPException(
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from ..services.mongo_service import MongoService
-from typing import Dict, Optional
-import os
+from ..middleware.admission import admission_stats
+from ..services.resilience import dependency_stats
+from ..services.retry_queue import RetryQueue
+from ..services.send_ledger import SendLedger
+from ..dependencies import get_mongo_service, get_retry_queue, get_send_ledger, is_valid_api_key
+from typing import Any, Dict, Optional
 from starlette.status import HTTP_403_FORBIDDEN
 
 router = APIRouter(
@@ -13,15 +17,11 @@ router = APIRouter(
     }
 )
 
-async def get_mongo_service():
-    return MongoService()
-
 async def verify_api_key(x_api_key: Optional[str] = Header(None, alias="X-API-Key")):
     """
     Verify that the API key in the header matches the internal API key.
     """
-    internal_key = os.getenv("INTERNAL_API_KEY")
-    if not x_api_key or x_api_key != internal_key:
+    if not is_valid_api_key(x_api_key):
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN,
             detail="Invalid API key"
@@ -34,23 +34,58 @@ async def increment_agent_count(
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Increment the agent_count field in the system_metrics collection.
-    Creates the field if it doesn't exist.
+    Increment the agent_count counter in the counters collection.
+    Creates the counter if it doesn't exist, starting from the legacy
+    system_metrics value.
     Requires a valid API key in the X-API-Key header.
     """
     try:
-        # Update the document and return the new value
-        result = await mongo_service.db.system_metrics.find_one_and_update(
-            {},  # empty filter to match the first document
-            {"$inc": {"agent_count": 1}},  # increment by 1
-            upsert=True,  # create if doesn't exist
-            return_document=True  # return the updated document
-        )
-        
-        if result:
-            return {"agent_count": result.get("agent_count", 1)}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to update agent count")
-            
+        return {"agent_count": await mongo_service.increment_counter("agent_count")}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating agent count: {str(e)}")
+
+@router.get("/cache", response_model=Dict[str, Any])
+async def get_cache_stats(
+    mongo_service: MongoService = Depends(get_mongo_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Hit ratio, size and approximate memory of this process's document cache.
+    Requires a valid API key in the X-API-Key header.
+    """
+    return mongo_service.cache.stats()
+
+@router.get("/send-ledger", response_model=Dict[str, Any])
+async def get_send_ledger_stats(
+    send_ledger: SendLedger = Depends(get_send_ledger),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Claims, suppressed duplicates and bloom filter use of this process's send ledger.
+    Requires a valid API key in the X-API-Key header.
+    """
+    return send_ledger.get_stats()
+
+@router.get("/dependencies", response_model=Dict[str, Any])
+async def get_dependency_stats(
+    retry_queue: RetryQueue = Depends(get_retry_queue),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Circuit breaker state, in-flight calls and rejections for each upstream
+    dependency in this process, plus retry queue jobs by status.
+    Requires a valid API key in the X-API-Key header.
+    """
+    return {
+        "dependencies": dependency_stats(),
+        "retry_queue": await retry_queue.get_stats()
+    }
+
+@router.get("/admission", response_model=Dict[str, Any])
+async def get_admission_stats(api_key: str = Depends(verify_api_key)):
+    """
+    Event loop lag and, per route class, in-flight, admitted and shed
+    requests in this process.
+    Requires a valid API key in the X-API-Key header.
+    """
+    return admission_stats()
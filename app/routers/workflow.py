@@ -1,30 +1,102 @@
-# app/routers/workflow.py
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from app.services.workflow_engine import load_workflow
-from app.services.email_service import EmailService
+from ..models.models import WorkflowStartRequest, BulkWorkflowRequest
+from ..services.workflow_engine import WorkflowError
+from ..services.workflow_service import WorkflowService
+from ..dependencies import get_api_key, get_workflow_service
+from ..responses import FastJSONResponse
+from typing import Dict, Any
+from bson import ObjectId
 
-router = APIRouter()
+router = APIRouter(
+    prefix="/workflow",
+    tags=["workflow"],
+    dependencies=[Depends(get_api_key)],
+    responses={404: {"description": "Not found"}}
+)
 
 class EmailWorkflowInput(BaseModel):
     name: str
     email: str
     premium: bool
 
-@router.post("/workflow/email")
-async def run_email_workflow(payload: EmailWorkflowInput):
-    wf = load_workflow("app/workflows/email_logic.bpmn", {"customer": payload.dict()})
+async def start_instance(workflow_service: WorkflowService, workflow: str, data: Dict[str, Any]) -> Dict[str, str]:
+    try:
+        instance_id = await workflow_service.start_instance(workflow, data)
+    except (WorkflowError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow: {str(e)}")
+    return {"message": f"Workflow {workflow} started", "instance_id": str(instance_id)}
 
-    while True:
-        tasks = wf.get_ready_tasks()
-        if not tasks:
-            break
+@router.post("/email", response_model=Dict[str, str], status_code=202)
+async def run_email_workflow(
+    payload: EmailWorkflowInput,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """
+    Start the welcome email workflow (app/workflows/email_logic.bpmn) for one customer.
 
-        for task in tasks:
-            if task.task_spec.name == "Send Premium Email":
-                await EmailService().send_email(payload.email, "email/welcome_email.html", {"name": payload.name, "premium": True})
-            elif task.task_spec.name == "Send Basic Email":
-                await EmailService().send_email(payload.email, "email/welcome_email.html", {"name": payload.name, "premium": False})
-            wf.complete_task_from_id(task.id)
+    The instance runs in the background; follow it with GET /workflow/instances/{id}.
+    """
+    return await start_instance(workflow_service, "email_logic.bpmn", {"customer": payload.dict()})
 
-    return {"message": f"Workflow completed for {payload.email}"}
+@router.post("/instances", response_model=Dict[str, str], status_code=202)
+async def start_workflow(
+    request: WorkflowStartRequest,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """
+    Start any workflow in app/workflows with the given instance data.
+    """
+    return await start_instance(workflow_service, request.workflow, request.data)
+
+@router.get("/instances/{instance_id}")
+async def get_workflow_instance(
+    instance_id: str,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """
+    Get an instance's status, saved state and step history.
+    """
+    if not ObjectId.is_valid(instance_id):
+        raise HTTPException(status_code=400, detail="Invalid instance ID format")
+
+    instance = await workflow_service.get_instance(instance_id)
+    if not instance:
+        raise HTTPException(status_code=404, detail="Workflow instance not found")
+    return FastJSONResponse(instance)
+
+@router.post("/bulk", response_model=Dict[str, Any], status_code=202)
+async def start_bulk_workflow(
+    request: BulkWorkflowRequest,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """
+    Start a workflow for every marketing contact matching ``query``.
+
+    Each instance's ``customer`` is the contact's email, name and company plus
+    ``data``. The run is recorded and the response returned at once; the
+    instances are created in streamed batches in the background and run by
+    the workers. GET /workflow/bulk/{bulk_id} reports progress.
+    """
+    try:
+        bulk_id = await workflow_service.start_bulk(request.workflow, request.query, request.data, limit=request.limit)
+    except (WorkflowError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow: {str(e)}")
+    return {"message": "Bulk run accepted; instances are being created", "bulk_id": str(bulk_id), "status": "creating"}
+
+@router.get("/bulk/{bulk_id}", response_model=Dict[str, Any])
+async def get_bulk_workflow(
+    bulk_id: str,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """
+    Report whether a bulk run is still creating instances (status creating,
+    created or failed) and count its instances by status.
+    """
+    if not ObjectId.is_valid(bulk_id):
+        raise HTTPException(status_code=400, detail="Invalid bulk ID format")
+
+    run = await workflow_service.get_bulk_status(bulk_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    return {"bulk_id": bulk_id, "total": sum(run["by_status"].values()), **run}
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from ..config import settings
+from .leases import acquire_lease, release_lease
+from .mongo_profiles import with_profile
+from .mongo_service import MongoService
+
+logger = logging.getLogger("analytics")
+
+class Rollup(NamedTuple):
+    """
+    An incrementally maintained aggregate: documents of ``source`` grouped by
+    ``keys`` and by the ``granularity`` bucket of their ``time_field``, merged
+    into ``target``.
+    """
+    name: str
+    source: str
+    time_field: str
+    granularity: str  # "day" or "hour"
+    target: str
+    keys: Dict[str, Any] = {}
+    match: Dict[str, Any] = {}
+
+BUCKET_FORMATS = {"day": "%Y-%m-%d", "hour": "%Y-%m-%dT%H:00"}
+
+ROLLUPS = [
+    Rollup(
+        name="contacts_by_source_daily",
+        source="marketing",
+        time_field="createdAt",
+        granularity="day",
+        target="rollup_contacts_by_source_daily",
+        keys={"source": {"$ifNull": ["$source", "unknown"]}}
+    ),
+    Rollup(
+        name="welcome_emails_daily",
+        source="send_ledger",
+        time_field="sentAt",
+        granularity="day",
+        target="rollup_welcome_emails_daily",
+        match={"messageType": "welcome", "status": "sent"}
+    ),
+    Rollup(
+        name="events_hourly",
+        source="events",
+        time_field="timestamp",
+        granularity="hour",
+        target="rollup_events_hourly",
+        keys={"name": "$name"}
+    ),
+]
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class AnalyticsService:
+    """
+    Materialized rollups of the marketing, send_ledger and events collections.
+
+    Each rollup keeps a watermark (the time up to which it has been computed).
+    A refresh aggregates only the source documents from the start of the
+    watermark's bucket up to now, and $merges the recomputed buckets into the
+    rollup collection, replacing them. Recomputing whole buckets keeps a
+    refresh idempotent: a run interrupted before its watermark is saved simply
+    redoes the same buckets. Read endpoints then serve small, indexed rollup
+    documents instead of scanning the sources.
+    """
+
+    def __init__(self, mongo_service: MongoService):
+        self.mongo_service = mongo_service
+        self.db = mongo_service.db
+        self.watermarks = self.db.analytics_watermarks
+
+    def _rollup(self, name: str):
+        # Reads tolerate lag (rollups are refreshed every interval anyway)
+        return with_profile(self.db[name], "analytics")
+
+    async def ensure_indexes(self):
+        # Refreshes read each source by its time field; reads go by bucket
+        await self.db.marketing.create_index("createdAt")
+        await self.db.events.create_index("timestamp")
+        for rollup in ROLLUPS:
+            await self.db[rollup.target].create_index("bucket")
+
+    async def refresh_rollup(self, rollup: Rollup, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.now()
+        watermark = await self.watermarks.find_one({"_id": rollup.name})
+        time_filter: Dict[str, Any] = {"$lt": now}
+        if watermark:
+            time_filter["$gte"] = bucket_start(watermark["value"], rollup.granularity)
+        else:
+            # First run: backfill everything that has the time field
+            time_filter["$type"] = "date"
+
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {**rollup.match, rollup.time_field: time_filter}},
+            {"$group": {
+                "_id": {
+                    **rollup.keys,
+                    "bucket": {"$dateToString": {"format": BUCKET_FORMATS[rollup.granularity], "date": f"${rollup.time_field}"}}
+                },
+                "count": {"$sum": 1}
+            }},
+            {"$set": {"bucket": "$_id.bucket", **{key: f"$_id.{key}" for key in rollup.keys}, "updatedAt": now}},
+            {"$merge": {"into": rollup.target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+        await self.db[rollup.source].aggregate(pipeline).to_list(None)
+        await self.watermarks.update_one({"_id": rollup.name}, {"$set": {"value": now, "refreshedAt": datetime.now()}}, upsert=True)
+        return {"rollup": rollup.name, "from": time_filter.get("$gte"), "to": now}
+
+    async def refresh_source_totals(self):
+        """
+        Contacts by source in total, folded from the (small) daily rollup.
+        """
+        await self.db.rollup_contacts_by_source_daily.aggregate([
+            {"$group": {"_id": "$source", "count": {"$sum": "$count"}}},
+            {"$set": {"source": "$_id", "updatedAt": datetime.now()}},
+            {"$merge": {"into": "rollup_contacts_by_source", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]).to_list(None)
+
+    async def refresh(self) -> List[Dict[str, Any]]:
+        """
+        Bring every rollup up to date.
+        """
+        results = []
+        for rollup in ROLLUPS:
+            results.append(await self.refresh_rollup(rollup))
+        await self.refresh_source_totals()
+        return results
+
+    async def run_forever(self):
+        """
+        Refresh the rollups every ANALYTICS_INTERVAL_SECONDS in the worker
+        holding the analytics lease.
+        """
+        while True:
+            try:
+                if await acquire_lease(self.db, "analytics", settings.ANALYTICS_INTERVAL_SECONDS * 2):
+                    await self.refresh()
+            except asyncio.CancelledError:
+                await release_lease(self.db, "analytics")
+                raise
+            except Exception as e:
+                logger.error(f"Analytics refresh failed: {str(e)}")
+            await asyncio.sleep(settings.ANALYTICS_INTERVAL_SECONDS)
+
+    # Reads: bounded lookups on the rollup collections
+
+    async def contacts_by_source(self) -> Dict[str, int]:
+        cursor = self._rollup("rollup_contacts_by_source").find({}, projection={"count": 1})
+        return {row["_id"]: row["count"] async for row in cursor}
+
+    async def contacts_by_source_daily(self, days: int) -> List[Dict[str, Any]]:
+        since = (datetime.now() - timedelta(days=days - 1)).strftime(BUCKET_FORMATS["day"])
+        cursor = self._rollup("rollup_contacts_by_source_daily").find(
+            {"bucket": {"$gte": since}}, projection={"_id": 0, "bucket": 1, "source": 1, "count": 1}
+        ).sort("bucket", 1)
+        return await cursor.to_list(None)
+
+    async def welcome_emails_daily(self, days: int) -> List[Dict[str, Any]]:
+        since = (datetime.now() - timedelta(days=days - 1)).strftime(BUCKET_FORMATS["day"])
+        cursor = self._rollup("rollup_welcome_emails_daily").find(
+            {"bucket": {"$gte": since}}, projection={"_id": 0, "bucket": 1, "count": 1}
+        ).sort("bucket", 1)
+        return await cursor.to_list(None)
+
+    async def events_hourly(self, hours: int, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        since = (datetime.now() - timedelta(hours=hours - 1)).strftime(BUCKET_FORMATS["hour"])
+        query: Dict[str, Any] = {"bucket": {"$gte": since}}
+        if name:
+            query["name"] = name
+        cursor = self._rollup("rollup_events_hourly").find(
+            query, projection={"_id": 0, "bucket": 1, "name": 1, "count": 1}
+        ).sort("bucket", 1)
+        return await cursor.to_list(None)
+
+    async def freshness(self) -> Dict[str, Any]:
+        return {row["_id"]: row["value"] async for row in self.watermarks.find({})}
@@ -0,0 +1,129 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional
+
+import bson
+
+from ..responses import dumps
+
+class CacheEntry(NamedTuple):
+    document: Dict[str, Any]
+    # Response body and validator, computed once when the document is cached
+    body: bytes
+    etag: str
+    size: int
+    expires_at: float
+
+class DocumentCache:
+    """
+    Bounded LRU cache of Mongo documents with a per-entry TTL.
+
+    Entries keep the JSON body and a strong ETag so cached reads (and 304s)
+    need neither a database round trip nor model validation. Invalidation is
+    local to the process; the TTL bounds how stale another worker's copy can be.
+
+    Loads are guarded by a per-key generation: ``begin_load`` returns the
+    key's current generation, ``invalidate`` bumps it, and ``set`` with a
+    generation only caches the document if no invalidation happened while it
+    was being read. Generations are kept only for keys with a load in flight.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+        self.bytes = 0
+        # key -> [loads in flight, generation]
+        self._loads: Dict[Hashable, List[int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def begin_load(self, key: Hashable) -> int:
+        """
+        Register a read of ``key`` from the database. Pair with ``end_load``.
+
+        Returns:
+            The generation to pass to ``set``
+        """
+        load = self._loads.setdefault(key, [0, 0])
+        load[0] += 1
+        return load[1]
+
+    def end_load(self, key: Hashable):
+        load = self._loads[key]
+        load[0] -= 1
+        if load[0] == 0:
+            del self._loads[key]
+
+    def set(self, key: Hashable, document: Dict[str, Any], generation: Optional[int] = None) -> CacheEntry:
+        entry = make_entry(document, self.ttl)
+        if not self.enabled:
+            return entry
+        if generation is not None and self._loads.get(key, [0, generation])[1] != generation:
+            # Invalidated while it was being read: serve it this once, don't keep it
+            self.stale_loads += 1
+            return entry
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, key: Hashable):
+        if key in self._loads:
+            self._loads[key][1] += 1
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_loads": self.stale_loads,
+            "approx_bytes": self.bytes
+        }
+
+def make_entry(document: Dict[str, Any], ttl: float) -> CacheEntry:
+    raw = bson.encode(document)
+    body = dumps(document)
+    etag = '"' + hashlib.blake2b(raw, digest_size=16).hexdigest() + '"'
+    # BSON plus JSON body plus a rough allowance for the decoded dict
+    size = len(raw) * 2 + len(body)
+    return CacheEntry(document, body, etag, size, time.monotonic() + ttl)
@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import aiosmtplib
+from bson import ObjectId, json_util
+from pymongo import ReturnDocument
+
+from ..config import settings
+from ..models.models import CampaignRequest, DomainLimit
+from .email_service import EmailService
+from .leases import WORKER_ID
+from .mongo_service import MongoService
+from .resilience import CircuitOpenError, DependencyUnavailable
+from .send_ledger import SendLedger
+
+logger = logging.getLogger("campaigns")
+
+class DomainThrottle:
+    """
+    Concurrency cap plus token-bucket rate limit for one recipient domain,
+    with the delivery stats reported for that domain.
+    """
+
+    def __init__(self, limit: DomainLimit):
+        self.semaphore = asyncio.Semaphore(limit.concurrency)
+        self.rate = limit.rate
+        self.capacity = max(1.0, limit.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.stats = {"sent": 0, "failed": 0, "deferred": 0, "throttled_seconds": 0.0}
+
+    async def _take_token(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.stats["throttled_seconds"] += wait
+                await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.semaphore:
+            await self._take_token()
+            yield
+
+def is_temporary_failure(error: Exception) -> bool:
+    """
+    True for SMTP failures worth retrying later: 4xx replies (greylisting,
+    rate limiting), dropped or timed-out connections, and sends rejected
+    while the SMTP circuit is open or the pool is saturated.
+    """
+    if isinstance(error, (DependencyUnavailable, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(400 <= refused.code < 500 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 400 <= error.code < 500
+    return isinstance(error, (aiosmtplib.SMTPConnectError, aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, OSError))
+
+class CampaignRunningElsewhere(Exception):
+    """
+    The campaign is running in another worker, which holds its lease.
+    """
+
+class CampaignService:
+    """
+    Sends a template to every contact matched by a segment query over the
+    marketing collection.
+
+    Contacts are read in _id order in batches of CAMPAIGN_BATCH_SIZE and sent
+    concurrently, throttled per recipient domain. After each batch the last
+    _id and the running stats are checkpointed on the campaign document, so an
+    interrupted campaign resumes after the last completed batch. A lease on
+    the campaign document ensures only one worker process runs it, and the
+    send ledger keeps a resumed batch from mailing a contact twice.
+    """
+
+    def __init__(self, mongo_service: MongoService, email_service: EmailService, send_ledger: Optional[SendLedger] = None):
+        self.mongo_service = mongo_service
+        self.email_service = email_service
+        self.send_ledger = send_ledger
+        self.collection = mongo_service.db.campaigns
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def create_campaign(self, request: CampaignRequest) -> Dict[str, Any]:
+        # Fail fast on a missing template rather than per recipient
+        self.email_service.render(request.template_name, request.template_data)
+
+        campaign = {
+            "name": request.name,
+            "template_name": request.template_name,
+            "subject": request.subject,
+            # Stored as extended JSON: segment filters contain $-operators and
+            # domain limits are keyed by dotted domain names
+            "spec": json_util.dumps(request.dict()),
+            "status": "pending",
+            "createdAt": datetime.now(),
+            "last_id": None,
+            "stats": {"sent": 0, "failed": 0, "deferred": 0, "suppressed": 0, "elapsed_seconds": 0.0},
+            "domain_stats": [],
+            "owner": None,
+            "lease_until": None
+        }
+        result = await self.collection.insert_one(campaign)
+        campaign["_id"] = result.inserted_id
+        return campaign
+
+    async def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": ObjectId(campaign_id)}, projection={"spec": 0})
+
+    def start(self, campaign_id: str, claimed: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Run a campaign in the background. Returns False if it is already running here.
+
+        ``claimed`` is the campaign document when the caller already holds its lease.
+        """
+        task = self._tasks.get(campaign_id)
+        if task and not task.done():
+            return False
+        task = asyncio.create_task(self._run(ObjectId(campaign_id), claimed))
+        self._tasks[campaign_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(campaign_id, None))
+        return True
+
+    async def pause(self, campaign_id: str) -> bool:
+        # The runner stops at its next checkpoint
+        result = await self.collection.update_one(
+            {"_id": ObjectId(campaign_id), "status": {"$in": ["pending", "running"]}},
+            {"$set": {"status": "paused"}}
+        )
+        return result.modified_count > 0
+
+    async def resume(self, campaign_id: str) -> bool:
+        """
+        Returns:
+            False if there is no paused or running campaign with this id
+
+        Raises:
+            CampaignRunningElsewhere: If another worker holds the campaign's lease
+        """
+        result = await self.collection.update_one(
+            {"_id": ObjectId(campaign_id), "status": {"$in": ["paused", "running"]}},
+            {"$set": {"status": "running"}}
+        )
+        if result.matched_count == 0:
+            return False
+        task = self._tasks.get(campaign_id)
+        if task and not task.done():
+            return True
+        # Claim here rather than in the background task, so the caller learns
+        # whether this worker got the lease
+        campaign = await self._claim(ObjectId(campaign_id))
+        if campaign is None:
+            raise CampaignRunningElsewhere(f"Campaign {campaign_id} is running in another worker")
+        self.start(campaign_id, campaign)
+        return True
+
+    async def resume_interrupted(self):
+        """
+        Restart campaigns left running by a process that stopped (released
+        lease) or went away (expired lease). Claiming is atomic, so when
+        several workers find the same campaign only one of them runs it.
+        """
+        cursor = self.collection.find(
+            {"status": "running", "$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.now()}}]},
+            projection={"_id": 1}
+        )
+        async for campaign in cursor:
+            if str(campaign["_id"]) in self._tasks:
+                continue
+            logger.info(f"Resuming interrupted campaign {campaign['_id']}")
+            self.start(str(campaign["_id"]))
+
+    async def run_forever(self):
+        """
+        Periodically pick up interrupted campaigns, e.g. those released by a
+        previous deployment while this process was starting.
+        """
+        while True:
+            try:
+                await self.resume_interrupted()
+            except Exception as e:
+                logger.error(f"Looking for interrupted campaigns failed: {str(e)}")
+            await asyncio.sleep(settings.CAMPAIGN_RESUME_INTERVAL_SECONDS)
+
+    async def stop(self):
+        """
+        Cancel running campaigns and release their leases, so another worker
+        resumes them from their last checkpoint without waiting for the lease
+        to expire.
+        """
+        campaign_ids = [ObjectId(campaign_id) for campaign_id in self._tasks]
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if campaign_ids:
+            await self.collection.update_many(
+                {"_id": {"$in": campaign_ids}, "status": "running", "owner": WORKER_ID},
+                {"$set": {"owner": None, "lease_until": None}}
+            )
+
+    async def _claim(self, campaign_id: ObjectId) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        return await self.collection.find_one_and_update(
+            {
+                "_id": campaign_id,
+                "status": {"$in": ["pending", "running"]},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}, {"owner": WORKER_ID}]
+            },
+            {"$set": {
+                "status": "running",
+                "owner": WORKER_ID,
+                "lease_until": now + timedelta(seconds=settings.CAMPAIGN_LEASE_SECONDS)
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _keep_lease(self, campaign_id: ObjectId):
+        while True:
+            await asyncio.sleep(settings.CAMPAIGN_LEASE_SECONDS / 3)
+            await self.collection.update_one(
+                {"_id": campaign_id, "owner": WORKER_ID},
+                {"$set": {"lease_until": datetime.now() + timedelta(seconds=settings.CAMPAIGN_LEASE_SECONDS)}}
+            )
+
+    async def _run(self, campaign_id: ObjectId, campaign: Optional[Dict[str, Any]] = None):
+        campaign = campaign or await self._claim(campaign_id)
+        if not campaign:
+            logger.info(f"Campaign {campaign_id} is finished, paused or owned by another worker")
+            return
+
+        spec = CampaignRequest(**json_util.loads(campaign["spec"]))
+        stats = dict(campaign["stats"])
+        throttles: Dict[str, DomainThrottle] = {}
+        for previous in campaign.get("domain_stats", []):
+            throttle = self._throttle(spec, throttles, previous["domain"])
+            throttle.stats.update({key: previous[key] for key in throttle.stats})
+
+        concurrency = asyncio.Semaphore(settings.CAMPAIGN_CONCURRENCY)
+        last_id = campaign.get("last_id")
+        sent_before = stats["sent"]
+        elapsed_before = stats["elapsed_seconds"]
+        started = time.monotonic()
+        lease_keeper = asyncio.create_task(self._keep_lease(campaign_id))
+        logger.info(f"Running campaign {campaign_id} ({spec.name}) from {last_id or 'the start'}")
+
+        try:
+            while True:
+                query = spec.segment if last_id is None else {"$and": [spec.segment, {"_id": {"$gt": last_id}}]}
+                batch = await self.mongo_service.marketing_collection.find(
+                    query, projection={"email": 1, "name": 1, "company": 1}
+                ).sort("_id", 1).limit(settings.CAMPAIGN_BATCH_SIZE).to_list(settings.CAMPAIGN_BATCH_SIZE)
+
+                if batch:
+                    results = await asyncio.gather(*(
+                        self._deliver(campaign_id, spec, contact, throttles, concurrency) for contact in batch
+                    ))
+                    last_id = batch[-1]["_id"]
+                    for key in ("sent", "failed", "deferred", "suppressed"):
+                        stats[key] = stats.get(key, 0) + sum(result[key] for result in results)
+
+                elapsed = time.monotonic() - started
+                stats["elapsed_seconds"] = elapsed_before + elapsed
+                stats["throughput_per_s"] = round((stats["sent"] - sent_before) / elapsed, 2) if elapsed else 0.0
+                update = {
+                    "last_id": last_id,
+                    "stats": stats,
+                    "domain_stats": [{"domain": domain, **throttle.stats} for domain, throttle in throttles.items()]
+                }
+                if not batch:
+                    update.update({"status": "completed", "completedAt": datetime.now(), "owner": None, "lease_until": None})
+
+                # Checkpoint; also tells us whether the campaign was paused meanwhile
+                checkpoint = await self.collection.find_one_and_update(
+                    {"_id": campaign_id, "owner": WORKER_ID},
+                    {"$set": update},
+                    return_document=ReturnDocument.AFTER
+                )
+                if not batch:
+                    logger.info(f"Campaign {campaign_id} completed: {stats}")
+                    return
+                if not checkpoint:
+                    logger.warning(f"Lost the lease on campaign {campaign_id}, stopping")
+                    return
+                if checkpoint["status"] != "running":
+                    logger.info(f"Campaign {campaign_id} {checkpoint['status']} after {stats['sent']} sent")
+                    await self.collection.update_one(
+                        {"_id": campaign_id, "owner": WORKER_ID}, {"$set": {"owner": None, "lease_until": None}}
+                    )
+                    return
+        except Exception as e:
+            logger.error(f"Campaign {campaign_id} failed: {str(e)}")
+            await self.collection.update_one(
+                {"_id": campaign_id, "owner": WORKER_ID},
+                {"$set": {"status": "failed", "error": str(e), "owner": None, "lease_until": None}}
+            )
+        finally:
+            lease_keeper.cancel()
+
+    def _throttle(self, spec: CampaignRequest, throttles: Dict[str, DomainThrottle], domain: str) -> DomainThrottle:
+        if domain not in throttles:
+            limit = spec.domain_limits.get(domain) or DomainLimit(
+                concurrency=settings.CAMPAIGN_DOMAIN_CONCURRENCY,
+                rate=settings.CAMPAIGN_DOMAIN_RATE
+            )
+            throttles[domain] = DomainThrottle(limit)
+        return throttles[domain]
+
+    async def _deliver(self, campaign_id: ObjectId, spec: CampaignRequest, contact: Dict[str, Any], throttles: Dict[str, DomainThrottle], concurrency: asyncio.Semaphore) -> Dict[str, int]:
+        """
+        Render and send to one contact, retrying temporary failures with backoff.
+
+        Returns:
+            Counts of sent, failed, deferred and suppressed attempts for this contact
+        """
+        result = {"sent": 0, "failed": 0, "deferred": 0, "suppressed": 0}
+        email = contact.get("email")
+        if not email or "@" not in email:
+            result["failed"] = 1
+            return result
+        if self.send_ledger and not await self.send_ledger.claim(email, "campaign", str(campaign_id)):
+            result["suppressed"] = 1
+            return result
+
+        try:
+            sent = await self._send(spec, email, contact, throttles, concurrency, result)
+        except (Exception, asyncio.CancelledError) as e:
+            # Release the claim so a resumed campaign can retry this contact
+            if self.send_ledger:
+                await self.send_ledger.mark_failed(email, "campaign", str(campaign_id), error=str(e))
+            raise
+        if self.send_ledger:
+            if sent:
+                await self.send_ledger.mark_sent(email, "campaign", str(campaign_id))
+            else:
+                await self.send_ledger.mark_failed(email, "campaign", str(campaign_id))
+        return result
+
+    async def _send(self, spec: CampaignRequest, email: str, contact: Dict[str, Any], throttles: Dict[str, DomainThrottle], concurrency: asyncio.Semaphore, result: Dict[str, int]) -> bool:
+        """
+        Returns:
+            True if the message was sent; attempts are counted in ``result``
+        """
+        throttle = self._throttle(spec, throttles, email.rsplit("@", 1)[1].lower())
+        template_data = {
+            **spec.template_data,
+            "email": email,
+            "name": contact.get("name", ""),
+            "company": contact.get("company", "")
+        }
+        text_content, html_content = self.email_service.render(spec.template_name, template_data)
+        msg = self.email_service.build_message(email, spec.subject, text_content, html_content)
+
+        for attempt in range(settings.CAMPAIGN_MAX_RETRIES + 1):
+            try:
+                # Wait for the domain first, so a throttled domain does not
+                # hold global slots that other domains could use
+                async with throttle.slot(), concurrency:
+                    await self.email_service.send_message(msg)
+                throttle.stats["sent"] += 1
+                result["sent"] = 1
+                return True
+            except Exception as e:
+                if not is_temporary_failure(e) or attempt == settings.CAMPAIGN_MAX_RETRIES:
+                    logger.warning(f"Campaign send to {email} failed: {str(e)}")
+                    break
+                throttle.stats["deferred"] += 1
+                result["deferred"] += 1
+                # While the SMTP circuit is open, wait for its half-open trial
+                delay = settings.BREAKER_RESET_SECONDS if isinstance(e, CircuitOpenError) else 2 ** attempt
+            await asyncio.sleep(delay)
+
+        throttle.stats["failed"] += 1
+        result["failed"] = 1
+        return False
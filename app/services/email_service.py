@@ -1,64 +1,188 @@
+import asyncio
 import aiosmtplib
+from contextlib import asynccontextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import ChoiceLoader, Environment, FileSystemLoader, ModuleLoader
 from pathlib import Path
 from ..config import settings
-import os
+from .resilience import get_dependency
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger("email_service")
+
+def welcome_template_data(email: str, first_name: Optional[str] = None, company_name: Optional[str] = None) -> dict:
+    """
+    Template data shared by the welcome email templates.
+    """
+    return {
+        "email": email,
+        "name": (first_name or "").capitalize(),
+        "company": company_name or "",  # Empty string if company_name is None
+        "app_name": settings.APP_NAME,
+        "contact_email": settings.SMTP_FROM,
+        "company_name": "JediTeck",
+        "support_email": "support@jediteck.com",
+        "website_url": "https://jediteck.com",
+        "current_year": "2025"
+    }
+
+class SMTPPool:
+    """
+    A small pool of authenticated SMTP connections, so bursts of email reuse
+    sessions instead of paying connect + STARTTLS + AUTH for every message.
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size or settings.SMTP_POOL_SIZE
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._idle: List[aiosmtplib.SMTP] = []
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_SERVER,
+            port=settings.SMTP_PORT,
+            start_tls=settings.SMTP_START_TLS,
+            use_tls=False,
+            timeout=settings.SMTP_TIMEOUT
+        )
+        await smtp.connect()
+        if settings.SMTP_USERNAME and settings.SMTP_PASSWORD:
+            await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        return smtp
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._semaphore:
+            smtp = self._idle.pop() if self._idle else None
+            if smtp is None or not smtp.is_connected:
+                smtp = await self._connect()
+            try:
+                yield smtp
+            except Exception:
+                # Keep the connection only if the server is still talking to us
+                if smtp.is_connected:
+                    try:
+                        await smtp.rset()
+                        self._idle.append(smtp)
+                    except aiosmtplib.SMTPException:
+                        smtp.close()
+                raise
+            except BaseException:
+                # Cancelled (e.g. the send deadline passed) mid-conversation:
+                # the session state is unknown, so drop the connection
+                smtp.close()
+                raise
+            else:
+                self._idle.append(smtp)
+
+    async def close(self, timeout: Optional[float] = None):
+        """
+        Wait up to ``timeout`` seconds for connections in use to be returned,
+        then close the idle ones. The pool cannot be used afterwards.
+        """
+        async def acquire_all():
+            for _ in range(self.size):
+                await self._semaphore.acquire()
+
+        try:
+            await asyncio.wait_for(acquire_all(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Closing the SMTP pool with sends still in progress")
+        idle, self._idle = self._idle, []
+        for smtp in idle:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
 
 class EmailService:
     def __init__(self):
         templates_dir = Path(__file__).parent.parent / "templates"
-        self.env = Environment(loader=FileSystemLoader(templates_dir))
-        
-    async def send_email(self, recipient: str, cc: str, subject: str, template_name: str, template_data: dict) -> bool:
+        build_dir = templates_dir / "build"
+        loaders = [FileSystemLoader(templates_dir)]
+        # Inlined, minified and precompiled by `python -m app.build_templates`
+        # (run in the Docker build); the sources are the fallback
+        precompiled = settings.EMAIL_PRECOMPILED_TEMPLATES and (build_dir / "compiled").is_dir()
+        if precompiled:
+            loaders.insert(0, ModuleLoader(build_dir / "compiled"))
+        self.env = Environment(loader=ChoiceLoader(loaders))
+        if precompiled:
+            for path in sorted((build_dir / "email").glob("*.*")):
+                self.env.get_template(f"email/{path.name}")
+            logger.info(f"Loaded {len(self.env.cache)} precompiled email templates")
+        self.pool = SMTPPool()
+
+    def render(self, template_name: str, template_data: dict) -> Tuple[str, str]:
+        """
+        Render the text and HTML versions of a template.
+
+        Returns:
+            (text_content, html_content)
+        """
+        text_template = self.env.get_template(f"email/{template_name}.txt")
+        html_template = self.env.get_template(f"email/{template_name}.html")
+        return text_template.render(**template_data), html_template.render(**template_data)
+
+    def build_message(self, recipient: str, subject: str, text_content: str, html_content: str, cc: Optional[str] = None) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['From'] = settings.SMTP_FROM
+        msg['To'] = recipient
+        if cc:
+            msg['CC'] = cc
+        msg['Subject'] = subject
+
+        # Attach parts to message
+        msg.attach(MIMEText(text_content, 'plain'))
+        msg.attach(MIMEText(html_content, 'html'))
+        return msg
+
+    async def send_message(self, msg: MIMEMultipart):
+        """
+        Send a prepared message over a pooled connection, reconnecting once if
+        an idle connection was dropped by the server. The send runs under the
+        smtp dependency's circuit breaker, bulkhead and SMTP_TIMEOUT deadline.
+
+        Raises:
+            aiosmtplib.SMTPException: If the message could not be sent
+            DependencyUnavailable: If the SMTP circuit is open or the pool is saturated
+            asyncio.TimeoutError: If the send took longer than SMTP_TIMEOUT
+        """
+        await get_dependency("smtp").call(self._send_message, msg)
+
+    async def _send_message(self, msg: MIMEMultipart):
+        for attempt in range(2):
+            try:
+                async with self.pool.connection() as smtp:
+                    await smtp.send_message(msg)
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    async def send_email(self, recipient: str, subject: str, template_name: str, template_data: dict, cc: Optional[str] = None) -> bool:
         """
         Send an email with both HTML and text versions using templates.
-        
+
         Args:
             recipient: Email address of the recipient
+            cc: Optional address to copy on the email
             subject: Email subject
             template_name: Name of the template (without extension)
             template_data: Dictionary of data to be passed to the template
-            
+
         Returns:
             bool: True if email was sent successfully, False otherwise
         """
         try:
-            # Create message container
-           
-            print(f"Template data: {template_data}")
-            msg = MIMEMultipart('alternative')
-            msg['From'] = settings.SMTP_FROM
-            msg['To'] = recipient
-            msg['CC'] = cc
-            msg['Subject'] = subject
-
-            # Render text and HTML templates
-            text_template = self.env.get_template(f"email/{template_name}.txt")
-            html_template = self.env.get_template(f"email/{template_name}.html")
-            
-            text_content = text_template.render(**template_data)
-            html_content = html_template.render(**template_data)
-            
-            # Attach parts to message
-            part1 = MIMEText(text_content, 'plain')
-            part2 = MIMEText(html_content, 'html')
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            # Send email
-            await aiosmtplib.send(
-                msg,
-                hostname=settings.SMTP_SERVER,
-                port=settings.SMTP_PORT,
-                username=settings.SMTP_USERNAME,
-                password=settings.SMTP_PASSWORD,
-                start_tls=True,
-                use_tls=False
-            )
-            
+            text_content, html_content = self.render(template_name, template_data)
+            msg = self.build_message(recipient, subject, text_content, html_content, cc=cc)
+            await self.send_message(msg)
             return True
         except Exception as e:
-            print(f"Error sending email: {str(e)}")
+            logger.error(f"Error sending email to {recipient}: {str(e)}")
             return False
+
+    async def close(self, timeout: Optional[float] = None):
+        await self.pool.close(timeout)
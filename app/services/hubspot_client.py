@@ -0,0 +1,24 @@
+from ..config import settings
+
+# The hubspot SDK is large; it is only imported when the first HubSpot call is
+# made so that cold starts (and workers that never talk to HubSpot) skip it.
+_client = None
+
+def get_hubspot_client():
+    """
+    Return the shared HubSpot client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        from hubspot import HubSpot
+        _client = HubSpot(access_token=settings.HUBSPOT_TOKEN)
+    return _client
+
+def get_contacts_api():
+    """
+    Return the HubSpot contacts API, pointed at HUBSPOT_API_BASE when it is set.
+    """
+    api = get_hubspot_client().crm.contacts.basic_api
+    if settings.HUBSPOT_API_BASE:
+        api.api_client.configuration.host = settings.HUBSPOT_API_BASE
+    return api
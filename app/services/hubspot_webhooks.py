@@ -0,0 +1,283 @@
+"""
+Processing of HubSpot contact.creation webhooks, shared by the webhook
+endpoint and the retry queue.
+
+HubSpot, AbstractAPI and SMTP are called through their resilience
+dependencies. When one of them is unavailable the remaining work is deferred
+to the retry queue, so the webhook still answers quickly and the contact is
+picked up again once the dependency recovers.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from ..models.models import EventModel
+from .email_service import EmailService, welcome_template_data
+from .hubspot_client import get_contacts_api
+from .mongo_service import MongoService
+from .resilience import DependencyUnavailable, get_dependency
+from .retry_queue import RetryQueue, retry_handler
+from .send_ledger import SendLedger
+
+logger = logging.getLogger("hubspot_webhook")
+
+# Errors that mean "try again later" rather than "this contact is bad"
+DEFERRABLE_ERRORS = (DependencyUnavailable, asyncio.TimeoutError)
+
+def upstream_timeout(read_timeout: float):
+    # (connect, read) as accepted by requests and the HubSpot SDK
+    return (settings.UPSTREAM_CONNECT_TIMEOUT, read_timeout)
+
+def _fetch_contact(object_id):
+    return get_contacts_api().get_by_id(
+        contact_id=object_id,
+        properties=["email", "firstname", "lastname", "company"],
+        _request_timeout=upstream_timeout(settings.HUBSPOT_TIMEOUT)
+    )
+
+async def get_contact_details(object_id):
+    """
+    Retrieve contact details from HubSpot using the contact ID.
+
+    The SDK call blocks, so it runs in a worker thread under the hubspot
+    dependency's breaker and bulkhead.
+
+    Args:
+        object_id: The HubSpot contact ID
+
+    Returns:
+        Contact properties dictionary or None if HubSpot returned an error
+
+    Raises:
+        DependencyUnavailable: If HubSpot calls are currently being rejected
+        asyncio.TimeoutError: If HubSpot did not answer within HUBSPOT_TIMEOUT
+    """
+    from hubspot.crm.contacts import ApiException
+
+    try:
+        response = await get_dependency("hubspot").call_sync(_fetch_contact, object_id)
+        return response.properties
+    except ApiException as e:
+        logger.error(f"Error fetching contact {object_id}: {e}")
+        return None
+
+def _check_email(email: str):
+    import requests
+    response = requests.get(
+        settings.ABSTRACT_API_URL,
+        params={"api_key": settings.ABSTRACT_API_KEY, "email": email},
+        timeout=upstream_timeout(settings.ABSTRACT_API_TIMEOUT)
+    )
+    # Server errors and throttling count against the breaker
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return response
+
+async def validate_email(email: str) -> Optional[bool]:
+    """
+    Check an address with AbstractAPI.
+
+    Returns:
+        True if the address is deliverable, False if it is not, None if
+        AbstractAPI answered with an error
+
+    Raises:
+        DependencyUnavailable: If AbstractAPI calls are currently being rejected
+        asyncio.TimeoutError: If AbstractAPI did not answer within ABSTRACT_API_TIMEOUT
+    """
+    response = await get_dependency("abstractapi").call_sync(_check_email, email)
+    if response.status_code != 200:
+        logger.error(f"Error checking email {email}: HTTP {response.status_code}")
+        return None
+    data = response.json()
+    return bool(data.get("is_valid_format") and data.get("deliverability") == "DELIVERABLE")
+
+async def send_welcome_email(email, email_service: EmailService, first_name=None, company_name=None, mongo_service=None, send_ledger: Optional[SendLedger] = None):
+    """
+    Send a welcome email to a new contact.
+
+    With a send ledger, a contact that was already welcomed (e.g. a redelivered
+    webhook) is skipped before any rendering or SMTP work. While the SMTP
+    circuit is open nothing is attempted and the result is marked
+    ``deferred``, so the caller can queue the email for later.
+    """
+    if not get_dependency("smtp").available:
+        return {"success": False, "deferred": True, "message": "SMTP is unavailable; welcome email deferred"}
+    if send_ledger and not await send_ledger.claim(email, "welcome"):
+        return {"success": False, "duplicate": True, "message": f"Welcome email already sent to {email}"}
+    try:
+        logger.info(f"Sending welcome email to {email} with first_name: {first_name}, company_name: {company_name}")
+
+        current_time = datetime.now()
+        template_data = welcome_template_data(email, first_name, company_name)
+        # check if the email already exists in marketing collection
+        if mongo_service:
+            existing_contact = await mongo_service.marketing_collection.find_one({"email": email})
+            if existing_contact and existing_contact.get("source") == "newsletter":
+                logger.info(f"Contact {email} already exists in marketing collection as a newsletter signup")
+                template_name = "welcome_email_newsletter"
+            elif first_name:
+                template_name = "welcome_email"
+            else:
+                template_name = "welcome_email_noname"
+        else:
+            # Default template if mongo_service is not available
+            template_name = "welcome_email" if first_name else "welcome_email_noname"
+
+        logger.info(f"Using template: {template_name}")
+        # Send welcome email using template
+        success = await email_service.send_email(
+            recipient=email,
+            cc=settings.SMTP_CC,
+            subject=f"Welcome to {settings.APP_NAME}",
+            template_name=template_name,
+            template_data=template_data
+        )
+
+        if send_ledger:
+            if success:
+                await send_ledger.mark_sent(email, "welcome", template_name=template_name)
+            else:
+                await send_ledger.mark_failed(email, "welcome")
+
+        if success:
+            logger.info(f"Welcome email sent to {email}")
+            return {
+                "success": True,
+                "subject": f"Welcome to {settings.APP_NAME}",
+                "message": f"Welcome email sent to {email}",
+                "sentAt": current_time.isoformat(),
+                "messageType": "welcome",
+                "status": "sent",
+                "sentSuccessfully": True,
+                "template_name": template_name
+            }
+        logger.error(f"Failed to send welcome email to {email}")
+        # The failure may be the one that opened the circuit
+        return {
+            "success": False,
+            "deferred": not get_dependency("smtp").available,
+            "message": "Failed to send welcome email"
+        }
+    except Exception as e:
+        logger.error(f"Error sending welcome email to {email}: {str(e)}")
+        if send_ledger:
+            await send_ledger.mark_failed(email, "welcome", error=str(e))
+        return {"success": False, "message": f"Error sending welcome email: {str(e)}"}
+
+async def welcome_contact(
+    contact: Dict[str, Any],
+    mongo_service: MongoService,
+    email_service: EmailService,
+    send_ledger: SendLedger,
+    retry_queue: Optional[RetryQueue] = None
+) -> Dict[str, Any]:
+    """
+    Send the welcome email and record it in the contact's communications
+    history, queueing a retry if SMTP is unavailable.
+    """
+    result = await send_welcome_email(
+        email=contact["email"],
+        email_service=email_service,
+        first_name=contact.get("firstname"),
+        company_name=contact.get("company"),
+        mongo_service=mongo_service,
+        send_ledger=send_ledger
+    )
+    if result["success"]:
+        # Record the welcome email in the contact's communications history
+        await mongo_service.add_communication(contact["email"], {
+            "type": "email",
+            "subject": result["subject"],
+            "content": result["message"],
+            "sentAt": datetime.fromisoformat(result["sentAt"]),
+            "messageType": "welcome",
+            "status": "sent",
+            "sentSuccessfully": True
+        })
+    elif result.get("deferred"):
+        if retry_queue is None:
+            raise DependencyUnavailable(result["message"])
+        await retry_queue.enqueue("welcome_email", {
+            "email": contact["email"],
+            "firstname": contact.get("firstname"),
+            "company": contact.get("company")
+        }, reason=result["message"])
+    return result
+
+async def process_contact_creation(
+    payload: Dict[str, Any],
+    mongo_service: MongoService,
+    email_service: EmailService,
+    send_ledger: SendLedger,
+    retry_queue: Optional[RetryQueue] = None
+) -> str:
+    """
+    Store a newly created HubSpot contact whose address is deliverable,
+    record the webhook event and welcome the contact.
+
+    Returns:
+        What happened: "processed", "not_found", "undeliverable",
+        "validation_error" or "email_deferred"
+
+    Raises:
+        DependencyUnavailable, asyncio.TimeoutError: If HubSpot or AbstractAPI
+            is unavailable; nothing has been stored yet, so the whole payload
+            can be processed again later
+    """
+    contact_id = payload.get("objectId")
+    contact_details = await get_contact_details(contact_id)
+    if not contact_details or "email" not in contact_details:
+        return "not_found"
+
+    email = contact_details["email"]
+    deliverable = await validate_email(email)
+    if deliverable is None:
+        return "validation_error"
+    if not deliverable:
+        logger.info(f"Email {email} is invalid")
+        return "undeliverable"
+
+    # Store contact in marketing_contacts collection
+    # Maintain the existing document structure
+    contact_data = {
+        "email": contact_details.get("email", ""),
+        "name": f"{contact_details.get('firstname', '')} {contact_details.get('lastname', '')}".strip(),
+        "company": contact_details.get("company", ""),
+        "source": payload.get("changeSource", ""),
+        "createdAt": datetime.now(),
+        "timestamp": datetime.now().isoformat(),
+        "hubspot_id": contact_id,
+        "hubspot_data": payload
+    }
+    await mongo_service.create_or_update_marketing_contact(email=email, contact_data=contact_data)
+    logger.info(f"Stored contact {contact_id} in marketing_contacts collection")
+
+    # Create an event for each webhook notification
+    event = EventModel(
+        name="hubspot_webhook",
+        description="HubSpot webhook notification",
+        data=payload,
+        processed=False,
+        timestamp=datetime.now()
+    )
+    event = await mongo_service.create_event(event)
+
+    result = await welcome_contact(contact_details, mongo_service, email_service, send_ledger, retry_queue)
+    # A deferred welcome email is queued with its own payload, so the webhook
+    # is handled either way and the event becomes eligible for retention
+    await mongo_service.update_event(str(event.id), {"processed": True})
+    return "email_deferred" if result.get("deferred") else "processed"
+
+@retry_handler("hubspot_webhook")
+async def retry_hubspot_webhook(payload: Dict[str, Any], services: Any):
+    await process_contact_creation(
+        payload, services.mongo_service, services.email_service, services.send_ledger, services.retry_queue
+    )
+
+@retry_handler("welcome_email")
+async def retry_welcome_email(payload: Dict[str, Any], services: Any):
+    # Without a queue, a still-open circuit raises and the job is rescheduled
+    await welcome_contact(payload, services.mongo_service, services.email_service, services.send_ledger)
@@ -0,0 +1,31 @@
+import os
+import socket
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+# Identifies this process when it holds a lease
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+async def acquire_lease(db, name: str, seconds: float) -> bool:
+    """
+    Take (or renew) a named lease in the leases collection, so periodic jobs
+    run in one worker process at a time.
+
+    Returns:
+        True if this process holds the lease for the next ``seconds``
+    """
+    now = datetime.now()
+    try:
+        await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"until": {"$lt": now}}, {"owner": WORKER_ID}]},
+            {"$set": {"owner": WORKER_ID, "until": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Someone else holds an unexpired lease
+        return False
+
+async def release_lease(db, name: str):
+    await db.leases.update_one({"_id": name, "owner": WORKER_ID}, {"$set": {"until": datetime.now()}})
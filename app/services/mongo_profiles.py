@@ -0,0 +1,91 @@
+"""
+Named read preference and write concern profiles for MongoDB operations.
+
+Each MongoService operation picks the profile that matches how fresh and how
+durable it needs to be, instead of using the client defaults everywhere:
+
+- listing: paged lists (events, cron jobs, marketing contacts) read from a
+  secondary when one is recent enough, so they do not compete with writes
+  on the primary
+- analytics: rollup reads, which tolerate more staleness
+- event_log: fire-and-forget event logging, acknowledged by the primary only
+- contact_write: contact and communications writes, acknowledged by a
+  majority so a failover cannot lose them
+
+Profiles are defined here and can be adjusted per deployment with
+MONGO_PROFILE_OVERRIDES (JSON, e.g. ``{"listing": {"read_preference": "primary"}}``).
+They are applied with ``Collection.with_options``, so a profiled collection
+shares the client's connection pool.
+"""
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+from ..config import settings
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+class OperationProfile(NamedTuple):
+    """
+    None leaves the client default in place. ``max_staleness_seconds`` must be
+    at least 90 (a server requirement) and only applies to non-primary reads.
+    """
+    read_preference: Optional[str] = None
+    max_staleness_seconds: Optional[int] = None
+    w: Optional[Union[int, str]] = None
+    journal: Optional[bool] = None
+    wtimeout_ms: Optional[int] = None
+
+PROFILES: Dict[str, OperationProfile] = {
+    "default": OperationProfile(),
+    "listing": OperationProfile(read_preference="secondaryPreferred", max_staleness_seconds=90),
+    "analytics": OperationProfile(read_preference="secondaryPreferred", max_staleness_seconds=300),
+    "event_log": OperationProfile(w=1),
+    "contact_write": OperationProfile(w="majority", journal=True, wtimeout_ms=10000),
+}
+
+def get_profile(name: str) -> OperationProfile:
+    """
+    The profile ``name`` with any MONGO_PROFILE_OVERRIDES applied.
+
+    Raises:
+        KeyError: If there is no such profile
+        ValueError: If an override names an unknown option
+    """
+    profile = PROFILES[name]
+    overrides = settings.MONGO_PROFILE_OVERRIDES.get(name)
+    if overrides:
+        unknown = set(overrides) - set(OperationProfile._fields)
+        if unknown:
+            raise ValueError(f"Unknown options {sorted(unknown)} in MONGO_PROFILE_OVERRIDES for {name}")
+        profile = profile._replace(**overrides)
+    return profile
+
+def profile_options(profile: OperationProfile) -> Dict[str, Any]:
+    """
+    Keyword arguments for ``with_options`` that implement ``profile``.
+    """
+    options: Dict[str, Any] = {}
+    if profile.read_preference:
+        read_preference = READ_PREFERENCES[profile.read_preference]
+        if read_preference is Primary:
+            options["read_preference"] = Primary()
+        else:
+            options["read_preference"] = read_preference(max_staleness=profile.max_staleness_seconds or -1)
+    if profile.w is not None or profile.journal is not None:
+        options["write_concern"] = WriteConcern(w=profile.w, j=profile.journal, wtimeout=profile.wtimeout_ms)
+    return options
+
+def with_profile(collection, name: str):
+    """
+    ``collection`` with the read preference and write concern of profile ``name``.
+    """
+    options = profile_options(get_profile(name))
+    return collection.with_options(**options) if options else collection
@@ -1,70 +1,273 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCursor
+from pymongo import ReturnDocument
 from ..config import settings
-from ..models.models import EventModel, CronJobModel
+from ..models.models import EventModel, CronJobModel, EventSummaryModel, CronJobSummaryModel
+from .cache import DocumentCache, CacheEntry
+from .mongo_profiles import with_profile
 from bson import ObjectId
-from typing import List, Optional, Dict, Any
+from datetime import datetime
+import importlib.util
+from typing import List, Optional, Dict, Any, Iterable, Set, Union
+
+# Fields clients may request with ``fields=``, and the heavy subdocuments that
+# listings leave out unless asked for
+EVENT_FIELDS = {field.alias for field in EventModel.__fields__.values()}
+EVENT_LIST_EXCLUDE = ("data",)
+CRON_JOB_FIELDS = {field.alias for field in CronJobModel.__fields__.values()}
+MARKETING_LIST_EXCLUDE = ("hubspot_data", "communications")
+
+def build_projection(
+    fields: Optional[str],
+    allowed: Optional[Set[str]] = None,
+    default_exclude: Iterable[str] = ()
+) -> Optional[Dict[str, int]]:
+    """
+    Turn a ``fields=`` query value into a Mongo projection.
+
+    Args:
+        fields: Comma separated field names (dotted paths allowed), "*" for
+            full documents, or None for the endpoint default
+        allowed: Top-level fields that may be requested (None allows any)
+        default_exclude: Fields left out when ``fields`` is not given
+
+    Returns:
+        The projection, or None to fetch full documents
+
+    Raises:
+        ValueError: If a requested field is not allowed
+    """
+    if fields is None:
+        default_exclude = list(default_exclude)
+        return {name: 0 for name in default_exclude} if default_exclude else None
+    if fields.strip() == "*":
+        return None
+
+    projection = {"_id": 1}
+    for name in filter(None, (part.strip() for part in fields.split(","))):
+        if name == "id":
+            name = "_id"
+        if allowed is not None and name.split(".")[0] not in allowed:
+            raise ValueError(f"Unknown field '{name}'")
+        projection[name] = 1
+    return projection
+
+def communication_summary(communication: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The small lastCommunication summary kept on the contact document.
+    """
+    return {
+        key: communication.get(key)
+        for key in ("type", "messageType", "subject", "status", "sentAt")
+    }
+
+def as_local_naive(value: datetime) -> datetime:
+    # Timestamps are stored as naive local times (datetime.now()), and pymongo
+    # returns them naive; aware query parameters must match before comparing
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+# Module each wire compressor needs on the client side (zlib is built in)
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(names: str) -> List[str]:
+    """
+    The compressors in ``names`` (comma separated) that can be used in this
+    process. The server picks the first one it also supports.
+    """
+    available = []
+    for name in filter(None, (part.strip().lower() for part in names.split(","))):
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            raise ValueError(f"Unknown MongoDB compressor '{name}'")
+        if importlib.util.find_spec(module) is not None:
+            available.append(name)
+    return available
 
 class MongoService:
-    def __init__(self):
-        # Connect to MongoDB using the URI
-        self.client = AsyncIOMotorClient(settings.MONGO_URI)
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None):
+        # Connect to MongoDB using the URI. One MongoService (and so one
+        # connection pool) is created per process in the app lifespan.
+        if client is None:
+            options: Dict[str, Any] = {}
+            compressors = available_compressors(settings.MONGO_COMPRESSORS)
+            if compressors:
+                options["compressors"] = ",".join(compressors)
+                options["zlibCompressionLevel"] = settings.MONGO_ZLIB_LEVEL
+            client = AsyncIOMotorClient(settings.MONGO_URI, **options)
+        self.client = client
         # Get the default database from the URI
         self.db = self.client.get_default_database()
         self.events_collection = self.db.events
         self.cron_collection = self.db.cron_jobs
         self.marketing_collection = self.db.marketing
+        self.communications_collection = self.db.communications
+        # The same collections under the operation profiles in mongo_profiles:
+        # paged listings may read from secondaries, event logging is
+        # acknowledged by the primary only, contact writes by a majority
+        self.events_listing = with_profile(self.events_collection, "listing")
+        self.events_log = with_profile(self.events_collection, "event_log")
+        self.cron_listing = with_profile(self.cron_collection, "listing")
+        self.marketing_listing = with_profile(self.marketing_collection, "listing")
+        self.marketing_writes = with_profile(self.marketing_collection, "contact_write")
+        self.communications_writes = with_profile(self.communications_collection, "contact_write")
+        # Read-through cache for single-document reads, keyed (collection, id)
+        self.cache = DocumentCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+
+    def close(self):
+        self.client.close()
+
+    async def ensure_indexes(self):
+        """
+        Create the indexes the services rely on. Safe to call on every startup.
+        """
+        await self.marketing_collection.create_index("email")
+        # Retention scans for processed events by age
+        await self.events_collection.create_index([("processed", 1), ("timestamp", 1)])
+        # Open-bucket lookups on append and per-contact time range reads
+        await self.communications_collection.create_index([("contact_email", 1), ("last_at", -1)])
+
+    # Counters and configuration (formerly the single system_metrics document)
+    async def increment_counter(self, name: str, amount: int = 1) -> int:
+        """
+        Atomically increment a named counter in the counters collection.
+
+        A counter created for the first time starts from the legacy value in
+        system_metrics, if there is one.
 
-    # Event operations
-    async def get_all_events(self, limit: int = 100, skip: int = 0) -> List[EventModel]:
+        Returns:
+            The counter's new value
+        """
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": name}, {"$inc": {"value": amount}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        if counter["value"] == amount:
+            legacy = await self.db.system_metrics.find_one({name: {"$exists": True}}, projection={name: 1})
+            if legacy and isinstance(legacy[name], (int, float)):
+                counter = await self.db.counters.find_one_and_update(
+                    {"_id": name}, {"$inc": {"value": legacy[name]}}, return_document=ReturnDocument.AFTER
+                )
+        return counter["value"]
+
+    async def get_config_value(self, name: str, default: Any = None) -> Any:
+        """
+        Read a setting from the config collection, falling back to the legacy
+        system_metrics document.
+        """
+        config = await self.db.config.find_one({"_id": name})
+        if config is not None:
+            return config.get("value", default)
+        legacy = await self.db.system_metrics.find_one({name: {"$exists": True}}, projection={name: 1})
+        return legacy[name] if legacy else default
+
+    async def get_all_events(self, limit: int = 100, skip: int = 0, projection: Optional[Dict[str, int]] = None) -> List[EventSummaryModel]:
         events = []
-        cursor = self.events_collection.find().skip(skip).limit(limit)
+        cursor = self.events_listing.find(projection=projection).skip(skip).limit(limit)
         async for document in cursor:
-            events.append(EventModel(**document))
+            events.append(EventSummaryModel(**document))
         return events
 
-    async def get_event(self, event_id: str) -> Optional[EventModel]:
-        event = await self.events_collection.find_one({"_id": ObjectId(event_id)})
+    def stream_events(self, limit: int = 100, skip: int = 0, projection: Optional[Dict[str, int]] = None) -> AsyncIOMotorCursor:
+        """
+        Raw event documents for the fast listing path; iterate with ``async for``.
+        """
+        return self.events_listing.find(projection=projection).skip(skip).limit(limit).batch_size(limit or 100)
+
+    @staticmethod
+    def _cache_key(collection, document_id: str):
+        return (collection.name, str(ObjectId(document_id)))
+
+    async def _get_cached(self, collection, document_id: str, model) -> Optional[CacheEntry]:
+        """
+        The document as ``model`` serializes it (defaults filled in), so the
+        cached body has the same shape as the uncached response.
+        """
+        key = self._cache_key(collection, document_id)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+        # An update or delete that lands during the read bumps the generation,
+        # and the document read before it is not cached
+        generation = self.cache.begin_load(key)
+        try:
+            document = await collection.find_one({"_id": ObjectId(document_id)})
+            if document is None:
+                return None
+            return self.cache.set(key, model(**document).dict(by_alias=True), generation)
+        finally:
+            self.cache.end_load(key)
+
+    def invalidate_events(self, event_ids: Iterable[Union[str, ObjectId]]):
+        """
+        Drop events changed or deleted outside the CRUD methods from the cache.
+        """
+        for event_id in event_ids:
+            self.cache.invalidate(self._cache_key(self.events_collection, event_id))
+
+    async def get_event_entry(self, event_id: str) -> Optional[CacheEntry]:
+        """
+        The full event document with its JSON body and ETag, served from the cache when possible.
+        """
+        return await self._get_cached(self.events_collection, event_id, EventModel)
+
+    async def get_event(self, event_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Union[EventModel, EventSummaryModel]]:
+        if projection is None:
+            entry = await self.get_event_entry(event_id)
+            return EventModel(**entry.document) if entry else None
+        event = await self.events_collection.find_one({"_id": ObjectId(event_id)}, projection=projection)
         if event:
-            return EventModel(**event)
+            return EventSummaryModel(**event)
         return None
 
     async def create_event(self, event: EventModel) -> EventModel:
         event_dict = event.dict(by_alias=True, exclude={"id"})
         if event.id is None:
             event_dict.pop("_id", None)
-        result = await self.events_collection.insert_one(event_dict)
+        result = await self.events_log.insert_one(event_dict)
         event_dict["_id"] = result.inserted_id
         print("adding data to db", event_dict)
         return EventModel(**event_dict)
 
     async def update_event(self, event_id: str, event_data: Dict[str, Any]) -> Optional[EventModel]:
-        event = await self.events_collection.find_one({"_id": ObjectId(event_id)})
-        if not event:
-            return None
-            
-        await self.events_collection.update_one(
-            {"_id": ObjectId(event_id)}, {"$set": event_data}
+        updated_event = await self.events_collection.find_one_and_update(
+            {"_id": ObjectId(event_id)}, {"$set": event_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_event = await self.events_collection.find_one({"_id": ObjectId(event_id)})
+        self.cache.invalidate(self._cache_key(self.events_collection, event_id))
+        if not updated_event:
+            return None
         return EventModel(**updated_event)
 
     async def delete_event(self, event_id: str) -> bool:
         result = await self.events_collection.delete_one({"_id": ObjectId(event_id)})
+        self.cache.invalidate(self._cache_key(self.events_collection, event_id))
         return result.deleted_count > 0
 
     # Cron job operations
-    async def get_all_cron_jobs(self, limit: int = 100, skip: int = 0) -> List[CronJobModel]:
+    async def get_all_cron_jobs(self, limit: int = 100, skip: int = 0, projection: Optional[Dict[str, int]] = None) -> List[CronJobSummaryModel]:
         jobs = []
-        cursor = self.cron_collection.find().skip(skip).limit(limit)
+        cursor = self.cron_listing.find(projection=projection).skip(skip).limit(limit)
         async for document in cursor:
-            jobs.append(CronJobModel(**document))
+            jobs.append(CronJobSummaryModel(**document))
         return jobs
 
-    async def get_cron_job(self, job_id: str) -> Optional[CronJobModel]:
-        job = await self.cron_collection.find_one({"_id": ObjectId(job_id)})
+    def stream_cron_jobs(self, limit: int = 100, skip: int = 0, projection: Optional[Dict[str, int]] = None) -> AsyncIOMotorCursor:
+        """
+        Raw cron job documents for the fast listing path; iterate with ``async for``.
+        """
+        return self.cron_listing.find(projection=projection).skip(skip).limit(limit).batch_size(limit or 100)
+
+    async def get_cron_job_entry(self, job_id: str) -> Optional[CacheEntry]:
+        """
+        The full cron job document with its JSON body and ETag, served from the cache when possible.
+        """
+        return await self._get_cached(self.cron_collection, job_id, CronJobModel)
+
+    async def get_cron_job(self, job_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Union[CronJobModel, CronJobSummaryModel]]:
+        if projection is None:
+            entry = await self.get_cron_job_entry(job_id)
+            return CronJobModel(**entry.document) if entry else None
+        job = await self.cron_collection.find_one({"_id": ObjectId(job_id)}, projection=projection)
         if job:
-            return CronJobModel(**job)
+            return CronJobSummaryModel(**job)
         return None
 
     async def create_cron_job(self, job: CronJobModel) -> CronJobModel:
@@ -76,19 +279,18 @@ class MongoService:
         return CronJobModel(**job_dict)
 
     async def update_cron_job(self, job_id: str, job_data: Dict[str, Any]) -> Optional[CronJobModel]:
-        job = await self.cron_collection.find_one({"_id": ObjectId(job_id)})
-        if not job:
-            return None
-            
-        await self.cron_collection.update_one(
-            {"_id": ObjectId(job_id)}, {"$set": job_data}
+        updated_job = await self.cron_collection.find_one_and_update(
+            {"_id": ObjectId(job_id)}, {"$set": job_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_job = await self.cron_collection.find_one({"_id": ObjectId(job_id)})
+        self.cache.invalidate(self._cache_key(self.cron_collection, job_id))
+        if not updated_job:
+            return None
         return CronJobModel(**updated_job)
 
     async def delete_cron_job(self, job_id: str) -> bool:
         result = await self.cron_collection.delete_one({"_id": ObjectId(job_id)})
+        self.cache.invalidate(self._cache_key(self.cron_collection, job_id))
         return result.deleted_count > 0
 
     # Marketing contacts operations
@@ -109,16 +311,93 @@ class MongoService:
         existing_contact = await self.marketing_collection.find_one({"email": email})
         
         if existing_contact:
-            # Update existing contact
-            await self.marketing_collection.update_one(
+            # Update existing contact; createdAt keeps the first sighting
+            await self.marketing_writes.update_one(
                 {"email": email},
-                {"$set": contact_data}
+                {"$set": {key: value for key, value in contact_data.items() if key != "createdAt"}}
             )
             updated_contact = await self.marketing_collection.find_one({"email": email})
             return updated_contact
         else:
             # Create new contact
             contact_data["email"] = email
-            result = await self.marketing_collection.insert_one(contact_data)
+            result = await self.marketing_writes.insert_one(contact_data)
             contact_data["_id"] = result.inserted_id
             return contact_data
+
+    async def get_marketing_contacts(self, limit: int = 1000, skip: int = 0, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """
+        List marketing contacts as raw documents.
+
+        Args:
+            limit: Maximum number of contacts to return
+            skip: Number of contacts to skip
+            projection: Mongo projection, see build_projection
+
+        Returns:
+            The contact documents
+        """
+        cursor = self.marketing_listing.find(projection=projection).skip(skip).limit(limit)
+        return await cursor.to_list(limit)
+
+    # Communications operations
+    async def add_communication(self, email: str, communication: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a communication sent to a contact.
+
+        Communications are stored in the communications collection in buckets
+        of up to COMMUNICATIONS_BUCKET_SIZE entries per contact, so contact
+        documents stay small. The contact only keeps a lastCommunication summary.
+
+        Args:
+            email: The contact's email
+            communication: The communication; ``sentAt`` should be a datetime
+
+        Returns:
+            The lastCommunication summary stored on the contact
+        """
+        sent_at = communication.setdefault("sentAt", datetime.now())
+        await self.communications_writes.update_one(
+            {"contact_email": email, "count": {"$lt": settings.COMMUNICATIONS_BUCKET_SIZE}},
+            {
+                "$push": {"entries": communication},
+                "$inc": {"count": 1},
+                "$min": {"first_at": sent_at},
+                "$max": {"last_at": sent_at}
+            },
+            upsert=True
+        )
+        summary = communication_summary(communication)
+        await self.marketing_writes.update_one({"email": email}, {"$set": {"lastCommunication": summary}})
+        return summary
+
+    async def get_communications(
+        self,
+        email: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Communications sent to a contact, newest first, optionally limited to a time range.
+        """
+        since = as_local_naive(since) if since else None
+        until = as_local_naive(until) if until else None
+        query: Dict[str, Any] = {"contact_email": email}
+        if since:
+            query["last_at"] = {"$gte": since}
+        if until:
+            query["first_at"] = {"$lte": until}
+
+        communications = []
+        cursor = self.communications_collection.find(query, projection={"entries": 1}).sort("last_at", -1)
+        async for bucket in cursor:
+            for entry in sorted(bucket["entries"], key=lambda e: e["sentAt"], reverse=True):
+                if (since and entry["sentAt"] < since) or (until and entry["sentAt"] > until):
+                    continue
+                communications.append(entry)
+            # Buckets hold consecutive ranges, so the newest buckets fill the page
+            if len(communications) >= limit:
+                break
+        communications.sort(key=lambda e: e["sentAt"], reverse=True)
+        return communications[:limit]
@@ -0,0 +1,230 @@
+"""
+Per-dependency protection for calls to SMTP, HubSpot and AbstractAPI.
+
+Each Dependency combines:
+- a deadline for the whole call,
+- a bulkhead (at most ``max_concurrency`` calls in flight, and callers wait at
+  most ``max_wait`` seconds for a slot), and
+- a circuit breaker. After ``failure_threshold`` consecutive failures it opens
+  and rejects calls immediately. After ``reset_seconds`` it goes half-open and
+  lets a single trial call through, which closes it again or reopens it.
+
+A rejected call raises DependencyUnavailable, so callers can defer the work
+(see retry_queue) instead of queueing behind a slow upstream.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..config import settings
+
+logger = logging.getLogger("resilience")
+
+class DependencyUnavailable(Exception):
+    """
+    A call was not attempted because its dependency is failing or saturated.
+    """
+
+class CircuitOpenError(DependencyUnavailable):
+    pass
+
+class BulkheadFullError(DependencyUnavailable):
+    pass
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead now. In half-open state only one trial call is let through.
+        """
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    @property
+    def is_open(self) -> bool:
+        """
+        True while calls would be rejected (does not start a trial call).
+        """
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at < self.reset_seconds
+        return self.state == self.HALF_OPEN and self._trial_in_flight
+
+    def release_trial(self):
+        """
+        Give back a half-open trial that was never attempted.
+        """
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class Dependency:
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        max_concurrency: int,
+        max_wait: float,
+        is_failure: Optional[Callable[[BaseException], bool]] = None
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        # Errors that say nothing about the upstream's health (e.g. a rejected
+        # recipient) should not trip the breaker
+        self.is_failure = is_failure or (lambda e: True)
+        self.breaker = CircuitBreaker(settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "rejected_open": 0, "rejected_full": 0}
+
+    @property
+    def available(self) -> bool:
+        return not self.breaker.is_open
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Await ``fn(*args, **kwargs)`` under this dependency's breaker, bulkhead and deadline.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            BulkheadFullError: If no slot frees up within max_wait
+            asyncio.TimeoutError: If the call exceeds the deadline
+        """
+        if not self.breaker.allow():
+            self.stats["rejected_open"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        # A half-open trial that ends without a verdict (bulkhead full, caller
+        # cancelled) must be given back, or the breaker never lets another through
+        trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            # Not the upstream's fault
+            if trial:
+                self.breaker.release_trial()
+            self.stats["rejected_full"] += 1
+            raise BulkheadFullError(f"{self.name} has {self.max_concurrency} calls in flight")
+        except asyncio.CancelledError:
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+        self.in_flight += 1
+        self.stats["calls"] += 1
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # CancelledError is not an Exception; says nothing about the upstream
+            if trial:
+                self.breaker.release_trial()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.stats["failures"] += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def call_sync(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking call in a worker thread under this dependency's protection.
+
+        The thread cannot be interrupted, so blocking clients must also be
+        given their own timeouts; the deadline here only frees the caller.
+        """
+        return await self.call(asyncio.to_thread, fn, *args, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            **self.stats
+        }
+
+def is_smtp_connection_failure(error: BaseException) -> bool:
+    import aiosmtplib
+    return isinstance(error, (
+        aiosmtplib.SMTPConnectError, aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, OSError
+    ))
+
+def is_http_upstream_failure(error: BaseException) -> bool:
+    """
+    False for HTTP errors that are about the request (4xx other than 429),
+    such as HubSpot answering 404 for a deleted contact.
+    """
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return not isinstance(status, int) or status >= 500 or status == 429
+
+_dependencies: Dict[str, Dependency] = {}
+
+def get_dependency(name: str) -> Dependency:
+    """
+    Return this process's Dependency for ``name`` (smtp, hubspot or abstractapi).
+    """
+    if name not in _dependencies:
+        if name == "smtp":
+            _dependencies[name] = Dependency(
+                "smtp", settings.SMTP_TIMEOUT, settings.SMTP_POOL_SIZE, settings.BULKHEAD_MAX_WAIT_SECONDS,
+                is_failure=is_smtp_connection_failure
+            )
+        elif name == "hubspot":
+            _dependencies[name] = Dependency(
+                "hubspot", settings.HUBSPOT_TIMEOUT, settings.HUBSPOT_MAX_CONCURRENCY, settings.BULKHEAD_MAX_WAIT_SECONDS,
+                is_failure=is_http_upstream_failure
+            )
+        elif name == "abstractapi":
+            _dependencies[name] = Dependency(
+                "abstractapi", settings.ABSTRACT_API_TIMEOUT, settings.ABSTRACT_API_MAX_CONCURRENCY, settings.BULKHEAD_MAX_WAIT_SECONDS,
+                is_failure=is_http_upstream_failure
+            )
+        else:
+            raise KeyError(f"Unknown dependency {name}")
+    return _dependencies[name]
+
+def dependency_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: get_dependency(name).get_stats() for name in ("smtp", "hubspot", "abstractapi")}
@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import logging
+import mmap
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
+from pymongo.errors import OperationFailure
+
+from ..config import settings
+from ..responses import dumps
+from .leases import acquire_lease, release_lease
+from .mongo_service import MongoService, as_local_naive
+
+logger = logging.getLogger("retention")
+
+EVENTS_PREFIX = "events"
+# TTL index created by earlier versions; it deleted whole events
+LEGACY_TTL_INDEX_NAME = "events_processed_ttl"
+
+class LocalArchiveStore:
+    """
+    Archive store on local disk (or a mounted bucket). Objects are addressed by
+    '/'-separated keys, as in an object store, e.g.
+    ``events/dt=2025-01-31/part-<id>.jsonl.gz``.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = Path(root or settings.ARCHIVE_DIR)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, data: bytes):
+        """
+        Write an object atomically: readers never see a partial partition file.
+        """
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def list(self, prefix: str) -> List[str]:
+        base = self.path(prefix)
+        if not base.exists():
+            return []
+        return sorted(
+            str(path.relative_to(self.root))
+            for path in base.rglob("*.jsonl.gz")
+        )
+
+def partition_key(day: date, first_id) -> str:
+    # Named after the batch's first _id so a retried batch overwrites its own file
+    return f"{EVENTS_PREFIX}/dt={day.isoformat()}/part-{first_id}.jsonl.gz"
+
+def encode_partition(documents: List[Dict[str, Any]]) -> bytes:
+    lines = b"\n".join(dumps(document) for document in documents) + b"\n"
+    return gzip.compress(lines, compresslevel=6)
+
+class RetentionService:
+    """
+    Keeps the events collection small: processed events older than
+    RETENTION_DAYS are written to compressed, date-partitioned JSONL archives
+    and then deleted in bulk. Independently, the raw ``data`` payload of
+    processed events older than EVENTS_PAYLOAD_TTL_DAYS is removed, keeping
+    the rest of the event.
+    """
+
+    def __init__(self, mongo_service: MongoService, store: Optional[LocalArchiveStore] = None):
+        self.mongo_service = mongo_service
+        self.collection = mongo_service.events_collection
+        self.store = store or LocalArchiveStore()
+
+    async def drop_legacy_ttl_index(self):
+        """
+        Drop the TTL index that used to expire whole processed events.
+        """
+        try:
+            if LEGACY_TTL_INDEX_NAME in await self.collection.index_information():
+                await self.collection.drop_index(LEGACY_TTL_INDEX_NAME)
+        except OperationFailure as e:
+            logger.error(f"Could not drop the legacy events TTL index: {str(e)}")
+
+    async def expire_payloads(self, older_than_days: float = None, batch_size: int = None) -> Dict[str, int]:
+        """
+        Remove the raw ``data`` payload from processed events older than
+        ``older_than_days``. The events themselves stay until they are archived.
+
+        A TTL index can only delete whole documents, so this runs as a batched
+        ``$unset`` instead.
+        """
+        older_than_days = settings.EVENTS_PAYLOAD_TTL_DAYS if older_than_days is None else older_than_days
+        batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        query = {"processed": True, "timestamp": {"$lt": cutoff}, "data": {"$exists": True}}
+        totals = {"expired": 0}
+
+        while True:
+            batch = await self.collection.find(query, projection={"_id": 1}).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            ids = [event["_id"] for event in batch]
+            result = await self.collection.update_many({"_id": {"$in": ids}}, {"$unset": {"data": ""}})
+            self.mongo_service.invalidate_events(ids)
+            totals["expired"] += result.modified_count
+
+        if totals["expired"]:
+            logger.info(f"Removed the payload of {totals['expired']} events")
+        return totals
+
+    async def archive_events(self, older_than_days: float = None, batch_size: int = None) -> Dict[str, int]:
+        """
+        Archive and delete processed events older than ``older_than_days``.
+
+        Each batch is written to one partition file per day before its events
+        are deleted, so an interruption never loses events (at worst a batch is
+        archived twice, into the same file).
+        """
+        older_than_days = settings.RETENTION_DAYS if older_than_days is None else older_than_days
+        batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        query = {"processed": True, "timestamp": {"$lt": cutoff}}
+        totals = {"archived": 0, "deleted": 0, "partitions": 0}
+
+        while True:
+            batch = await self.collection.find(query).sort("timestamp", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+
+            by_day: Dict[date, List[Dict[str, Any]]] = {}
+            for event in batch:
+                by_day.setdefault(event["timestamp"].date(), []).append(event)
+            for day, events in by_day.items():
+                # Encoding and compression are CPU bound; keep them off the event loop
+                data = await asyncio.to_thread(encode_partition, events)
+                await asyncio.to_thread(self.store.put, partition_key(day, events[0]["_id"]), data)
+                totals["partitions"] += 1
+            totals["archived"] += len(batch)
+
+            ids = [event["_id"] for event in batch]
+            result = await self.collection.delete_many({"_id": {"$in": ids}})
+            self.mongo_service.invalidate_events(ids)
+            totals["deleted"] += result.deleted_count
+
+        if totals["archived"]:
+            logger.info(f"Archived {totals['archived']} events into {totals['partitions']} partition files")
+        return totals
+
+    async def run_forever(self):
+        """
+        Periodically archive old events (RETENTION_ENABLED) and expire old
+        payloads (EVENTS_PAYLOAD_TTL_DAYS). Only the worker holding the
+        retention lease does the work.
+        """
+        await self.drop_legacy_ttl_index()
+        while True:
+            try:
+                if await acquire_lease(self.mongo_service.db, "retention", settings.RETENTION_INTERVAL_SECONDS):
+                    if settings.EVENTS_PAYLOAD_TTL_DAYS:
+                        await self.expire_payloads()
+                    if settings.RETENTION_ENABLED:
+                        await self.archive_events()
+            except asyncio.CancelledError:
+                await release_lease(self.mongo_service.db, "retention")
+                raise
+            except Exception as e:
+                logger.error(f"Event retention run failed: {str(e)}")
+            await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+class ArchiveReader:
+    """
+    Query archived events by time range. Partitions outside the range are
+    skipped by their dt= name; matching files are memory-mapped and
+    decompressed as a stream, so large partitions are never read into memory.
+    """
+
+    def __init__(self, store: Optional[LocalArchiveStore] = None):
+        self.store = store or LocalArchiveStore()
+
+    def partitions(self, start: datetime, end: datetime) -> List[str]:
+        start, end = as_local_naive(start), as_local_naive(end)
+        keys = []
+        for key in self.store.list(EVENTS_PREFIX):
+            day = date.fromisoformat(key.split("dt=", 1)[1].split("/", 1)[0])
+            if start.date() <= day <= end.date():
+                keys.append(key)
+        return keys
+
+    def query(self, start: datetime, end: datetime, name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        start, end = as_local_naive(start), as_local_naive(end)
+        for key in self.partitions(start, end):
+            with open(self.store.path(key), "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                    gzip.GzipFile(fileobj=mapped) as lines:
+                for line in lines:
+                    event = orjson.loads(line)
+                    timestamp = datetime.fromisoformat(event["timestamp"])
+                    if start <= timestamp <= end and (name is None or event.get("name") == name):
+                        yield event
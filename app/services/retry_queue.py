@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from ..config import settings
+from .leases import WORKER_ID
+from .mongo_service import MongoService
+from .resilience import DependencyUnavailable
+
+logger = logging.getLogger("retry_queue")
+
+# Handlers by job kind. A handler gets the job payload and the services
+# object (app.state); raising DependencyUnavailable reschedules the job.
+RetryHandler = Callable[[Dict[str, Any], Any], Awaitable[None]]
+RETRY_HANDLERS: Dict[str, RetryHandler] = {}
+
+def retry_handler(kind: str):
+    def register(fn: RetryHandler) -> RetryHandler:
+        RETRY_HANDLERS[kind] = fn
+        return fn
+    return register
+
+class RetryQueue:
+    """
+    Deferred work kept in the retry_queue collection, for jobs that could not
+    run because a dependency's circuit was open or its bulkhead was full.
+
+    A background loop claims due jobs (one claim per job, so any number of
+    workers can share the queue) and runs the handler registered for their
+    kind. Jobs are retried with exponential backoff up to RETRY_MAX_ATTEMPTS
+    times and deleted once they succeed.
+    """
+
+    def __init__(self, mongo_service: MongoService, services: Any):
+        self.collection = mongo_service.db.retry_queue
+        self.services = services
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], reason: Optional[str] = None, delay: float = None):
+        delay = settings.BREAKER_RESET_SECONDS if delay is None else delay
+        now = datetime.now()
+        await self.collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "reason": reason,
+            "createdAt": now,
+            "next_attempt_at": now + timedelta(seconds=delay)
+        })
+        logger.info(f"Deferred {kind} job: {reason}")
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        return await self.collection.find_one_and_update(
+            {"status": {"$in": ["pending", "running"]}, "next_attempt_at": {"$lte": now}},
+            {"$set": {
+                "status": "running",
+                "owner": WORKER_ID,
+                # Comes back to the queue if this worker dies mid-job
+                "next_attempt_at": now + timedelta(seconds=settings.RETRY_LEASE_SECONDS)
+            }},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def run_once(self) -> bool:
+        """
+        Run one due job. Returns False when no job was due.
+        """
+        job = await self._claim()
+        if job is None:
+            return False
+
+        attempts = job["attempts"] + 1
+        handler = RETRY_HANDLERS.get(job["kind"])
+        if handler is None:
+            logger.error(f"No retry handler for {job['kind']} job {job['_id']}")
+            await self.collection.update_one(
+                {"_id": job["_id"], "owner": WORKER_ID},
+                {"$set": {
+                    "status": "failed",
+                    "attempts": attempts,
+                    "reason": f"Unknown job kind {job['kind']}",
+                    "next_attempt_at": None
+                }}
+            )
+            return True
+        try:
+            await handler(job["payload"], self.services)
+        except Exception as e:
+            # A KeyError is a malformed payload, which no retry will fix
+            failed = attempts >= settings.RETRY_MAX_ATTEMPTS or isinstance(e, KeyError)
+            delay = min(settings.BREAKER_RESET_SECONDS * 2 ** (attempts - 1), 3600)
+            log = logger.info if isinstance(e, DependencyUnavailable) else logger.error
+            log(f"Retry of {job['kind']} job {job['_id']} failed (attempt {attempts}): {str(e)}")
+            await self.collection.update_one(
+                {"_id": job["_id"], "owner": WORKER_ID},
+                {"$set": {
+                    "status": "failed" if failed else "pending",
+                    "attempts": attempts,
+                    "reason": str(e),
+                    "next_attempt_at": None if failed else datetime.now() + timedelta(seconds=delay)
+                }}
+            )
+            return True
+
+        await self.collection.delete_one({"_id": job["_id"], "owner": WORKER_ID})
+        logger.info(f"Retried {job['kind']} job {job['_id']} after {attempts} attempt(s)")
+        return True
+
+    async def run_forever(self):
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retry queue error: {str(e)}")
+            await asyncio.sleep(settings.RETRY_INTERVAL_SECONDS)
+
+    async def get_stats(self) -> Dict[str, int]:
+        counts = {}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
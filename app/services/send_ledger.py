@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from ..config import settings
+from .leases import WORKER_ID
+from .mongo_service import MongoService
+
+logger = logging.getLogger("send_ledger")
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter over strings. ``in`` can return false positives
+    (about ``error_rate`` at ``capacity`` entries) but never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class SendLedger:
+    """
+    Records every message sent per (recipient, messageType, campaign), so
+    retried webhooks, re-run workflows and resumed campaigns do not send the
+    same message twice.
+
+    ``claim`` is the atomic check: an insert against a unique index. Only the
+    caller that inserts the entry sends; everyone else is counted as a
+    suppressed duplicate. A process-local bloom filter of known keys lets
+    first-time sends go straight to the insert, and only keys that were
+    probably seen before pay for the follow-up lookups.
+    """
+
+    def __init__(self, mongo_service: MongoService):
+        self.collection = mongo_service.db.send_ledger
+        self.bloom = BloomFilter(settings.SEND_LEDGER_BLOOM_CAPACITY, settings.SEND_LEDGER_BLOOM_ERROR_RATE)
+        self.stats = {"claimed": 0, "suppressed": 0, "retaken": 0, "bloom_hits": 0, "bloom_false_positives": 0}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("recipient", 1), ("messageType", 1), ("campaign", 1)], unique=True, name="send_ledger_key"
+        )
+        # Daily welcome email rollups read sent entries by time
+        await self.collection.create_index([("messageType", 1), ("sentAt", 1)])
+
+    async def warm(self):
+        """
+        Load the most recent ledger keys into the bloom filter.
+        """
+        cursor = self.collection.find(
+            {}, projection={"_id": 0, "recipient": 1, "messageType": 1, "campaign": 1}
+        ).sort("_id", -1).limit(settings.SEND_LEDGER_BLOOM_CAPACITY)
+        async for entry in cursor:
+            self.bloom.add(self._bloom_key(entry["recipient"], entry["messageType"], entry.get("campaign")))
+        logger.info(f"Send ledger bloom filter warmed with {self.bloom.count} keys")
+
+    @staticmethod
+    def _key(recipient: str, message_type: str, campaign: Optional[str]) -> Tuple[str, str, Optional[str]]:
+        return recipient.strip().lower(), message_type, campaign
+
+    @staticmethod
+    def _bloom_key(recipient: str, message_type: str, campaign: Optional[str]) -> str:
+        return f"{recipient}\x00{message_type}\x00{campaign or ''}"
+
+    async def _insert(self, recipient: str, message_type: str, campaign: Optional[str]) -> bool:
+        try:
+            await self.collection.insert_one({
+                "recipient": recipient,
+                "messageType": message_type,
+                "campaign": campaign,
+                "status": "pending",
+                "owner": WORKER_ID,
+                "claimedAt": datetime.now(),
+                "suppressed": 0
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def claim(self, recipient: str, message_type: str, campaign: Optional[str] = None) -> bool:
+        """
+        Reserve a send. Call before rendering; send only if this returns True,
+        then report the outcome with ``mark_sent`` or ``mark_failed``.
+
+        An entry whose earlier send failed, or stayed pending for longer than
+        SEND_LEDGER_PENDING_SECONDS (the sender died), can be claimed again.
+
+        Returns:
+            False if the message was already sent or is being sent
+        """
+        recipient, message_type, campaign = self._key(recipient, message_type, campaign)
+        key_filter = {"recipient": recipient, "messageType": message_type, "campaign": campaign}
+        bloom_key = self._bloom_key(recipient, message_type, campaign)
+
+        if bloom_key not in self.bloom:
+            self.bloom.add(bloom_key)
+            if await self._insert(recipient, message_type, campaign):
+                self.stats["claimed"] += 1
+                return True
+        else:
+            self.stats["bloom_hits"] += 1
+
+        now = datetime.now()
+        retaken = await self.collection.find_one_and_update(
+            {**key_filter, "$or": [
+                {"status": "failed"},
+                {"status": "pending", "claimedAt": {"$lt": now - timedelta(seconds=settings.SEND_LEDGER_PENDING_SECONDS)}}
+            ]},
+            {"$set": {"status": "pending", "owner": WORKER_ID, "claimedAt": now}}
+        )
+        if retaken:
+            self.stats["retaken"] += 1
+            return True
+
+        counted = await self.collection.update_one(
+            key_filter, {"$inc": {"suppressed": 1}, "$set": {"lastSuppressedAt": now}}
+        )
+        if counted.matched_count == 0:
+            # Bloom false positive: the key was never claimed
+            self.stats["bloom_false_positives"] += 1
+            if await self._insert(recipient, message_type, campaign):
+                self.stats["claimed"] += 1
+                return True
+            await self.collection.update_one(key_filter, {"$inc": {"suppressed": 1}, "$set": {"lastSuppressedAt": now}})
+
+        self.stats["suppressed"] += 1
+        logger.info(f"Suppressed duplicate {message_type} message to {recipient}")
+        return False
+
+    async def mark_sent(self, recipient: str, message_type: str, campaign: Optional[str] = None, **details: Any):
+        recipient, message_type, campaign = self._key(recipient, message_type, campaign)
+        await self.collection.update_one(
+            {"recipient": recipient, "messageType": message_type, "campaign": campaign},
+            {"$set": {"status": "sent", "sentAt": datetime.now(), **details}}
+        )
+
+    async def mark_failed(self, recipient: str, message_type: str, campaign: Optional[str] = None, error: Optional[str] = None):
+        recipient, message_type, campaign = self._key(recipient, message_type, campaign)
+        await self.collection.update_one(
+            {"recipient": recipient, "messageType": message_type, "campaign": campaign},
+            {"$set": {"status": "failed", "failedAt": datetime.now(), "error": error}}
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "bloom_keys": self.bloom.count, "bloom_bytes": len(self.bloom.bits)}
@@ -0,0 +1,51 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+# Characters HubSpot decodes in the request URI before signing (v3 signatures)
+_URI_DECODES = {
+    "%3A": ":", "%2F": "/", "%3F": "?", "%40": "@", "%21": "!", "%24": "$",
+    "%27": "'", "%28": "(", "%29": ")", "%2A": "*", "%2C": ",", "%3B": ";"
+}
+
+def normalize_uri(uri: str) -> str:
+    for encoded, char in _URI_DECODES.items():
+        uri = uri.replace(encoded, char).replace(encoded.lower(), char)
+    return uri
+
+def hubspot_signature_v3(secret: str, method: str, uri: str, body: bytes, timestamp: str) -> str:
+    """
+    Compute the X-HubSpot-Signature-v3 value: base64 of the HMAC-SHA256, keyed
+    with the app's client secret, of method + URI + raw body + timestamp.
+    """
+    message = method.upper().encode() + normalize_uri(uri).encode() + body + timestamp.encode()
+    digest = hmac.new(secret.encode(), message, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+def verify_hubspot_signature(
+    secret: str,
+    method: str,
+    uri: str,
+    body: bytes,
+    signature: Optional[str],
+    timestamp: Optional[str],
+    max_age_seconds: float
+) -> bool:
+    """
+    Check a v3 signature over the raw request body.
+
+    Requests with a missing, stale (older than ``max_age_seconds``) or
+    mismatching signature are rejected. The comparison is constant time.
+    """
+    if not signature or not timestamp:
+        return False
+    try:
+        age = time.time() - int(timestamp) / 1000
+    except ValueError:
+        return False
+    if abs(age) > max_age_seconds:
+        return False
+    expected = hubspot_signature_v3(secret, method, uri, body, timestamp)
+    return hmac.compare_digest(expected.encode(), signature.encode())
@@ -0,0 +1,303 @@
+"""
+A small BPMN workflow engine.
+
+BPMN files are parsed once into immutable WorkflowSpec objects (conditions are
+compiled to code objects) and cached by path and modification time. A
+WorkflowInstance holds the mutable state of one run: its data and the tokens
+waiting at each node. Tasks are executed by handlers registered by task name
+with @task_handler; tasks that are ready at the same time (after a parallel
+gateway) run concurrently.
+
+Supported elements: startEvent, endEvent, tasks (task, serviceTask, sendTask,
+scriptTask, userTask, manualTask), exclusiveGateway (conditions plus a
+default flow), parallelGateway (fork and join) and sequenceFlow.
+"""
+import asyncio
+import builtins
+import logging
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from pathlib import Path
+from types import CodeType, MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+logger = logging.getLogger("workflow_engine")
+
+WORKFLOWS_DIR = Path(__file__).parent.parent / "workflows"
+
+BPMN_NS = "{http://www.omg.org/spec/BPMN/20100524/MODEL}"
+TASK_TYPES = {"task", "serviceTask", "sendTask", "scriptTask", "userTask", "manualTask"}
+NODE_TYPES = TASK_TYPES | {"startEvent", "endEvent", "exclusiveGateway", "parallelGateway"}
+
+# Builtins available to sequence flow conditions
+CONDITION_BUILTINS = MappingProxyType({
+    name: getattr(builtins, name)
+    for name in ("len", "min", "max", "any", "all", "bool", "int", "float", "str", "abs")
+})
+
+class WorkflowError(Exception):
+    """
+    Raised for invalid BPMN definitions and for workflows that cannot proceed.
+    """
+
+@dataclass(frozen=True)
+class FlowSpec:
+    id: str
+    source: str
+    target: str
+    condition: Optional[str] = None
+    code: Optional[CodeType] = None
+
+@dataclass(frozen=True)
+class NodeSpec:
+    id: str
+    type: str
+    name: str
+    incoming: Tuple[str, ...]
+    outgoing: Tuple[str, ...]
+    default: Optional[str] = None
+
+    @property
+    def is_task(self) -> bool:
+        return self.type in TASK_TYPES
+
+@dataclass(frozen=True)
+class WorkflowSpec:
+    path: str
+    process_id: str
+    nodes: Mapping[str, NodeSpec]
+    flows: Mapping[str, FlowSpec]
+    start: str
+
+def parse_bpmn(path: Union[str, Path]) -> WorkflowSpec:
+    """
+    Parse the first process of a BPMN file into a WorkflowSpec.
+
+    Raises:
+        WorkflowError: If the file uses unsupported elements or is malformed
+    """
+    try:
+        root = ET.parse(path).getroot()
+    except ET.ParseError as e:
+        raise WorkflowError(f"Invalid BPMN file {path}: {e}") from e
+    process = root.find(f"{BPMN_NS}process")
+    if process is None:
+        raise WorkflowError(f"No process in {path}")
+
+    flows: Dict[str, FlowSpec] = {}
+    elements = []
+    for element in process:
+        kind = element.tag.replace(BPMN_NS, "")
+        if kind == "sequenceFlow":
+            expression = element.find(f"{BPMN_NS}conditionExpression")
+            condition = expression.text.strip() if expression is not None and expression.text else None
+            try:
+                code = compile(condition, f"{path}:{element.get('id')}", "eval") if condition else None
+            except SyntaxError as e:
+                raise WorkflowError(f"Invalid condition on flow {element.get('id')}: {e}") from e
+            flows[element.get("id")] = FlowSpec(
+                element.get("id"), element.get("sourceRef"), element.get("targetRef"), condition, code
+            )
+        elif kind in NODE_TYPES:
+            elements.append((kind, element))
+        elif kind not in ("documentation", "extensionElements", "laneSet", "textAnnotation", "association"):
+            raise WorkflowError(f"Unsupported BPMN element '{kind}' in {path}")
+
+    nodes: Dict[str, NodeSpec] = {}
+    for kind, element in elements:
+        node_id = element.get("id")
+        nodes[node_id] = NodeSpec(
+            id=node_id,
+            type=kind,
+            name=element.get("name") or node_id,
+            # Flow order follows the document, so conditions are checked in that order
+            incoming=tuple(flow.id for flow in flows.values() if flow.target == node_id),
+            outgoing=tuple(flow.id for flow in flows.values() if flow.source == node_id),
+            default=element.get("default")
+        )
+
+    starts = [node.id for node in nodes.values() if node.type == "startEvent"]
+    if len(starts) != 1:
+        raise WorkflowError(f"{path} must have exactly one startEvent")
+    for flow in flows.values():
+        if flow.source not in nodes or flow.target not in nodes:
+            raise WorkflowError(f"Flow {flow.id} in {path} references an unknown node")
+
+    return WorkflowSpec(
+        path=str(path),
+        process_id=process.get("id"),
+        nodes=MappingProxyType(nodes),
+        flows=MappingProxyType(flows),
+        start=starts[0]
+    )
+
+_spec_cache: Dict[str, Tuple[int, WorkflowSpec]] = {}
+
+def load_spec(path: Union[str, Path]) -> WorkflowSpec:
+    """
+    Get the compiled spec for a BPMN file, parsing it only when the file is
+    new or has changed since it was last parsed.
+
+    Only definitions shipped in app/workflows can be loaded: names are
+    resolved against that directory, never the working directory, since
+    gateway conditions are evaluated as Python expressions.
+
+    Raises:
+        WorkflowError: If ``path`` resolves outside app/workflows
+    """
+    workflows_dir = WORKFLOWS_DIR.resolve()
+    resolved = (workflows_dir / path).resolve()
+    if not resolved.is_relative_to(workflows_dir):
+        raise WorkflowError(f"Unknown workflow {path}")
+    key = str(resolved)
+    mtime = os.stat(key).st_mtime_ns
+    cached = _spec_cache.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    spec = parse_bpmn(key)
+    _spec_cache[key] = (mtime, spec)
+    logger.info(f"Compiled workflow {spec.process_id} from {key}")
+    return spec
+
+class WorkflowInstance:
+    """
+    The state of one workflow run. Tokens sit on task nodes until the task is
+    completed; events and gateways are passed through immediately.
+    """
+
+    def __init__(self, spec: WorkflowSpec, data: Optional[Dict[str, Any]] = None):
+        self.spec = spec
+        self.data: Dict[str, Any] = data if data is not None else {}
+        # Node ids holding a token, and the flows that have reached each parallel join
+        self.tokens: List[str] = []
+        self.joins: Dict[str, List[str]] = {}
+        self.completed: List[str] = []
+
+    @property
+    def is_completed(self) -> bool:
+        return not self.tokens
+
+    def start(self) -> "WorkflowInstance":
+        self._enter(self.spec.start, via=None)
+        return self
+
+    def ready_tasks(self) -> List[NodeSpec]:
+        return [self.spec.nodes[node_id] for node_id in dict.fromkeys(self.tokens)]
+
+    def complete(self, node_id: str):
+        """
+        Complete a ready task and move its token along the outgoing flows.
+        """
+        if node_id not in self.tokens:
+            raise WorkflowError(f"Task {node_id} is not ready")
+        self.tokens.remove(node_id)
+        self.completed.append(node_id)
+        node = self.spec.nodes[node_id]
+        # Several outgoing flows from a task are an implicit parallel split
+        for flow_id in node.outgoing:
+            flow = self.spec.flows[flow_id]
+            if flow.code is None or self._evaluate(flow):
+                self._enter(flow.target, via=flow_id)
+
+    def _evaluate(self, flow: FlowSpec) -> bool:
+        try:
+            return bool(eval(flow.code, {"__builtins__": CONDITION_BUILTINS}, self.data))
+        except Exception as e:
+            raise WorkflowError(f"Condition on flow {flow.id} failed: {e}") from e
+
+    def _enter(self, node_id: str, via: Optional[str]):
+        node = self.spec.nodes[node_id]
+        if node.is_task:
+            self.tokens.append(node_id)
+        elif node.type == "endEvent":
+            return
+        elif node.type == "exclusiveGateway":
+            for flow_id in node.outgoing:
+                flow = self.spec.flows[flow_id]
+                if flow_id != node.default and (flow.code is None or self._evaluate(flow)):
+                    self._enter(flow.target, via=flow_id)
+                    return
+            if node.default is None:
+                raise WorkflowError(f"No outgoing flow of gateway {node.name} matched")
+            self._enter(self.spec.flows[node.default].target, via=node.default)
+        elif node.type == "parallelGateway":
+            if len(node.incoming) > 1:
+                arrived = self.joins.setdefault(node_id, [])
+                arrived.append(via)
+                if len(set(arrived)) < len(node.incoming):
+                    return
+                del self.joins[node_id]
+            for flow_id in node.outgoing:
+                self._enter(self.spec.flows[flow_id].target, via=flow_id)
+        else:
+            # startEvent
+            for flow_id in node.outgoing:
+                self._enter(self.spec.flows[flow_id].target, via=flow_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Workflows under app/workflows are stored by name so state survives a move
+        path = Path(self.spec.path)
+        if path.is_relative_to(WORKFLOWS_DIR.resolve()):
+            path = path.relative_to(WORKFLOWS_DIR.resolve())
+        return {
+            "spec_path": str(path),
+            "data": self.data,
+            "tokens": list(self.tokens),
+            "joins": {node_id: list(flows) for node_id, flows in self.joins.items()},
+            "completed": list(self.completed)
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "WorkflowInstance":
+        instance = cls(load_spec(state["spec_path"]), state.get("data") or {})
+        instance.tokens = list(state.get("tokens") or [])
+        instance.joins = {node_id: list(flows) for node_id, flows in (state.get("joins") or {}).items()}
+        instance.completed = list(state.get("completed") or [])
+        return instance
+
+def load_workflow(path: Union[str, Path], data: Optional[Dict[str, Any]] = None) -> WorkflowInstance:
+    """
+    Start a new instance of the workflow in ``path`` with the given data.
+    """
+    return WorkflowInstance(load_spec(path), data).start()
+
+# Task handlers by task name. A handler gets the instance data and the
+# services object (app.state), and may return a dict merged into the data.
+TaskHandler = Callable[[Dict[str, Any], Any], Awaitable[Optional[Dict[str, Any]]]]
+TASK_HANDLERS: Dict[str, TaskHandler] = {}
+
+def task_handler(name: str):
+    def register(fn: TaskHandler) -> TaskHandler:
+        TASK_HANDLERS[name] = fn
+        return fn
+    return register
+
+async def run_step(instance: WorkflowInstance, services: Any) -> List[str]:
+    """
+    Execute every ready task concurrently and complete them.
+
+    Returns:
+        The names of the tasks that ran (empty once the workflow is finished)
+    """
+    tasks = instance.ready_tasks()
+    if not tasks:
+        return []
+    missing = [task.name for task in tasks if task.name not in TASK_HANDLERS]
+    if missing:
+        raise WorkflowError(f"No handler registered for task(s): {', '.join(missing)}")
+
+    results = await asyncio.gather(*(TASK_HANDLERS[task.name](instance.data, services) for task in tasks))
+    for task, result in zip(tasks, results):
+        if result:
+            instance.data.update(result)
+        instance.complete(task.id)
+    return [task.name for task in tasks]
+
+async def run_workflow(instance: WorkflowInstance, services: Any) -> WorkflowInstance:
+    """
+    Run an instance until no tasks are left.
+    """
+    while await run_step(instance, services):
+        pass
+    return instance
@@ -0,0 +1,60 @@
+"""
+Task handlers for the workflows in app/workflows, registered by BPMN task name.
+
+Each handler gets the instance data and the services object (app.state, with
+mongo_service and email_service) and returns updates for the instance data.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from .email_service import welcome_template_data
+from .workflow_engine import task_handler
+
+logger = logging.getLogger("workflow_handlers")
+
+async def _send_welcome(data: Dict[str, Any], services: Any, premium: bool) -> Dict[str, Any]:
+    customer = data["customer"]
+    if not await services.send_ledger.claim(customer["email"], "welcome"):
+        return {"email_sent": False, "duplicate": True}
+    subject = f"Welcome to {settings.APP_NAME}"
+    template_data = welcome_template_data(customer["email"], customer.get("name"))
+    template_data["premium"] = premium
+    template_name = "welcome_email" if customer.get("name") else "welcome_email_noname"
+    sent = await services.email_service.send_email(
+        recipient=customer["email"],
+        subject=subject,
+        template_name=template_name,
+        template_data=template_data
+    )
+    if sent:
+        await services.send_ledger.mark_sent(customer["email"], "welcome", template_name=template_name)
+    else:
+        await services.send_ledger.mark_failed(customer["email"], "welcome")
+    return {"email_sent": sent, "email_subject": subject, "email_sent_at": datetime.now().isoformat()}
+
+@task_handler("Send Premium Email")
+async def send_premium_email(data: Dict[str, Any], services: Any) -> Dict[str, Any]:
+    return await _send_welcome(data, services, premium=True)
+
+@task_handler("Send Basic Email")
+async def send_basic_email(data: Dict[str, Any], services: Any) -> Dict[str, Any]:
+    return await _send_welcome(data, services, premium=False)
+
+@task_handler("Record Communication")
+async def record_communication(data: Dict[str, Any], services: Any) -> Optional[Dict[str, Any]]:
+    if data.get("duplicate"):
+        return None
+    if not data.get("email_sent"):
+        logger.warning(f"Welcome email to {data['customer']['email']} was not sent; nothing to record")
+        return None
+    await services.mongo_service.add_communication(data["customer"]["email"], {
+        "type": "email",
+        "subject": data["email_subject"],
+        "sentAt": datetime.fromisoformat(data["email_sent_at"]),
+        "messageType": "welcome",
+        "status": "sent",
+        "sentSuccessfully": True
+    })
+    return {"communication_recorded": True}
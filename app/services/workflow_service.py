@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId, json_util
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from ..config import settings
+from . import workflow_handlers  # noqa: F401 (registers the task handlers)
+from .leases import WORKER_ID
+from .mongo_service import MongoService
+from .workflow_engine import WorkflowInstance, load_workflow, run_step
+
+logger = logging.getLogger("workflows")
+
+def claim_token() -> str:
+    # Unique per claim: worker coroutines of one process must not mistake
+    # each other's claims for their own
+    return f"{WORKER_ID}-{uuid.uuid4().hex[:12]}"
+
+class WorkflowService:
+    """
+    Persistent workflow instances, advanced by a pool of worker coroutines.
+
+    Each instance lives in the workflow_instances collection. A worker claims
+    a due instance with a lease: next_run_at in the future plus an owner token
+    unique to that claim. The lease is renewed while a step runs, and every
+    save is conditional on the token, so an instance is never advanced by two
+    workers at once. The worker runs one step at a time and saves the instance
+    state after every step. When a worker process dies, the lease expires and
+    another worker picks the instance up from its last saved step. Failed
+    steps are retried with backoff up to WORKFLOW_MAX_ATTEMPTS times.
+
+    Bulk runs are recorded in workflow_bulk_runs and their instances are
+    created by a background task, so the request that starts them returns
+    at once. The task holds a lease on the run and checkpoints its progress
+    after every batch; a run whose lease expires (its worker died) is picked
+    up by another worker from the last checkpoint.
+    """
+
+    def __init__(self, mongo_service: MongoService, services: Any):
+        self.mongo_service = mongo_service
+        # Passed to task handlers (app.state: mongo_service, email_service, ...)
+        self.services = services
+        self.collection = mongo_service.db.workflow_instances
+        self.bulk_runs = mongo_service.db.workflow_bulk_runs
+        self._workers: List[asyncio.Task] = []
+        self._bulk_tasks: Dict[ObjectId, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+
+    async def ensure_indexes(self):
+        # Claiming due instances, and progress of bulk runs
+        await self.collection.create_index([("status", 1), ("next_run_at", 1)])
+        await self.collection.create_index([("bulk_id", 1), ("status", 1)], sparse=True)
+        # One instance per contact and bulk run, so a resumed batch is not inserted twice
+        await self.collection.create_index(
+            [("bulk_id", 1), ("contact_id", 1)],
+            unique=True,
+            partialFilterExpression={"bulk_id": {"$exists": True}}
+        )
+        # Finding bulk runs whose creation was interrupted
+        await self.bulk_runs.create_index([("status", 1), ("lease_until", 1)])
+
+    def _new_instance(self, workflow: str, data: Dict[str, Any], bulk_id: Optional[ObjectId] = None, contact_id: Optional[ObjectId] = None) -> Dict[str, Any]:
+        # load_spec only accepts definitions shipped in app/workflows
+        instance = load_workflow(workflow, data)
+        now = datetime.now()
+        document = {
+            "workflow": workflow,
+            "state": instance.to_dict(),
+            "status": "completed" if instance.is_completed else "pending",
+            "attempts": 0,
+            "owner": None,
+            "next_run_at": None if instance.is_completed else now,
+            "createdAt": now,
+            "updatedAt": now
+        }
+        if bulk_id:
+            document["bulk_id"] = bulk_id
+            document["contact_id"] = contact_id
+        return document
+
+    async def start_instance(self, workflow: str, data: Dict[str, Any]) -> ObjectId:
+        """
+        Create an instance; a worker runs it shortly after.
+        """
+        result = await self.collection.insert_one(self._new_instance(workflow, data))
+        self._wakeup.set()
+        return result.inserted_id
+
+    async def start_bulk(self, workflow: str, query: Dict[str, Any], data: Dict[str, Any], limit: Optional[int] = None) -> ObjectId:
+        """
+        Record a bulk run and create its instances in the background: one per
+        marketing contact matching ``query``, at most ``limit`` (capped at
+        WORKFLOW_BULK_MAX).
+
+        Returns:
+            The bulk run's id, for get_bulk_status
+        """
+        self._new_instance(workflow, {"customer": data})  # fail fast on an unknown or invalid workflow
+        limit = min(limit or settings.WORKFLOW_BULK_MAX, settings.WORKFLOW_BULK_MAX)
+        now = datetime.now()
+        run = {
+            "workflow": workflow,
+            # Extended JSON: segment queries contain $-operators
+            "spec": json_util.dumps({"query": query, "data": data, "limit": limit}),
+            "status": "creating",
+            "started": 0,
+            "scanned": 0,
+            "last_id": None,
+            "owner": claim_token(),
+            "lease_until": now + timedelta(seconds=settings.WORKFLOW_LEASE_SECONDS),
+            "createdAt": now,
+            "updatedAt": now
+        }
+        result = await self.bulk_runs.insert_one(run)
+        run["_id"] = result.inserted_id
+        self._start_bulk_task(run)
+        return run["_id"]
+
+    def _start_bulk_task(self, run: Dict[str, Any]):
+        bulk_id = run["_id"]
+        task = asyncio.create_task(self._create_bulk(run))
+        self._bulk_tasks[bulk_id] = task
+        task.add_done_callback(lambda _: self._bulk_tasks.pop(bulk_id, None))
+
+    async def _claim_bulk(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        return await self.bulk_runs.find_one_and_update(
+            {"status": "creating", "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {
+                "owner": claim_token(),
+                "lease_until": now + timedelta(seconds=settings.WORKFLOW_LEASE_SECONDS)
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _resume_bulk_runs(self):
+        """
+        Pick up bulk runs whose creation stopped with the worker running it.
+        """
+        while True:
+            try:
+                while (run := await self._claim_bulk()) is not None:
+                    logger.info(f"Resuming bulk run {run['_id']} after {run.get('started', 0)} instances")
+                    self._start_bulk_task(run)
+            except Exception as e:
+                logger.error(f"Could not claim a bulk run: {str(e)}")
+            await asyncio.sleep(settings.WORKFLOW_LEASE_SECONDS / 3)
+
+    async def _keep_bulk_lease(self, bulk_id: ObjectId, owner: str):
+        while True:
+            await asyncio.sleep(settings.WORKFLOW_LEASE_SECONDS / 3)
+            await self.bulk_runs.update_one(
+                {"_id": bulk_id, "owner": owner},
+                {"$set": {"lease_until": datetime.now() + timedelta(seconds=settings.WORKFLOW_LEASE_SECONDS)}}
+            )
+
+    async def _insert_bulk_batch(self, batch: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch of bulk instances, skipping contacts that already have
+        one (a batch inserted before an interrupted checkpoint).
+
+        Returns:
+            The number of instances inserted
+        """
+        try:
+            result = await self.collection.insert_many(batch, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            return e.details["nInserted"]
+
+    async def _create_bulk(self, run: Dict[str, Any]):
+        """
+        Contacts are streamed from a cursor in _id order and instances
+        inserted in batches of WORKFLOW_BULK_BATCH_SIZE, so memory stays flat
+        however many contacts match. After each batch the last contact _id and
+        the counts are checkpointed on the run, under its lease.
+        """
+        bulk_id, owner, workflow = run["_id"], run["owner"], run["workflow"]
+        spec = json_util.loads(run["spec"])
+        query, data = spec["query"], spec["data"]
+        started, scanned, last_id = run.get("started", 0), run.get("scanned", 0), run.get("last_id")
+        batch: List[Dict[str, Any]] = []
+        lease_keeper = asyncio.create_task(self._keep_bulk_lease(bulk_id, owner))
+
+        async def checkpoint(update: Dict[str, Any]) -> bool:
+            saved = await self.bulk_runs.update_one(
+                {"_id": bulk_id, "owner": owner},
+                {"$set": {"started": started, "scanned": scanned, "last_id": last_id, "updatedAt": datetime.now(), **update}}
+            )
+            return saved.matched_count > 0
+
+        try:
+            remaining = spec["limit"] - scanned
+            if remaining > 0:
+                cursor_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+                cursor = self.mongo_service.marketing_collection.find(
+                    cursor_query, projection={"email": 1, "name": 1, "company": 1}
+                ).sort("_id", 1).limit(remaining).batch_size(settings.WORKFLOW_BULK_BATCH_SIZE)
+                async for contact in cursor:
+                    scanned += 1
+                    last_id = contact["_id"]
+                    if contact.get("email"):
+                        customer = {"email": contact["email"], "name": contact.get("name", ""), "company": contact.get("company", ""), **data}
+                        batch.append(self._new_instance(workflow, {"customer": customer}, bulk_id, contact["_id"]))
+                    if len(batch) >= settings.WORKFLOW_BULK_BATCH_SIZE:
+                        started += await self._insert_bulk_batch(batch)
+                        batch = []
+                        self._wakeup.set()
+                        if not await checkpoint({}):
+                            logger.warning(f"Lost the lease on bulk run {bulk_id}, stopping")
+                            return
+                if batch:
+                    started += await self._insert_bulk_batch(batch)
+                    self._wakeup.set()
+            await checkpoint({"status": "created", "completedAt": datetime.now(), "owner": None, "lease_until": None})
+            logger.info(f"Bulk run {bulk_id}: started {started} {workflow} instances")
+        except asyncio.CancelledError:
+            # Shutting down: hand the run to another worker from its last checkpoint
+            await self.bulk_runs.update_one(
+                {"_id": bulk_id, "owner": owner}, {"$set": {"owner": None, "lease_until": None}}
+            )
+            raise
+        except Exception as e:
+            logger.error(f"Bulk run {bulk_id} failed after {started} instances: {str(e)}")
+            await checkpoint({"status": "failed", "error": str(e), "owner": None, "lease_until": None})
+        finally:
+            lease_keeper.cancel()
+
+    async def get_instance(self, instance_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": ObjectId(instance_id)})
+
+    async def get_bulk_status(self, bulk_id: str) -> Optional[Dict[str, Any]]:
+        """
+        A bulk run's creation status and its instances counted by status.
+
+        Returns:
+            None if there is no such bulk run
+        """
+        run = await self.bulk_runs.find_one({"_id": ObjectId(bulk_id)}, projection={"spec": 0, "owner": 0, "last_id": 0})
+        counts = {}
+        async for row in self.collection.aggregate([
+            {"$match": {"bulk_id": ObjectId(bulk_id)}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]):
+            counts[row["_id"]] = row["count"]
+        if run is None and not counts:
+            return None
+        return {
+            "status": run["status"] if run else "created",
+            "started": run["started"] if run else sum(counts.values()),
+            "error": run.get("error") if run else None,
+            "by_status": counts
+        }
+
+    def start(self, workers: int = None):
+        workers = settings.WORKFLOW_WORKERS if workers is None else workers
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+        self._workers.append(asyncio.create_task(self._resume_bulk_runs()))
+
+    async def stop(self):
+        """
+        Cancel the workers and bulk creations. Instances the workers held are
+        released at their last saved step, bulk runs at their last checkpoint.
+        """
+        tasks = self._workers + list(self._bulk_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        return await self.collection.find_one_and_update(
+            {"status": {"$in": ["pending", "running"]}, "next_run_at": {"$lte": now}},
+            {"$set": {
+                "status": "running",
+                "owner": claim_token(),
+                "next_run_at": now + timedelta(seconds=settings.WORKFLOW_LEASE_SECONDS)
+            }},
+            sort=[("next_run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _keep_lease(self, instance_id: ObjectId, owner: str):
+        # A long step must not let the lease lapse and the instance be claimed again
+        while True:
+            await asyncio.sleep(settings.WORKFLOW_LEASE_SECONDS / 3)
+            await self.collection.update_one(
+                {"_id": instance_id, "owner": owner},
+                {"$set": {"next_run_at": datetime.now() + timedelta(seconds=settings.WORKFLOW_LEASE_SECONDS)}}
+            )
+
+    async def _work(self):
+        while True:
+            try:
+                document = await self._claim()
+            except Exception as e:
+                logger.error(f"Could not claim a workflow instance: {str(e)}")
+                document = None
+            if document is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.WORKFLOW_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._advance(document)
+
+    async def _advance(self, document: Dict[str, Any]):
+        """
+        Run an instance step by step, saving its state after each step.
+        """
+        instance_id = document["_id"]
+        owner = document["owner"]
+        attempts = document.get("attempts", 0)
+        lease_keeper = asyncio.create_task(self._keep_lease(instance_id, owner))
+        try:
+            instance = WorkflowInstance.from_dict(document["state"])
+            while not instance.is_completed:
+                ran = await run_step(instance, self.services)
+                attempts = 0
+                now = datetime.now()
+                update = {
+                    "state": instance.to_dict(),
+                    "attempts": 0,
+                    "updatedAt": now,
+                    "next_run_at": now + timedelta(seconds=settings.WORKFLOW_LEASE_SECONDS)
+                }
+                if instance.is_completed:
+                    update.update({"status": "completed", "completedAt": now, "owner": None, "next_run_at": None})
+                saved = await self.collection.update_one(
+                    {"_id": instance_id, "owner": owner},
+                    {"$set": update, "$push": {"history": {"$each": [{"tasks": ran, "at": now}], "$slice": -50}}}
+                )
+                if saved.matched_count == 0:
+                    logger.warning(f"Lost the lease on workflow instance {instance_id}, stopping")
+                    return
+        except asyncio.CancelledError:
+            # Shutting down: hand the instance back from its last saved step
+            await self.collection.update_one(
+                {"_id": instance_id, "owner": owner},
+                {"$set": {"status": "pending", "owner": None, "next_run_at": datetime.now()}}
+            )
+            raise
+        except Exception as e:
+            attempts += 1
+            failed = attempts >= settings.WORKFLOW_MAX_ATTEMPTS
+            logger.error(f"Workflow instance {instance_id} failed (attempt {attempts}): {str(e)}")
+            await self.collection.update_one(
+                {"_id": instance_id, "owner": owner},
+                {"$set": {
+                    "status": "failed" if failed else "pending",
+                    "error": str(e),
+                    "attempts": attempts,
+                    "owner": None,
+                    "updatedAt": datetime.now(),
+                    "next_run_at": None if failed else datetime.now() + timedelta(seconds=2 ** attempts)
+                }}
+            )
+        finally:
+            lease_keeper.cancel()
@@ -0,0 +1,79 @@
+"""
+Import-time budget check for cold starts.
+
+    python -m benchmarks.importtime                  # report, fail over budget
+    python -m benchmarks.importtime --budget-ms 500 --top 30
+
+Runs ``python -X importtime -c "import app.main"`` in a clean interpreter,
+reports the most expensive modules and exits with status 1 when the total
+exceeds the budget or when a module that must stay lazy (the HubSpot SDK,
+requests) is imported eagerly.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+from .standins import ROOT
+
+DEFAULT_FORBIDDEN = ["hubspot", "requests"]
+
+
+def measure(target: str = "app.main") -> List[Tuple[str, int, int]]:
+    """
+    Return (module, self_us, cumulative_us) for every module imported by ``target``.
+    """
+    env = dict(os.environ)
+    env.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/importtime")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{result.stderr}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Drop the single space after the separator; the rest is tree indentation
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")))
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN), help="Comma separated top-level packages that must not be imported")
+    args = parser.parse_args(argv)
+
+    modules = measure(args.target)
+    # Top-level imports are the ones with no indentation in the tree
+    total_us = sum(cumulative for name, _, cumulative in modules if not name.startswith(" "))
+
+    print(f"Total import time for {args.target}: {total_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"\nTop {args.top} modules by cumulative time:")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms cumulative  {self_us / 1000:8.1f} ms self  {name.strip()}")
+
+    failed = False
+    imported = {name.strip().split(".")[0] for name, _, _ in modules}
+    for package in filter(None, args.forbid.split(",")):
+        if package in imported:
+            print(f"FAIL: '{package}' is imported at startup; it should be imported lazily")
+            failed = True
+    if total_us / 1000 > args.budget_ms:
+        print(f"FAIL: import time exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
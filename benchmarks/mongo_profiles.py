@@ -0,0 +1,110 @@
+"""
+Check the MongoDB operation profiles (app/services/mongo_profiles.py)
+against a running replica set.
+
+    python -m benchmarks.mongo_profiles --uri mongodb://localhost:27017/?replicaSet=rs0
+
+A single-node replica set is enough:
+
+    docker run -d -p 27017:27017 mongo:6 --replSet rs0
+    docker exec <container> mongosh --eval "rs.initiate()"
+
+For every profiled collection of MongoService, the check verifies that the
+read preference and write concern match the profile definitions (with
+MONGO_PROFILE_OVERRIDES applied). It then runs a write and a read under each
+profile in a scratch database, so the server has to accept every option,
+including maxStalenessSeconds. Exits with status 1 on any mismatch or error.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.services.mongo_profiles import PROFILES, get_profile, profile_options, with_profile
+from app.services.mongo_service import MongoService
+
+# MongoService attribute -> the profile it should carry
+EXPECTED = {
+    "events_listing": "listing",
+    "events_log": "event_log",
+    "cron_listing": "listing",
+    "marketing_listing": "listing",
+    "marketing_writes": "contact_write",
+    "communications_writes": "contact_write",
+}
+
+
+def check_configuration(mongo_service: MongoService) -> List[str]:
+    failures = []
+    for attribute, profile_name in EXPECTED.items():
+        collection = getattr(mongo_service, attribute)
+        options = profile_options(get_profile(profile_name))
+        read_preference = options.get("read_preference", mongo_service.db.read_preference)
+        write_concern = options.get("write_concern", mongo_service.db.write_concern)
+        ok = collection.read_preference == read_preference and collection.write_concern == write_concern
+        print(
+            f"  {'ok  ' if ok else 'FAIL'} {attribute:<24}{profile_name:<15}"
+            f"read={collection.read_preference.document} write={collection.write_concern.document}"
+        )
+        if not ok:
+            failures.append(attribute)
+    return failures
+
+
+async def check_server(client: AsyncIOMotorClient, database: str) -> List[str]:
+    failures = []
+    scratch = client[database].profile_check
+    try:
+        for name in PROFILES:
+            collection = with_profile(scratch, name)
+            started = time.perf_counter()
+            try:
+                await collection.insert_one({"profile": name})
+                found = await collection.find_one({"profile": name})
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                # A secondary read may not see the write yet; only errors fail
+                print(f"  ok   {name:<15}write+read {elapsed_ms:6.1f} ms{'' if found else ' (read was stale)'}")
+            except Exception as e:
+                print(f"  FAIL {name:<15}{type(e).__name__}: {e}")
+                failures.append(name)
+    finally:
+        await client.drop_database(database)
+    return failures
+
+
+async def run(uri: str, database: str) -> int:
+    client = AsyncIOMotorClient(uri, serverSelectionTimeoutMS=5000)
+    try:
+        hello = await client.admin.command("hello")
+        if "setName" not in hello:
+            print("The server is not a replica set member; read preferences and majority writes cannot be checked")
+            return 1
+        print(f"Replica set {hello['setName']} ({len(hello.get('hosts', []))} members)")
+
+        print("Profile configuration:")
+        failures = check_configuration(MongoService(client=client))
+        print("Server round trips:")
+        failures += await check_server(client, database)
+    finally:
+        client.close()
+
+    if failures:
+        print(f"{len(failures)} check(s) failed: {', '.join(failures)}")
+        return 1
+    print("All profiles OK")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check MongoDB operation profiles against a replica set")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/lynkjedi_profiles?replicaSet=rs0")
+    parser.add_argument("--database", default="lynkjedi_profile_check", help="Scratch database, dropped afterwards")
+    args = parser.parse_args(argv)
+    sys.exit(asyncio.run(run(args.uri, args.database)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Run the benchmark suite against local stand-ins and compare with the baseline.
+
+    python -m benchmarks.run                      # run everything, compare to baseline
+    python -m benchmarks.run -s events_pagination # run selected scenarios
+    python -m benchmarks.run --update-baseline    # record a new baseline
+    python -m benchmarks.run --scale 0.1          # quick smoke run
+
+Exits with status 1 when a scenario regresses past --threshold.
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from .scenarios import SCENARIOS, Context, Measurement
+from .standins import StandIns
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+RESULTS_FILE = BENCH_DIR / "results" / "latest.json"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(measurement: Measurement) -> Dict[str, float]:
+    summary = {
+        "items": measurement.items,
+        "errors": measurement.errors,
+        "duration_s": round(measurement.duration, 4),
+        "throughput_per_s": round(measurement.items / measurement.duration, 2) if measurement.duration else 0.0,
+        "p50_ms": round(percentile(measurement.latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(measurement.latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(measurement.latencies, 99) * 1000, 2),
+    }
+    summary.update(measurement.extra)
+    return summary
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Return a description of every regression worse than ``threshold``
+    (a fraction, 0.2 == 20%).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous["throughput_per_s"] and current["throughput_per_s"] < previous["throughput_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {current['throughput_per_s']}/s vs baseline {previous['throughput_per_s']}/s"
+            )
+        for key in ("p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {current[key]} vs baseline {previous[key]}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {previous['errors']}")
+    return regressions
+
+
+async def run_scenarios(names: List[str], standins: StandIns, scale: float) -> Dict[str, Dict]:
+    results = {}
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=standins.app.url, timeout=60, limits=limits) as client:
+        ctx = Context(client=client, standins=standins, scale=scale)
+        for name in names:
+            print(f"Running {name}...", flush=True)
+            results[name] = summarize(await SCENARIOS[name](ctx))
+            print(f"  {json.dumps(results[name])}", flush=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="LynkJedi benchmark suite")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply request and data volumes")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed regression as a fraction of the baseline")
+    parser.add_argument("--mongo-uri", help="Use an existing MongoDB instead of spawning mongod (its database is wiped)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app under test")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    names = args.scenario or list(SCENARIOS)
+    with StandIns(mongo_uri=args.mongo_uri, app_workers=args.workers) as standins:
+        results = asyncio.run(run_scenarios(names, standins, args.scale))
+
+    report = {
+        "recorded_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": args.scale,
+        "scenarios": results,
+    }
+    RESULTS_FILE.parent.mkdir(exist_ok=True)
+    RESULTS_FILE.write_text(json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        if BASELINE_FILE.exists():
+            # Keep baselines for scenarios that were not part of this run
+            previous = json.loads(BASELINE_FILE.read_text())
+            report["scenarios"] = {**previous.get("scenarios", {}), **results}
+        BASELINE_FILE.write_text(json.dumps(report, indent=2))
+        print(f"Baseline written to {BASELINE_FILE}")
+        return 0
+
+    if not BASELINE_FILE.exists():
+        print("No baseline recorded yet; run with --update-baseline first")
+        return 0
+    baseline = json.loads(BASELINE_FILE.read_text())
+    if baseline.get("scale") != args.scale:
+        print(f"Baseline was recorded at scale {baseline.get('scale')}, not {args.scale}; skipping comparison")
+        return 0
+    regressions = compare(results, baseline["scenarios"], args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Benchmark scenarios. Each scenario seeds whatever it needs, drives the app
+over HTTP and returns a Measurement. Register new ones with @scenario.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+import orjson
+
+from app.services.webhook_auth import hubspot_signature_v3
+
+from .standins import StandIns
+
+
+@dataclass
+class Measurement:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    duration: float = 0.0
+    # Units of work per run (requests by default, contacts for the sync scenario)
+    items: int = 0
+    extra: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    standins: StandIns
+    scale: float = 1.0
+
+    @cached_property
+    def db(self):
+        return self.standins.mongo.sync_client().get_default_database()
+
+    def scaled(self, n: int) -> int:
+        return max(1, int(n * self.scale))
+
+
+SCENARIOS: Dict[str, Callable[[Context], Awaitable[Measurement]]] = {}
+
+
+def scenario(name: str):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+async def drive(make_request: Callable[[int], Awaitable[httpx.Response]], total: int, concurrency: int) -> Measurement:
+    """
+    Issue ``total`` requests with at most ``concurrency`` in flight and record
+    the latency of each one.
+    """
+    measurement = Measurement(items=total)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                if response.status_code >= 400:
+                    measurement.errors += 1
+            except httpx.HTTPError:
+                measurement.errors += 1
+            measurement.latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    measurement.duration = time.perf_counter() - started
+    return measurement
+
+
+def seed_events(db, count: int):
+    """
+    Insert ``count`` webhook-shaped events directly, bypassing the API.
+    """
+    if db.events.estimated_document_count() >= count:
+        return
+    db.events.delete_many({})
+    now = datetime.now()
+    batch = []
+    for i in range(count):
+        batch.append({
+            "name": "hubspot_webhook",
+            "description": "HubSpot webhook notification",
+            "timestamp": now - timedelta(minutes=i),
+            "processed": i % 3 == 0,
+            "data": {
+                "objectId": i,
+                "subscriptionType": "contact.creation",
+                "changeSource": "CRM_UI",
+                "portalId": 12345,
+                "occurredAt": 1700000000000 + i,
+                "propertyName": "email",
+                "propertyValue": f"contact{i}@example.com",
+            },
+        })
+        if len(batch) == 1000:
+            db.events.insert_many(batch)
+            batch = []
+    if batch:
+        db.events.insert_many(batch)
+
+
+@scenario("webhook_burst")
+async def webhook_burst(ctx: Context) -> Measurement:
+    """
+    A burst of contact.creation webhooks, each triggering a HubSpot lookup,
+    email validation, two contact writes, an event insert and a welcome email.
+    Requests are signed like HubSpot's, so signature checking is included.
+    """
+    ctx.db.marketing.delete_many({})
+    url = str(ctx.client.base_url).rstrip("/") + "/hubspot/webhook"
+
+    def webhook(i: int):
+        payload = [{
+            "objectId": 1_000_000 + i,
+            "subscriptionType": "contact.creation",
+            "changeSource": "CRM_UI",
+            "portalId": 12345,
+            "occurredAt": int(time.time() * 1000),
+        }]
+        body = orjson.dumps(payload)
+        timestamp = str(int(time.time() * 1000))
+        headers = {
+            "Content-Type": "application/json",
+            "X-HubSpot-Request-Timestamp": timestamp,
+            "X-HubSpot-Signature-v3": hubspot_signature_v3(
+                StandIns.HUBSPOT_CLIENT_SECRET, "POST", url, body, timestamp
+            ),
+        }
+        return ctx.client.post("/hubspot/webhook", content=body, headers=headers)
+
+    return await drive(webhook, total=ctx.scaled(500), concurrency=50)
+
+
+@scenario("events_pagination")
+async def events_pagination(ctx: Context) -> Measurement:
+    """
+    Page through /events at increasing skip depths.
+    """
+    total_events = ctx.scaled(20_000)
+    seed_events(ctx.db, total_events)
+    depths = [0, total_events // 10, total_events // 2, max(0, total_events - 100)]
+
+    def page(i: int):
+        return ctx.client.get("/events/", params={"skip": depths[i % len(depths)], "limit": 100})
+
+    return await drive(page, total=ctx.scaled(400), concurrency=20)
+
+
+@scenario("sync_contacts")
+async def sync_contacts(ctx: Context) -> Measurement:
+    """
+    One /hubspot/sync-contacts run over the mock HubSpot portal. Throughput is
+    reported in contacts per second.
+    """
+    ctx.db.marketing.delete_many({})
+    limit = ctx.scaled(50_000)
+
+    started = time.perf_counter()
+    response = await ctx.client.post(
+        "/hubspot/sync-contacts",
+        params={"limit": limit},
+        headers={"X-API-Key": StandIns.API_KEY},
+        timeout=None,
+    )
+    elapsed = time.perf_counter() - started
+    measurement = Measurement(latencies=[elapsed], duration=elapsed, items=limit)
+    if response.status_code >= 400:
+        measurement.errors = 1
+    return measurement
+
+
+@scenario("email_flood")
+async def email_flood(ctx: Context) -> Measurement:
+    """
+    A flood of /email/send requests. The measurement waits until the SMTP
+    sink has received every queued message so delivery time is included.
+    """
+    total = ctx.scaled(1000)
+    sink = ctx.standins.smtp
+    already_received = sink.received
+
+    def send(i: int):
+        return ctx.client.post("/email/send", json={
+            "recipient": f"flood{i}@example.com",
+            "subject": "Benchmark notification",
+            "template_name": "notification",
+            "template_data": {
+                "subject": "Benchmark notification",
+                "recipient_name": f"Recipient {i}",
+                "message": "This is a benchmark message.",
+                "current_year": "2025",
+            },
+        })
+
+    measurement = await drive(send, total=total, concurrency=100)
+    started = time.perf_counter() - measurement.duration
+    deadline = time.perf_counter() + 120
+    while sink.received - already_received < total and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    delivered = sink.received - already_received
+    measurement.duration = time.perf_counter() - started
+    measurement.extra["delivered"] = delivered
+    measurement.errors += total - delivered
+    return measurement
+
+
+@scenario("events_page_1k")
+async def events_page_1k(ctx: Context) -> Measurement:
+    """
+    1000-document /events pages through the validated model path.
+    """
+    seed_events(ctx.db, ctx.scaled(20_000))
+
+    def page(i: int):
+        return ctx.client.get("/events/", params={"limit": 1000})
+
+    return await drive(page, total=ctx.scaled(200), concurrency=10)
+
+
+@scenario("events_page_1k_raw")
+async def events_page_1k_raw(ctx: Context) -> Measurement:
+    """
+    The same pages through the raw orjson streaming path, for comparison
+    with events_page_1k.
+    """
+    seed_events(ctx.db, ctx.scaled(20_000))
+
+    def page(i: int):
+        return ctx.client.get("/events/", params={"limit": 1000, "raw": "true"})
+
+    return await drive(page, total=ctx.scaled(200), concurrency=10)
+
+
+def seed_contacts(db, count: int):
+    """
+    Insert ``count`` marketing contacts with HubSpot payloads and a
+    communications summary, like the ones the webhook stores.
+    """
+    if db.marketing.estimated_document_count() >= count:
+        return
+    db.marketing.delete_many({})
+    now = datetime.now()
+    db.marketing.insert_many([
+        {
+            "email": f"contact{i}@example.com",
+            "name": f"First{i} Last{i}",
+            "company": f"Company {i % 100}",
+            "source": "CRM_UI",
+            "createdAt": now - timedelta(minutes=i),
+            "timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "hubspot_id": 1_000_000 + i,
+            "hubspot_data": {
+                "objectId": 1_000_000 + i,
+                "subscriptionType": "contact.creation",
+                "changeSource": "CRM_UI",
+                "portalId": 12345,
+                "occurredAt": 1700000000000 + i,
+                "attemptNumber": 0,
+                "changeFlag": "CREATED",
+            },
+            "lastCommunication": {
+                "type": "email",
+                "messageType": "welcome",
+                "subject": "Welcome to Lynk AI",
+                "status": "sent",
+                "sentAt": now - timedelta(minutes=i),
+            },
+        }
+        for i in range(count)
+    ])
+
+
+def mongo_network_bytes(db) -> Dict[str, int]:
+    """
+    Bytes the server sent to clients, plus the totals before and after wire compression.
+    """
+    network = db.client.admin.command("serverStatus")["network"]
+    compressed = uncompressed = 0
+    for stats in network.get("compression", {}).values():
+        compressed += stats["compressor"]["bytesOut"]
+        uncompressed += stats["compressor"]["bytesIn"]
+    return {"bytes_out": network["bytesOut"], "compressed": compressed, "uncompressed": uncompressed}
+
+
+async def typical_pages(ctx: Context, accept_encoding: str) -> Measurement:
+    """
+    100-item pages of /events and of full /hubspot/contacts documents, with
+    the response bytes on the wire and the MongoDB traffic they caused.
+    """
+    seed_events(ctx.db, ctx.scaled(20_000))
+    seed_contacts(ctx.db, ctx.scaled(5_000))
+    headers = {"Accept-Encoding": accept_encoding, "X-API-Key": StandIns.API_KEY}
+    downloaded = 0
+
+    async def page(i: int):
+        nonlocal downloaded
+        if i % 2:
+            response = await ctx.client.get("/events/", params={"limit": 100, "raw": "true"}, headers=headers)
+        else:
+            response = await ctx.client.get("/hubspot/contacts", params={"limit": 100, "fields": "*"}, headers=headers)
+        downloaded += response.num_bytes_downloaded
+        return response
+
+    before = mongo_network_bytes(ctx.db)
+    measurement = await drive(page, total=ctx.scaled(400), concurrency=10)
+    after = mongo_network_bytes(ctx.db)
+    measurement.extra["response_bytes_per_page"] = round(downloaded / measurement.items)
+    measurement.extra["mongo_bytes_out_per_page"] = round((after["bytes_out"] - before["bytes_out"]) / measurement.items)
+    uncompressed = after["uncompressed"] - before["uncompressed"]
+    if uncompressed:
+        measurement.extra["mongo_wire_ratio"] = round((after["compressed"] - before["compressed"]) / uncompressed, 3)
+    return measurement
+
+
+@scenario("pages_identity")
+async def pages_identity(ctx: Context) -> Measurement:
+    """
+    Typical listing pages without response compression.
+    """
+    return await typical_pages(ctx, "identity")
+
+
+@scenario("pages_compressed")
+async def pages_compressed(ctx: Context) -> Measurement:
+    """
+    The same pages with brotli or gzip responses, for comparison with
+    pages_identity. MongoDB wire compression applies to both runs; its ratio
+    is reported as mongo_wire_ratio.
+    """
+    return await typical_pages(ctx, "br, gzip")
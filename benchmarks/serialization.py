@@ -0,0 +1,98 @@
+"""
+In-process comparison of the two /events listing serialization paths for a
+page of webhook-shaped documents, with no server or database involved:
+
+- model path: EventModel(**doc) per document, FastAPI response validation
+  against List[EventModel], then jsonable_encoder + json.dumps
+- raw path: the BSON-decoded dicts encoded by app.responses.stream_json_array
+
+    python -m benchmarks.serialization --docs 1000 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+
+
+def make_documents(count: int) -> List[dict]:
+    now = datetime.now()
+    return [
+        {
+            "_id": ObjectId(),
+            "name": "hubspot_webhook",
+            "description": "HubSpot webhook notification",
+            "timestamp": now - timedelta(seconds=i),
+            "processed": False,
+            "data": {
+                "eventId": 100000 + i,
+                "subscriptionId": 2000,
+                "portalId": 12345,
+                "appId": 3000,
+                "occurredAt": 1700000000000 + i,
+                "subscriptionType": "contact.creation",
+                "attemptNumber": 0,
+                "objectId": 5000 + i,
+                "changeFlag": "CREATED",
+                "changeSource": "CRM_UI",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def model_path(documents: List[dict]) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import parse_obj_as
+
+    from app.models.models import EventModel
+
+    models = [EventModel(**document) for document in documents]
+    # What FastAPI does with response_model=List[EventModel]
+    content = [model.dict(by_alias=True) for model in models]
+    validated = parse_obj_as(List[EventModel], content)
+    return json.dumps(jsonable_encoder(validated, by_alias=True)).encode("utf-8")
+
+
+def raw_path(documents: List[dict]) -> bytes:
+    from app.responses import stream_json_array
+
+    async def cursor():
+        for document in documents:
+            yield document
+
+    async def collect():
+        return b"".join([chunk async for chunk in stream_json_array(cursor())])
+
+    return asyncio.run(collect())
+
+
+def best_of(fn, documents, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(documents)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listing serialization micro-benchmark")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    documents = make_documents(args.docs)
+    model_s = best_of(model_path, documents, args.repeat)
+    raw_s = best_of(raw_path, documents, args.repeat)
+    print(f"{args.docs} documents, best of {args.repeat}")
+    print(f"  model path: {model_s * 1000:8.2f} ms  ({len(model_path(documents))} bytes)")
+    print(f"  raw path:   {raw_s * 1000:8.2f} ms  ({len(raw_path(documents))} bytes)")
+    print(f"  speedup:    {model_s / raw_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Local stand-ins for everything the app talks to: a throwaway mongod, an SMTP
+sink and a mock HubSpot / AbstractAPI HTTP server. Each one is started on a
+free localhost port and torn down when the benchmark run ends.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Query
+
+ROOT = Path(__file__).resolve().parent.parent
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "example.com"]
+MOCK_CONTACT_COUNT = int(os.getenv("BENCH_MOCK_CONTACTS", "50000"))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def mock_contact(contact_id: int) -> Dict:
+    """
+    A HubSpot contact in the shape returned by the CRM v3 objects API.
+    """
+    return {
+        "id": str(contact_id),
+        "properties": {
+            "email": f"contact{contact_id}@{DOMAINS[contact_id % len(DOMAINS)]}",
+            "firstname": f"First{contact_id}",
+            "lastname": f"Last{contact_id}",
+            "company": f"Company {contact_id % 100}",
+            "createdate": "2024-01-01T00:00:00.000Z",
+        },
+        "createdAt": "2024-01-01T00:00:00.000Z",
+        "updatedAt": "2024-01-01T00:00:00.000Z",
+        "archived": False,
+    }
+
+
+# Mock HubSpot CRM + AbstractAPI email validation, served by uvicorn in a
+# separate process so it never competes with the app's event loop.
+mock_app = FastAPI(title="Benchmark upstream stand-ins")
+
+
+@mock_app.get("/crm/v3/objects/contacts/{contact_id}")
+async def mock_get_contact(contact_id: int):
+    return mock_contact(contact_id)
+
+
+@mock_app.get("/crm/v3/objects/contacts")
+async def mock_get_contacts_page(limit: int = 100, after: Optional[str] = None):
+    start = int(after or 0)
+    end = min(start + limit, MOCK_CONTACT_COUNT)
+    page = {"results": [mock_contact(i) for i in range(start, end)]}
+    if end < MOCK_CONTACT_COUNT:
+        page["paging"] = {"next": {"after": str(end), "link": f"/crm/v3/objects/contacts?after={end}"}}
+    return page
+
+
+@mock_app.get("/v1/")
+async def mock_validate_email(email: str = Query(...), api_key: str = Query(None)):
+    return {
+        "email": email,
+        "deliverability": "DELIVERABLE",
+        "is_valid_format": {"value": True, "text": "TRUE"},
+        "quality_score": "0.90",
+    }
+
+
+class UvicornProcess:
+    """
+    Run an ASGI app with uvicorn in a child process.
+    """
+
+    def __init__(self, app_path: str, env: Optional[Dict[str, str]] = None, workers: int = 1):
+        self.app_path = app_path
+        self.env = env or {}
+        self.workers = workers
+        self.port = free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        env = dict(os.environ, **self.env)
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", self.app_path,
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers), "--log-level", "warning",
+            ],
+            cwd=ROOT,
+            env=env,
+        )
+        wait_for_port(self.port)
+        return self
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class MongoStandIn:
+    """
+    A throwaway single-node replica set. Pass ``uri`` to reuse an existing
+    server instead of spawning mongod.
+    """
+
+    def __init__(self, uri: Optional[str] = None, database: str = "lynkjedi_bench"):
+        self.external_uri = uri
+        self.database = database
+        self.port = free_port()
+        self.dbpath: Optional[str] = None
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def uri(self) -> str:
+        if self.external_uri:
+            return self.external_uri
+        return f"mongodb://127.0.0.1:{self.port}/{self.database}?replicaSet=rs0"
+
+    def start(self):
+        if self.external_uri:
+            return self
+        mongod = shutil.which("mongod")
+        if not mongod:
+            raise RuntimeError("mongod not found on PATH; pass --mongo-uri to use an existing server")
+        self.dbpath = tempfile.mkdtemp(prefix="lynkjedi-bench-")
+        self.process = subprocess.Popen(
+            [
+                mongod, "--dbpath", self.dbpath, "--port", str(self.port),
+                "--bind_ip", "127.0.0.1", "--replSet", "rs0", "--quiet",
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        wait_for_port(self.port)
+        self._initiate_replica_set()
+        return self
+
+    def _initiate_replica_set(self):
+        from pymongo import MongoClient
+
+        client = MongoClient(f"mongodb://127.0.0.1:{self.port}/?directConnection=true")
+        client.admin.command(
+            "replSetInitiate",
+            {"_id": "rs0", "members": [{"_id": 0, "host": f"127.0.0.1:{self.port}"}]},
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if client.admin.command("hello").get("isWritablePrimary"):
+                break
+            time.sleep(0.2)
+        client.close()
+
+    def sync_client(self):
+        from pymongo import MongoClient
+
+        return MongoClient(self.uri)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+        if self.dbpath:
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+
+
+class SMTPSink:
+    """
+    aiosmtpd server that accepts and counts every message without delivering it.
+    """
+
+    def __init__(self):
+        self.port = free_port()
+        self.received = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self.controller = None
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.received += 1
+            self.bytes_received += len(envelope.content)
+        return "250 Message accepted for delivery"
+
+    def start(self):
+        from aiosmtpd.controller import Controller
+
+        self.controller = Controller(self, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+        return self
+
+    def stop(self):
+        if self.controller:
+            self.controller.stop()
+
+
+class StandIns:
+    """
+    Start all stand-ins plus the app under test, wired together through the
+    same environment variables production uses.
+    """
+
+    API_KEY = "bench-internal-key"
+    HUBSPOT_CLIENT_SECRET = "bench-client-secret"
+
+    def __init__(self, mongo_uri: Optional[str] = None, app_workers: int = 1, app_env: Optional[Dict[str, str]] = None):
+        self.mongo = MongoStandIn(mongo_uri)
+        self.smtp = SMTPSink()
+        self.upstreams = UvicornProcess("benchmarks.standins:mock_app")
+        self.app: Optional[UvicornProcess] = None
+        self.app_workers = app_workers
+        self.app_env = app_env or {}
+
+    def app_environment(self) -> Dict[str, str]:
+        env = {
+            "MONGODB_URI": self.mongo.uri,
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(self.smtp.port),
+            "SMTP_USER": "",
+            "SMTP_FROM": "bench@example.com",
+            "SMTP_START_TLS": "false",
+            "HUBSPOT_TOKEN": "bench-token",
+            "HUBSPOT_API_BASE": self.upstreams.url,
+            "HUBSPOT_CLIENT_SECRET": self.HUBSPOT_CLIENT_SECRET,
+            "ABSTRACT_API_URL": f"{self.upstreams.url}/v1/",
+            "ABSTRACT_API_KEY": "bench-abstract-key",
+            "INTERNAL_API_KEY": self.API_KEY,
+        }
+        env.update(self.app_env)
+        return env
+
+    def __enter__(self):
+        self.mongo.start()
+        self.smtp.start()
+        self.upstreams.start()
+        self.app = UvicornProcess("app.main:app", env=self.app_environment(), workers=self.app_workers).start()
+        return self
+
+    def __exit__(self, *exc):
+        for component in (self.app, self.upstreams, self.smtp, self.mongo):
+            if component is not None:
+                component.stop()